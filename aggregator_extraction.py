@@ -7,42 +7,16 @@
 
 ### IMPORT
 
-# Python libraries import
-import nltk
-from nltk.parse import CoreNLPParser
-from nltk.parse.corenlp import CoreNLPDependencyParser
-from nltk.tag.stanford import StanfordNERTagger
-import os
-
 # Utils import
 from parsing_analysis import get_nodes, get_subtrees
 from utils import catch_words, cut_after, get_index
+from annotation import annotate_all, get_parser
 
 # Generic analysis functions import
-from area_extraction import find_areas
+from area_extraction import find_areas_in_tree
 from time_extraction import find_time, date_figures
 
 
-### PARSERS
-
-#Generic path
-path = os.getcwd()
-
-#Java path (to be changed)
-java_path = "C:/Program Files (x86)/Java/jre1.8.0_251/bin/java.exe"
-os.environ['JAVAHOME'] = java_path
-
-#Files of the NER
-jar = os.path.join(path, "Stanford_NER/stanford-ner-4.0.0/stanford-ner.jar")
-model = os.path.join(path, "Stanford_NER/stanford-ner-4.0.0/classifiers/english.muc.7class.distsim.crf.ser.gz")
-
-#Loading the parsers
-parser = CoreNLPParser(url='http://localhost:9000')
-dep_parser = CoreNLPDependencyParser(url='http://localhost:9000')
-ner_tagger = StanfordNERTagger(model, jar, encoding='utf8')
-pos_tagger = CoreNLPParser(url='http://localhost:9000', tagtype='pos')
-
-
 ### FUNCTIONS
 
 
@@ -83,12 +57,14 @@ def cut_in_clause(tok, comp_words,cut_words):
 # To do that, we look at the contextual words around cp_word to find a number
 # We also make sure that the number is not already tagged as a date (in date_figures)
 # Finally, we check if the number is potentially linked with a unit multiplier
+# The tree of the clause (parse) is given when it is already known, otherwise the clause is parsed
 
 unit_m = {"hundred" : 100, "hundreds" : 100, "thousand" : 1000, "thousands" : 1000,  "million" : 1000000, "millions" : 1000000, "billion" : 1000000000, "billions" : 1000000000,
 "k" : 1000, 'm' : 1000000, "b" : 1000000000, "bn" : 1000000000, "bil" : 1000000000}
 
-def get_threshold(tok,cp_word,date_figures):
-    parse = next(parser.parse(tok)) #First, we parse the whole clause
+def get_threshold(tok,cp_word,date_figures,parse = None):
+    if parse == None:
+        parse = next(get_parser().parse(tok)) #First, we parse the whole clause
 
     # And then we search the grammatical context of cp_word
     # This is most of the time a Prepositional Phrase (PP), a Nominal Phrase (NP) or a Quantifier Phrase (NP)
@@ -136,17 +112,18 @@ def get_threshold(tok,cp_word,date_figures):
     return None
 
 
-# The function find_aggregators takes the parses of the sentence
+# The function find_aggregators takes the annotated sentence (see annotation.py)
 # and try to find every comparison and aggregation in it.
 # It also takes as input the type of return the user wants (list of countries or list of years)
 # and the words in the sentence giving that information
 
-def find_aggregators(parse,parse_d,returned,agg_words):
+def find_aggregators(sentence,returned,agg_words):
 
+    parse = sentence.parse
     tok = parse.leaves()
-    ner = ner_tagger.tag(tok)
-    pos = pos_tagger.tag(tok)
-    dep = list(dep_parser.parse(tok))[0]
+    ner = sentence.ner
+    pos = sentence.pos
+    dep = sentence.parse_d
 
     # We store the numbers in the sentence that are dates, as it is useful when looking for a threshold
     figures = date_figures(ner, pos, dep)
@@ -172,7 +149,7 @@ def find_aggregators(parse,parse_d,returned,agg_words):
 
     # And just make sure that a threshold is linked to each one (as these words can appear is other contexts)
     for t in th_:
-        if get_threshold(tok, t, figures) != None:
+        if get_threshold(tok, t, figures, parse) != None:
             th.append(t)
     
     
@@ -235,21 +212,19 @@ def find_aggregators(parse,parse_d,returned,agg_words):
 
             # Else, everything is okay and we will now treat each clause separately 
             else:
+                # We annotate the clauses (all of them in one call to the server)
+                # That way, for each clause we only consider its words and nothing else
+                # And of course, the result can differ from the parsing of the whole sentence
+                clause_annots = annotate_all([" ".join(c) for c in clauses[:n_comp]], clauses[:n_comp])
+
                 for i in range(n_comp):
                     clause = clauses[i]
                     word = comp[i]
+                    clause_annot = clause_annots[i]
                     
-                    # We parse the clause. That way, we only consider the words of the clause and nothing else
-                    # And of course, the result can differ from the parsing of the whole sentence
-                    
-                    clause_sent = " ".join(clause)
-                    clause_parse = next(parser.parse(clause))
-                    clause_dep = list(dep_parser.parse(clause))[0]
-                    clause_ner = ner_tagger.tag(clause)
-                    
-                    # Then, we execute the functions find_areas and find_time for the clause
-                    areas = find_areas(clause_sent)
-                    times = find_time(clause_ner, clause_parse,clause_dep)
+                    # Then, we execute the functions find_areas_in_tree and find_time for the clause (with the parse of the clause)
+                    areas = find_areas_in_tree(clause_annot.parse, clause_annot.tokens)
+                    times = find_time(clause_annot)
 
 
                     than_time = times[2]
@@ -280,7 +255,7 @@ def find_aggregators(parse,parse_d,returned,agg_words):
                                 sens = "inf"
 
                             # Search of a threshold
-                            threshold = get_threshold(clause,word,[])
+                            threshold = get_threshold(clause,word,[],clause_annot.parse)
                             if threshold == None:
                                 raise Exception("Error 2 : No threshold found")
                             else:
@@ -370,7 +345,7 @@ def find_aggregators(parse,parse_d,returned,agg_words):
                                 # If there is not, the comparison is of type "two" (two different values compared)
 
                                 if comp_type == None:
-                                    thres = get_threshold(clause, 'than', than_time)
+                                    thres = get_threshold(clause, 'than', than_time, clause_annot.parse)
                                     if thres != None:
                                         comp_type = "Threshold"
                                         V2["THRESHOLD"] = thres
@@ -390,7 +365,7 @@ def find_aggregators(parse,parse_d,returned,agg_words):
                             if word.lower() in th_inf:
                                 sens = "inf"
 
-                            threshold = get_threshold(clause,word,[])
+                            threshold = get_threshold(clause,word,[],clause_annot.parse)
                             if threshold == None:
                                 raise Exception("Error 2 : No threshold found")
                             else:
@@ -469,7 +444,7 @@ def find_aggregators(parse,parse_d,returned,agg_words):
                                 # If nothing, we do as before and look for a threshold
 
                                 if comp_type == None:
-                                    thres = get_threshold(clause, 'than', than_time)
+                                    thres = get_threshold(clause, 'than', than_time, clause_annot.parse)
                                     if thres != None:
                                         comp_type = "Threshold"
                                         V2["THRESHOLD"] = thres
@@ -0,0 +1,197 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains the annotation of a sentence by the CoreNLP server
+# Instead of asking the server separately for the grammatical parse, the dependency parse, the NER and the POS tags,
+# we do only one 'annotate' call and gather everything in an AnnotatedSentence object
+# This object is then given to all the analysis functions (type_of_sentence, find_time, find_areas, find_aggregators)
+# The annotations are also kept in a cache, so the same sentence is never sent twice to the server
+
+### IMPORT
+
+# Python libraries import
+import hashlib
+import json
+import nltk
+from nltk.parse import CoreNLPParser
+from nltk.parse.corenlp import CoreNLPDependencyParser, transform
+from nltk.parse.dependencygraph import DependencyGraph
+from nltk.tree import Tree
+
+# Config import
+import config
+from ner import get_tagger, ner_properties
+from cache import LRUCache, DiskCache
+import tracing
+
+
+### PARSER
+
+# We only use the parsers to talk with the server (api_call) and to build the trees from the answer (make_tree)
+# They are created the first time they are needed (get_parser, get_dep_parser) and shared with the other files
+
+parser = None
+dep_parser = None
+
+def get_parser():
+    global parser
+    if parser == None:
+        parser = CoreNLPParser(url=config.CORENLP_URL)
+    return parser
+
+def get_dep_parser():
+    global dep_parser
+    if dep_parser == None:
+        dep_parser = CoreNLPDependencyParser(url=config.CORENLP_URL)
+    return dep_parser
+
+# Creates the parsers and the NER tagger in advance (with the 'stanford' backend, this starts the NER server)
+
+def warmup():
+    get_parser()
+    get_dep_parser()
+    if config.NER_BACKEND != "corenlp":
+        tagger = get_tagger()
+        if hasattr(tagger, "start"):
+            tagger.start()
+
+# The sentence is given already tokenized (with nltk) so that all the annotations are aligned on the same tokens
+# The NER is done in the same call only with the 'corenlp' NER backend (see ner.py and config.py)
+properties = {
+    "annotators": "tokenize,ssplit,pos,lemma,parse,depparse",
+    "tokenize.whitespace": "true",
+    "ssplit.eolonly": "true",
+}
+
+def get_properties():
+    if config.NER_BACKEND == "corenlp":
+        p = dict(properties)
+        p["annotators"] = "tokenize,ssplit,pos,lemma,ner,parse,depparse"
+        p.update(ner_properties)
+        return p
+    return properties
+
+
+### ANNOTATED SENTENCE
+
+# An AnnotatedSentence stores all the parses of one sentence :
+# - sent : the sentence itself
+# - tokens : the list of tokens
+# - parse : the grammatical structure tree
+# - parse_d : the dependency graph
+# - ner : the list of (word, NER tag)
+# - pos : the list of (word, POS tag)
+
+class AnnotatedSentence:
+
+    def __init__(self, sent, tokens, parse, parse_d, ner, pos):
+        self.sent = sent
+        self.tokens = tokens
+        self.parse = parse
+        self.parse_d = parse_d
+        self.ner = ner
+        self.pos = pos
+
+    def __repr__(self):
+        return "AnnotatedSentence(" + repr(self.sent) + ")"
+
+
+### CACHE
+
+# The annotation of a sentence only depends on its tokens and on the properties sent to the server
+# (the sentences are already normalized with normalize_figures and transform_dates before being annotated)
+# So the key of the cache is a hash of both, and the value is a compact record of the annotation :
+# - parse : the grammatical tree written on one line "(ROOT (S ...))"
+# - dep : the dependency graph, one line per word (as given to nltk by CoreNLPDependencyParser)
+# - ner and pos : the lists of [word, tag]
+# The records are kept in memory (LRUCache) and, if config.PARSE_CACHE_PATH is set, in a sqlite file (DiskCache)
+
+parse_cache = LRUCache(config.PARSE_CACHE_SIZE, "parse")
+disk_cache = None
+
+def get_disk_cache():
+    global disk_cache
+    if (disk_cache == None and config.PARSE_CACHE_PATH != ""):
+        disk_cache = DiskCache(config.PARSE_CACHE_PATH)
+    return disk_cache
+
+def cache_key(tokens):
+    content = json.dumps([tokens, get_properties(), config.NER_BACKEND], sort_keys = True)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def get_record(key):
+    record = parse_cache.get(key)
+    if (record == None and get_disk_cache() != None):
+        record = get_disk_cache().get(key)
+        if record != None:
+            parse_cache.put(key, record)
+    return record
+
+def put_record(key, record):
+    parse_cache.put(key, record)
+    if get_disk_cache() != None:
+        get_disk_cache().put(key, record)
+
+
+### FUNCTIONS
+
+# This function builds the record of one sentence from its annotation given by the server (json format)
+# If the NER was not done by the server, it must be given (see ner.py)
+
+def to_record(result, ner = None):
+    if "ner" in result["tokens"][0]:
+        ner = [(t["word"], t["ner"]) for t in result["tokens"]]
+    return {
+        "parse" : " ".join(str(Tree.fromstring(result["parse"])).split()),
+        "dep" : [" ".join(n_items[1:]) for n_items in sorted(transform(result))],
+        "ner" : [list(x) for x in ner],
+        "pos" : [[t["word"], t["pos"]] for t in result["tokens"]],
+    }
+
+# And this one builds the AnnotatedSentence from the record
+
+def from_record(sent, tokens, record):
+    parse = Tree.fromstring(record["parse"])
+    parse_d = DependencyGraph(record["dep"], cell_separator = " ")
+    ner = [tuple(x) for x in record["ner"]]
+    pos = [tuple(x) for x in record["pos"]]
+    return AnnotatedSentence(sent, tokens, parse, parse_d, ner, pos)
+
+# The function annotate_all takes several sentences (with their lists of tokens) and returns their AnnotatedSentences
+# The sentences which are not in the cache are annotated in only one call to the server :
+# they are sent one per line, and the server splits them only at the end of the lines (ssplit.eolonly)
+
+def annotate_all(sents, tokens_list):
+    keys = [cache_key(tokens) for tokens in tokens_list]
+    records = [get_record(k) for k in keys]
+
+    todo = [i for i in range(len(sents)) if records[i] == None]
+    if todo != []:
+        text = "\n".join(" ".join(tokens_list[i]) for i in todo)
+        tracing.count("parser.calls")
+        tracing.count("parser.sentences", len(todo))
+        with tracing.span("parser"):
+            result = get_parser().api_call(text, properties = get_properties())
+        if len(result["sentences"]) != len(todo):
+            raise Exception("Error : the server did not return one annotation per sentence")
+
+        # If the NER is not done by the server, the NER backend is called (see ner.py), also once for all the sentences
+        ner_list = [None] * len(todo)
+        if "ner" not in result["sentences"][0]["tokens"][0]:
+            tracing.count("ner.calls")
+            with tracing.span("ner"):
+                ner_list = get_tagger().tag_sents([tokens_list[i] for i in todo])
+
+        for j in range(len(todo)):
+            i = todo[j]
+            records[i] = to_record(result["sentences"][j], ner_list[j])
+            put_record(keys[i], records[i])
+
+    return [from_record(sents[i], tokens_list[i], records[i]) for i in range(len(sents))]
+
+# The function annotate takes one sentence (or directly its list of tokens) and returns its AnnotatedSentence
+
+def annotate(sent, tokens = None):
+    if tokens == None:
+        tokens = nltk.word_tokenize(sent)
+    return annotate_all([sent], [tokens])[0]
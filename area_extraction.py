@@ -9,16 +9,12 @@
 
 # Python libraries import
 import nltk
-from nltk.parse import CoreNLPParser
 
 # Utils import
 import utils
 from utils import lower_list, get_index
 from parsing_analysis import get_subtrees, first_word
-
-### PARSER
-
-parser = CoreNLPParser(url='http://localhost:9000')
+from annotation import AnnotatedSentence, get_parser
 
 
 ### DICTIONNARIES
@@ -47,17 +43,6 @@ def area_type(area):
     else:
         return None
 
-# The function replacement replaces the abbreviated name of some countries with the complete form
-# " ... UK ... " --> " ... United Kingdom ... "
-# This is important as most of the abbreviations are not detected correctly by the NER
-
-def replacement(sent):
-    s = sent
-    for a in acro_list:
-        s = s.replace(a, acro_dict[a])
-    tok = nltk.word_tokenize(s)
-    return (s,tok)
-
 def group_locations(locations, sent):
     n = len(locations)
     i = 0
@@ -88,119 +73,78 @@ def get_locations(ner):
             res.append(l[0])
     return res
 
-# The function bilist creates two lists of names :
-# The first list contains full name of countries/regions
-# while the second one contains partial name
-# Therefore, "South Africa" will be in the first list and "South" in the second
-# When looking at the location words in the sentence, we can easily find out if it is the name of a place
-# or the beginning of the name of a place (in which case, we will go further to complete it)
+# All the names of areas are gathered once in a gazetteer : a tree of tokens (trie) where each path from the root
+# is a name in lower case ("south" -> "africa") and the node at the end of a name gives what it corresponds to
+# There are three kinds of names : countries, regions and demonyms (adjectives like "Australian" or "Russian")
+# For each name, we keep (official name, type of area, form) : for example "french" -> ("France", "country", "a")
+# The acronyms ("UK", "USA" ...) are kept apart, because they are case sensitive ("US" is not "us")
 
-def bilist(liste):
-    partial = []
-    for l in liste:
-        words = nltk.word_tokenize(l)
-        n = len(words)
-        if n>1:
-            i = 1
-            while (i<n):
-                partial.append(" ".join(words[0:i]))
-                i += 1
-    return (lower_list(liste),lower_list(partial))
+kinds = ("country", "region", "demonym")
 
+gazetteer = None
 
+def build_gazetteer():
+    trie = {}
 
-# The function find_areas_in_list formally finds all the areas in the sentence :
-# The locations identified thanks to the NER are searched in the dictionaries to make sure they exist
-# Thanks to the complete and partial dictionaries (with bilist) the names in several words are detected as well
-# Finally, the type of area (country or region) is also added for each location
+    def add(name, kind, entry):
+        node = trie
+        for w in nltk.word_tokenize(name):
+            node = node.setdefault(w.lower(), {})
+        node.setdefault(None, {}).setdefault(kind, entry)   #None is never a token, so it marks the end of a name
 
+    for c in country_list:
+        add(c, "country", (c, "country", 'n'))
+    for r in region_list:
+        add(r, "region", (r, "region", 'n'))
+    for d in demo_list:
+        name = demo_dict[d]
+        add(d, "demonym", (name, area_type(name) or "", 'a'))
+
+    acronyms = {}
+    for a in acro_list:
+        name = acro_dict[a]
+        acronyms[a] = (area_type(name), (name, area_type(name), 'n'))
+    return (trie, acronyms)
+
+def get_gazetteer():
+    global gazetteer
+    if gazetteer == None:
+        gazetteer = build_gazetteer()
+    return gazetteer
+
+# The function find_areas_in_list formally finds all the areas in the sentence, in one pass over the tokens :
+# from each token, we go down the gazetteer as long as the next tokens continue a name, and keep the longest name of each kind
+# (so "South Africa" is found, and not only "South")
+# The names of the same kind do not overlap, but a word can be at the same time a country and a region
+# Each area found is given as [name as in the sentence, type (country or region), form (name 'n' or adjective 'a'), official name]
+# with the countries first, then the regions and the demonyms
 
 def find_areas_in_list(tokens):
-    areas = []  #final list of areas
+    trie, acronyms = get_gazetteer()
+    found = {k : [] for k in kinds}
+    next_pos = {k : 0 for k in kinds}   #for each kind, the position after the last name found
     n = len(tokens)
-    i = 0
-
-    #First we treat the countries
-    country_comp, country_part = bilist(country_list) #lists of complete and partial names of countries
-    while (i<n):
-        if tokens[i].lower() in country_comp:   #if the word is a complete name of country, we add it to the list
-            areas.append([tokens[i], 'country', 'n'])
-            i += 1
-        elif tokens[i].lower() in country_part: #this works because there is no set of words being at the same time
-                                                #a country and the beginning of another country (ie. in both lists)
-                                                #"South" is in the partial list but not complete and vice versa for "Denmark"
-            a = 1
-            while(" ".join(tokens[i:i+a]).lower() in country_part):
-                a += 1
-            if(" ".join(tokens[i:i+a]).lower() in country_comp):
-                areas.append([" ".join(tokens[i:i+a]), 'country', 'n'])
-                i = i+a
-            else:
-                i+=1
-        else:
-            i += 1
-
-    #Exactly the same, but for regions
-    region_comp, region_part = bilist(region_list)
-    i = 0
-    while (i<n):
-        if tokens[i].lower() in region_comp:
-            areas.append([tokens[i], 'region', 'n'])
-            i += 1
-        elif tokens[i].lower() in region_part:
-            a = 1
-            while(" ".join(tokens[i:i+a]).lower() in region_part):
-                a += 1
-            if(" ".join(tokens[i:i+a]).lower() in region_comp):
-                areas.append([" ".join(tokens[i:i+a]), 'region', 'n'])
-                i = i+a
-            else:
-                i+=1
-        else:
-            i += 1
-
-    #Search of the demonyms (adjectives) like "Australia" or "Russian"
-    #The idea is the name (a list of complete name and another of partial names)
-    #but with an extra step : when the complete adjective is found, find the name of the country/region associated
-    #because we do not want adjectives but nouns in areas at the end
-    #also we deal with countries and regions at the same time
-    demo_comp, demo_part = bilist(demo_list)
-    i = 0
-    while (i<n):
-        if tokens[i].lower() in demo_comp:
-            name = ""
-            type = ""
-            for d in demo_list:
-                if d.lower() == tokens[i].lower():
-                    name = demo_dict[d]
-            if name in country_list:
-                type = "country"
-            elif name in region_list:
-                type = "region"
-            areas.append([tokens[i], type, 'a'])
-            i += 1
-        elif tokens[i].lower() in demo_part:
-            a = 1
-            while(" ".join(tokens[i:i+a]).lower() in demo_part):
-                a += 1
-            if(" ".join(tokens[i:i+a]).lower() in demo_comp):
-                name = ""
-                type = ""
-                for d in demo_list:
-                    if d.lower() == " ".join(tokens[i:i+a]).lower():
-                        name = demo_dict[d]
-                if name in country_list:
-                    type = "country"
-                elif name in region_list:
-                    type = "region"
-                areas.append([" ".join(tokens[i:i+a]), type, 'a'])
-                i = i+a
-            else:
-                i+=1
-        else:
-            i += 1
 
-    return areas
+    for i in range(n):
+        longest = {}    #kind -> (number of tokens, entry)
+        if tokens[i] in acronyms:
+            kind, entry = acronyms[tokens[i]]
+            longest[kind] = (1, entry)
+        node = trie
+        j = i
+        while (j < n and tokens[j].lower() in node):
+            node = node[tokens[j].lower()]
+            j += 1
+            for kind, entry in node.get(None, {}).items():
+                longest[kind] = (j-i, entry)
+
+        for kind in longest:
+            if i >= next_pos[kind]:
+                a, entry = longest[kind]
+                found[kind].append([" ".join(tokens[i:i+a]), entry[1], entry[2], entry[0]])
+                next_pos[kind] = i + a
+
+    return found["country"] + found["region"] + found["demonym"]
 
 # The function find_areas gives the final result
 # Once the areas have been identified (and we know they exist) in the sentence,
@@ -216,9 +160,18 @@ def find_areas_in_list(tokens):
 
 # For the others, we look at the context, and more precisely, we look at the Prepositional Phrase (PP) to which the area belongs
 
+# The function find_areas_in_tree works on a sentence already parsed : parse is its grammatical tree and tok its tokens
+# (so it does not need the CoreNLP server at all)
+# The function find_areas takes the sentence itself, or its AnnotatedSentence (see annotation.py) whose parse is reused
+# Only a raw sentence needs to be parsed
+
 def find_areas(sent):
-    s, tok = replacement(sent)
-    parse = next(parser.raw_parse(sent))
+    if isinstance(sent, AnnotatedSentence):
+        return find_areas_in_tree(sent.parse, sent.tokens)
+    parse = next(get_parser().raw_parse(sent))
+    return find_areas_in_tree(parse, nltk.word_tokenize(sent))
+
+def find_areas_in_tree(parse, tok):
     areas = find_areas_in_list(tok)
     pps = get_subtrees(parse, "PP")
     areas_in = []
@@ -234,7 +187,6 @@ def find_areas(sent):
     for a in areas:
         name = a[0] #name of the area
         type = a[1] #country or region
-        form = a[2] #adjective 'a' or name 'n'
         classification = None
 
         if get_index(tok, name) > idx:
@@ -265,22 +217,9 @@ def find_areas(sent):
 
         #Finally, before adding the area to the list, we change its name to the good format
         #Indeed, until now, the name of the area was written as in the sentence, to find it easily
-        #Now, we take the official writing, the same as in the dictionaries
+        #Now, we take the official writing, the same as in the dictionaries (given by the gazetteer)
         #Thus, if the word is "INDIA" or "india" or "INDia", now it becomes "India"
-        name_f = []
-        if form == 'a':
-            for adj in demo_list:
-                if adj.lower() == name.lower():
-                    name_f = [demo_dict[adj],type]
-        elif form == 'n':
-            if type == 'country':
-                for c in country_list:
-                    if c.lower() == name.lower():
-                        name_f = [c,type]
-            elif type == 'region':
-                for r in region_list:
-                    if r.lower() == name.lower():
-                        name_f = [r,type]
+        name_f = [a[3],type]
 
         if classification == "IN":
             areas_in.append(name_f)
@@ -0,0 +1,501 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains a benchmark of the Natural Language Analysis, to measure the performance offline
+# It times each extractor (find_topic, dimension_fill, find_areas, find_time, find_aggregators) and the full analyse
+# on the queries of data/Queries.txt and data/test/*.csv, and gives their p50, p95 and p99 latencies
+# The stages are recorded as spans by tracing.py (see summary there)
+#
+# The benchmark does not need the CoreNLP server (nor Java) nor the GoogleNews model :
+# - 'python benchmark.py record' is run once on a machine with the server and the model :
+#   the answers of the server are recorded (through a local proxy) and a small embedding model is made
+#   with only the words of the queries and of the metadata dictionaries (see w2v_conversion.py)
+# - 'python benchmark.py' then replays the recorded answers with a local stub server, and uses the small model
+# Without the server and the model, 'python benchmark.py synthetic' makes fixtures of the same format (see SYNTHETIC FIXTURES)
+#
+# The results can be saved as a baseline ('--save-baseline') and the next runs are compared to it :
+# the script ends with an error if a stage is slower than the baseline by more than the tolerance
+
+### IMPORT
+
+# Python libraries import
+from urllib.request import urlopen, Request
+from urllib.parse import urlparse, parse_qs
+import argparse
+import contextlib
+import http.server
+import io
+import json
+import os
+import sys
+import threading
+import nltk
+import numpy as np
+import pandas as pd
+
+# Config import
+import config
+
+# Analysis functions import
+import annotation
+import word_proximity
+import topic_extraction
+import area_extraction
+from annotation import annotate
+from question_type import type_of_sentence
+from time_extraction import find_time
+from area_extraction import find_areas_in_tree
+from aggregator_extraction import find_aggregators
+from topic_extraction import find_topic
+from dimension_extraction import dimension_fill
+from utils import normalize_figures, transform_dates
+import analyse
+import tracing
+
+
+### PATHS
+
+path = os.getcwd()
+
+bench_dir = os.path.join(path, "data/benchmark")
+responses_path = os.path.join(bench_dir, "corenlp_responses.json")    #recorded answers of the CoreNLP server
+model_fixture_path = os.path.join(bench_dir, "fixture_w2v.kv")         #small embedding model
+topic_index_path = os.path.join(bench_dir, "topic_index.npz")          #topic index made with the small model
+baseline_path = os.path.join(bench_dir, "baseline.json")
+
+queries_path = os.path.join(path, "data/Queries.txt")
+test_dir = os.path.join(path, "data/test")
+dimension_queries_path = os.path.join(test_dir, "Dimensions_queries_test.csv")
+
+
+### QUERIES
+
+# All the queries of Queries.txt and of the test files (each query only once)
+
+def load_queries():
+    queries = []
+    file = open(queries_path, "r")
+    for q in file:
+        if q.strip() != "":
+            queries.append(q.strip())
+    file.close()
+    for name in sorted(os.listdir(test_dir)):
+        if name.endswith("_test.csv"):
+            df = pd.read_csv(os.path.join(test_dir, name), sep = ";")
+            queries += [q for q in df["Query"]]
+    return list(dict.fromkeys(queries))
+
+# The queries of the dimension test, with their table (dimension_fill needs one)
+def load_dimension_queries():
+    df = pd.read_csv(dimension_queries_path, sep = ";")
+    return [(row["Query"].replace("-", " "), row["Table"]) for id, row in df.iterrows()]
+
+def normalize(sent):
+    return transform_dates(normalize_figures(sent))
+
+
+### CORENLP STUB
+
+# A small HTTP server answering like the CoreNLP server, with the answers in 'responses'
+# (the key of an answer is the properties of the request and the text)
+# With an upstream server, it is a proxy : the unknown requests are sent to the real server and their answers recorded
+# With synthetic, the unknown requests are answered by synthetic_answer (and recorded too)
+
+class CoreNLPStub(http.server.BaseHTTPRequestHandler):
+    responses = {}
+    upstream = None
+    synthetic = False
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        query = urlparse(self.path).query
+        properties = parse_qs(query).get("properties", ["{}"])[0]
+        text = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        key = properties + "\n" + text
+
+        answer = CoreNLPStub.responses.get(key)
+        if (answer == None and CoreNLPStub.upstream != None):
+            request = Request(CoreNLPStub.upstream + "/?" + query, data = text.encode("utf-8"),
+                              headers = {"Content-Type" : "text/plain; charset=utf-8"})
+            file = urlopen(request)
+            answer = json.loads(file.read().decode("utf-8"))
+            file.close()
+            with CoreNLPStub.lock:
+                CoreNLPStub.responses[key] = answer
+        elif (answer == None and CoreNLPStub.synthetic):
+            answer = synthetic_answer(json.loads(properties), text)
+            with CoreNLPStub.lock:
+                CoreNLPStub.responses[key] = answer
+
+        if answer == None:
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write(b"No recorded answer for this request")
+            return
+        body = json.dumps(answer).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+# Starts the stub on a free port and makes the Chatbot use it (instead of config.CORENLP_URL)
+def start_stub(upstream = None, synthetic = False):
+    CoreNLPStub.upstream = upstream
+    CoreNLPStub.synthetic = synthetic
+    server = http.server.ThreadingHTTPServer(("localhost", 0), CoreNLPStub)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    config.CORENLP_URL = "http://localhost:" + str(server.server_address[1])
+    annotation.parser = None
+    annotation.dep_parser = None
+    return server
+
+
+### RECORD
+
+# Runs the analysis of all the queries through the stub, so that all the answers needed are recorded
+# Returns the words that the small model must contain
+# The NER is done by the CoreNLP server (the Stanford NER server cannot be replayed)
+
+def record_queries():
+    from w2v_conversion import dictionary_words
+
+    words = dictionary_words()
+    queries = load_queries()
+    for q in queries:
+        sent = normalize(q)
+        sentence = annotate(sent)
+        words.update(w.lower() for w in sentence.tokens)
+        t = type_of_sentence(sentence)
+        try:
+            find_aggregators(sentence, t[1], t[3])  #the clauses of the comparisons are annotated too
+        except Exception:
+            pass
+    for q, table in load_dimension_queries():
+        words.update(w.lower() for w in nltk.word_tokenize(q))
+    return words
+
+def save_fixtures(words, vectors):
+    from gensim.models import KeyedVectors
+
+    os.makedirs(bench_dir, exist_ok = True)
+    file = open(responses_path, "w", encoding = "utf-8")
+    json.dump(CoreNLPStub.responses, file)
+    file.close()
+    print("Recorded ", len(CoreNLPStub.responses), " answers of the server in ", responses_path)
+
+    fixture = KeyedVectors(vectors.shape[1], dtype = np.float32)
+    fixture.add_vectors(words, vectors)
+    fixture.save(model_fixture_path, separately = ["vectors"])
+    print("Saved ", len(words), " words in ", model_fixture_path)
+
+# Records the answers of the real server (through the proxy) and keeps the vectors of the words from the real model
+
+def record():
+    config.NER_BACKEND = "corenlp"
+    config.PARSE_CACHE_PATH = ""    #the saved parses would not go through the proxy
+    start_stub(config.CORENLP_URL)
+
+    words = record_queries()
+    full = word_proximity.get_model()
+    kept = sorted(w for w in words if w in full)
+    save_fixtures(kept, np.asarray(full[kept], dtype = np.float32))
+
+
+### SYNTHETIC FIXTURES
+
+# The fixtures can also be made without the server and the model ('python benchmark.py synthetic') :
+# - the answers of the server are made by simple rules : POS tags from lists of words, a flat tree of NP, PP and VP,
+#   dependencies from each phrase to the head of the sentence, and LOCATION or DATE for the areas and the years
+# - the model gives random vectors (always the same ones) to the same words as record, with the size of the GoogleNews model
+# The analysis is not as good as with the real server, but it goes through the same code with the same amount of work
+
+pos_words = {
+    "DT" : ["the", "a", "an", "this", "these", "those", "each", "every", "all"],
+    "IN" : ["of", "in", "from", "than", "between", "with", "for", "on", "at", "by", "since", "over", "during", "into",
+            "towards", "per", "until", "till", "after", "before", "about", "among", "like", "as"],
+    "TO" : ["to"],
+    "CC" : ["and", "or", "but"],
+    "WDT" : ["which", "what", "whose"],
+    "WP" : ["who"],
+    "WRB" : ["where", "when", "how", "why"],
+    "PRP" : ["i", "you", "it", "we", "they", "us", "them"],
+    "MD" : ["can", "could", "will", "would", "should"],
+    "VBZ" : ["is", "has", "does"],
+    "VBP" : ["are", "have", "do", "give", "show", "compare", "list"],
+    "VBD" : ["was", "were", "had", "did"],
+    "RBR" : ["more", "less"],
+    "JJR" : ["higher", "lower", "bigger", "smaller", "greater", "larger", "fewer", "better", "worse", "richer", "poorer"],
+    "JJS" : ["highest", "lowest", "biggest", "smallest", "greatest", "largest", "most", "least", "best", "worst"],
+    "RB" : ["today", "nowadays", "now", "not", "there"],
+}
+pos_dict = {w : tag for tag in pos_words for w in pos_words[tag]}
+
+months = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]
+
+def synthetic_pos(words):
+    res = []
+    for i in range(len(words)):
+        w = words[i]
+        if w.lower() in pos_dict:
+            res.append(pos_dict[w.lower()])
+        elif w.replace(".", "", 1).replace(",", "").isdigit():
+            res.append("CD")
+        elif not any(c.isalnum() for c in w):
+            res.append("." if w in [".", "?", "!"] else ",")
+        elif (w[0].isupper() and i > 0):
+            res.append("NNP")
+        elif w.lower().endswith("s"):
+            res.append("NNS")
+        else:
+            res.append("NN")
+    return res
+
+def synthetic_ner(words, pos):
+    locations = set()
+    trie, acronyms = area_extraction.get_gazetteer()
+    for i in range(len(words)):     #the longest name of an area from each word (as in find_areas_in_list)
+        node = trie
+        j = i
+        end = i + 1 if words[i] in acronyms else i
+        while (j < len(words) and words[j].lower() in node):
+            node = node[words[j].lower()]
+            j += 1
+            if None in node:
+                end = j
+        locations.update(range(i, end))
+    res = []
+    for i in range(len(words)):
+        if i in locations:
+            res.append("LOCATION")
+        elif ((pos[i] == "CD" and len(words[i]) == 4) or words[i].lower() in months or words[i].lower() in ["today", "nowadays"]):
+            res.append("DATE")
+        else:
+            res.append("O")
+    return res
+
+# The phrases of the sentence : (label, position of the first word, position after the last one, position of the head)
+# A preposition starts a PP with the next noun phrase, a verb is a VP, the other words are grouped in noun phrases
+
+def synthetic_phrases(pos):
+    res = []
+    i = 0
+    n = len(pos)
+    while i < n:
+        if (pos[i] in ["IN", "TO"] and i+1 < n and pos[i+1] not in ["IN", "TO", "CC", ".", ","]):
+            j = i+1
+            while (j < n and pos[j] in ["DT", "JJ", "JJR", "JJS", "CD", "NN", "NNS", "NNP", "PRP"]):
+                j += 1
+            j = max(j, i+2)
+            res.append(("PP", i, j, j-1))
+        elif (pos[i].startswith("VB") or pos[i] == "MD"):
+            j = i+1
+            res.append(("VP", i, j, i))
+        elif pos[i] in ["DT", "JJ", "JJR", "JJS", "RBR", "CD", "NN", "NNS", "NNP", "PRP", "WDT", "WP"]:
+            j = i+1
+            while (j < n and pos[j] in ["DT", "JJ", "JJR", "JJS", "CD", "NN", "NNS", "NNP"]):
+                j += 1
+            label = "WHNP" if pos[i] in ["WDT", "WP"] else "NP"
+            res.append((label, i, j, j-1))
+        else:
+            j = i+1
+            res.append((None, i, j, i))
+        i = j
+    return res
+
+# The brackets are written as in the trees of CoreNLP, so that the tree can be read again
+def leaf(word, tag):
+    word = {"(" : "-LRB-", ")" : "-RRB-"}.get(word, word)
+    return "(" + tag + " " + word + ")"
+
+def synthetic_sentence(words, with_ner):
+    pos = synthetic_pos(words)
+    ner = synthetic_ner(words, pos)
+    phrases = synthetic_phrases(pos)
+
+    verbs = [p for p in phrases if p[0] == "VP"]
+    heads = [p for p in phrases if p[0] in ["NP", "PP", "WHNP"]]
+    root = verbs[0][3] if verbs != [] else (heads[0][3] if heads != [] else 0)
+
+    tree = []
+    deps = []
+    for label, i, j, head in phrases:
+        leaves = [leaf(words[k], pos[k]) for k in range(i, j)]
+        if label == "PP":
+            tree.append("(PP " + leaves[0] + " (NP " + " ".join(leaves[1:]) + "))")
+        elif label != None:
+            tree.append("(" + label + " " + " ".join(leaves) + ")")
+        else:
+            tree += leaves
+        for k in range(i, j):   #each word depends on the head of its phrase, and the head on the root
+            if k == root:
+                deps.append({"dep" : "ROOT", "governor" : 0, "dependent" : k+1})
+            else:
+                deps.append({"dep" : "dep", "governor" : (head if k != head else root) + 1, "dependent" : k+1})
+
+    if pos[0] in ["WDT", "WP", "WRB"]:
+        top = "SBARQ"
+    elif verbs != []:
+        top = "S"
+    else:
+        top = "NP"
+
+    tokens = []
+    for k in range(len(words)):
+        token = {"index" : k+1, "word" : words[k], "originalText" : words[k], "lemma" : words[k].lower(), "pos" : pos[k]}
+        if with_ner:
+            token["ner"] = ner[k]
+        tokens.append(token)
+    return {"parse" : "(ROOT (" + top + " " + " ".join(tree) + "))", "basicDependencies" : deps, "tokens" : tokens}
+
+# Answer of the server to a request (the sentences are one per line, and already tokenized : see annotate_all)
+def synthetic_answer(properties, text):
+    with_ner = "ner" in properties.get("annotators", "").split(",")
+    sentences = []
+    for line in text.split("\n"):
+        if line.strip() != "":
+            sentence = synthetic_sentence(line.split(), with_ner)
+            sentence["index"] = len(sentences)
+            sentences.append(sentence)
+    return {"sentences" : sentences}
+
+def synthetic(size = 300):
+    config.NER_BACKEND = "corenlp"
+    config.PARSE_CACHE_PATH = ""
+    start_stub(synthetic = True)
+
+    words = sorted(record_queries())
+    generator = np.random.default_rng(0)
+    save_fixtures(words, generator.standard_normal((len(words), size)).astype(np.float32))
+
+
+### REPLAY
+
+# Makes the Chatbot use the recorded answers and the small model (and no cache saved on disk)
+
+def setup_replay():
+    if not (os.path.exists(responses_path) and os.path.exists(model_fixture_path)):
+        raise Exception("Error : no recorded fixtures, run 'python benchmark.py record' first (with the server and the model) or 'python benchmark.py synthetic'")
+    file = open(responses_path, "r", encoding = "utf-8")
+    CoreNLPStub.responses = json.load(file)
+    file.close()
+    start_stub()
+
+    config.NER_BACKEND = "corenlp"
+    config.PARSE_CACHE_PATH = ""
+    word_proximity.model_path = model_fixture_path
+    topic_extraction.index_path = topic_index_path
+    analyse.warmup()
+
+# All the caches are emptied before each round, so that each round measures the same work
+def clear_caches():
+    for c in word_proximity.caches.values():
+        c.clear()
+    annotation.parse_cache.clear()
+
+# The errors of the analysis are part of its normal behaviour (see find_aggregators) : they do not stop the benchmark
+def attempt(f, *args):
+    try:
+        f(*args)
+    except Exception:
+        pass
+
+# p50, p95 and p99 of a stage (in milliseconds)
+def stage_results(stage):
+    t = tracing.summary(stage)
+    return {"p50" : t["p50"], "p95" : t["p95"], "p99" : t["p99"], "calls" : t["calls"]}
+
+# Times each stage on all the queries, 'rounds' times
+# The extractors are timed on annotations made beforehand, and analyse does everything (including the stub server)
+# analyse records its own stages with the same names as the extractors : it is timed after them, on new histograms
+
+def run(rounds = 3):
+    queries = [normalize(q) for q in load_queries()]
+    dim_queries = load_dimension_queries()
+    tracing.enable()
+    tracing.reset()
+
+    for r in range(rounds):
+        clear_caches()
+        sentences = [tracing.timed("annotate", annotate, sent) for sent in queries]
+        for sentence in sentences:
+            attempt(tracing.timed, "find_time", find_time, sentence)
+            attempt(tracing.timed, "find_areas", find_areas_in_tree, sentence.parse, sentence.tokens)
+            t = type_of_sentence(sentence)
+            attempt(tracing.timed, "find_aggregators", find_aggregators, sentence, t[1], t[3])
+        for sent in queries:
+            attempt(tracing.timed, "find_topic", find_topic, sent, 3)
+        for q, table in dim_queries:
+            attempt(dimension_fill, nltk.word_tokenize(q), table, 0)   #dimension_fill is already traced
+    stages = ["annotate", "find_time", "find_areas", "find_aggregators", "find_topic", "dimension_fill"]
+    results = {stage : stage_results(stage) for stage in stages}
+
+    tracing.reset()
+    for r in range(rounds):
+        clear_caches()
+        with contextlib.redirect_stdout(io.StringIO()):  #analyse prints its results
+            for sent in queries:
+                attempt(tracing.timed, "analyse", analyse.analyse, sent)
+    results["analyse"] = stage_results("analyse")
+    return results
+
+
+### BASELINE
+
+def print_results(results, baseline = None):
+    print("Stage                  p50 (ms)   p95 (ms)   p99 (ms)   p95 / baseline")
+    for stage, res in results.items():
+        line = stage.ljust(20) + ("%.2f" % res["p50"]).rjust(11) + ("%.2f" % res["p95"]).rjust(11) + ("%.2f" % res["p99"]).rjust(11)
+        if (baseline != None and stage in baseline):
+            line += ("%.2f" % (res["p95"] / max(baseline[stage]["p95"], 1e-6))).rjust(17)
+        print(line)
+
+# Returns the stages whose p95 is higher than tolerance * p95 of the baseline
+def regressions(results, baseline, tolerance):
+    res = []
+    for stage in results:
+        if (stage in baseline and results[stage]["p95"] > tolerance * baseline[stage]["p95"]):
+            res.append(stage)
+    return res
+
+
+### EXECUTION
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description = "Benchmark of the analysis with recorded CoreNLP answers")
+    arg_parser.add_argument("mode", nargs = "?", choices = ["run", "record", "synthetic"], default = "run")
+    arg_parser.add_argument("--rounds", type = int, default = 3, help = "number of times each query is analysed")
+    arg_parser.add_argument("--save-baseline", action = "store_true", help = "save the results as the new baseline")
+    arg_parser.add_argument("--tolerance", type = float, default = 1.25, help = "allowed ratio of p95 against the baseline")
+    args = arg_parser.parse_args()
+
+    if args.mode == "record":
+        record()
+        sys.exit(0)
+    if args.mode == "synthetic":
+        synthetic()
+        sys.exit(0)
+
+    setup_replay()
+    results = run(args.rounds)
+
+    baseline = None
+    if os.path.exists(baseline_path):
+        file = open(baseline_path, "r")
+        baseline = json.load(file)
+        file.close()
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        file = open(baseline_path, "w")
+        json.dump(results, file, indent = 1)
+        file.close()
+        print("Baseline saved in ", baseline_path)
+    elif baseline != None:
+        slower = regressions(results, baseline, args.tolerance)
+        if slower != []:
+            print("Slower than the baseline : ", ", ".join(slower))
+            sys.exit(1)
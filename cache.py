@@ -0,0 +1,175 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains a small caching layer used to avoid computing the same things again and again
+# An LRUCache keeps at most 'maxsize' results : when it is full, the least recently used one is removed
+# It also counts its hits (result found) and misses (result computed), and can be saved into a file to be reloaded later
+# A DiskCache keeps json values in a sqlite file, for results that are worth keeping between sessions
+
+### IMPORT
+
+# Python libraries import
+from collections import OrderedDict
+import functools
+import os
+import json
+import pickle
+import sqlite3
+import threading
+
+import tracing
+
+
+### CACHE
+
+# If the cache has a name, its hits and misses are also counted in the trace of the current query (see tracing.py)
+
+class LRUCache:
+
+    def __init__(self, maxsize = 10000, name = None):
+        self.maxsize = maxsize
+        self.name = name
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    # Returns the value stored for key (and marks it as recently used), or default if there is none
+    def get(self, key, default = None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                if (tracing.enabled and self.name != None):
+                    tracing.count("cache." + self.name + ".miss")
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            if (tracing.enabled and self.name != None):
+                tracing.count("cache." + self.name + ".hit")
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last = False)
+
+    def pop(self, key, default = None):
+        with self.lock:
+            return self.data.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {"size" : len(self.data), "maxsize" : self.maxsize, "hits" : self.hits, "misses" : self.misses}
+
+    # The items are saved from the least to the most recently used, so that the order is kept when reloading
+    def items(self):
+        with self.lock:
+            return list(self.data.items())
+
+    def update(self, items):
+        for key, value in items:
+            self.put(key, value)
+
+
+# This decorator stores the results of a function in an LRUCache (the arguments of the function are the key)
+
+missing = object()
+
+def memoize(cache):
+    def decorator(f):
+        @functools.wraps(f)
+        def g(*args):
+            res = cache.get(args, missing)
+            if res is missing:
+                res = f(*args)
+                cache.put(args, res)
+            return res
+        g.cache = cache
+        return g
+    return decorator
+
+
+### PERSISTENCE
+
+# Several caches (given as a dictionary name -> LRUCache) can be saved together in one file
+# and reloaded at the next start (warm restart)
+
+def save_caches(caches, file_path):
+    content = {}
+    for name in caches:
+        content[name] = caches[name].items()
+    directory = os.path.dirname(file_path)
+    if directory != "":
+        os.makedirs(directory, exist_ok = True)
+    tmp_path = file_path + ".tmp"
+    file = open(tmp_path, "wb")
+    pickle.dump(content, file)
+    file.close()
+    os.replace(tmp_path, file_path)
+
+def load_caches(caches, file_path):
+    try:
+        file = open(file_path, "rb")
+    except OSError:
+        return
+    try:
+        content = pickle.load(file)
+    except Exception:
+        content = {}    #the file is damaged : we just start with empty caches
+    file.close()
+    for name in caches:
+        if name in content:
+            caches[name].update(content[name])
+
+
+### DISK CACHE
+
+# A DiskCache stores values (anything that can be written in json) in a sqlite database, one line per key
+# It can be shared by several processes, and is used behind an LRUCache (the LRUCache is asked first)
+
+class DiskCache:
+
+    def __init__(self, file_path):
+        directory = os.path.dirname(file_path)
+        if directory != "":
+            os.makedirs(directory, exist_ok = True)
+        self.connection = sqlite3.connect(file_path, check_same_thread = False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+        self.lock = threading.Lock()
+
+    def get(self, key, default = None):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row == None:
+            return default
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        text = json.dumps(value, separators = (",", ":"))
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, text))
+            self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -9,9 +9,6 @@
 
 # Python libraries import
 import nltk
-from nltk.parse import CoreNLPParser
-from nltk.parse.corenlp import CoreNLPDependencyParser
-from nltk.tag.stanford import StanfordNERTagger
 import os
 import pandas as pd
 
@@ -24,43 +21,35 @@ import numpy as np
 
 # Generic analysis functions import
 from question_type import type_of_sentence
-from time_extraction import find_time
-from area_extraction import find_areas
+from time_extraction import find_time, single_year
+from area_extraction import find_areas_in_tree, find_areas_in_list
 from aggregator_extraction import find_aggregators
 
 # Specific analysis functions import
-from topic_extraction import find_topic
+import topic_extraction
+import dimension_extraction
+from topic_extraction import find_topic, query_words
 from dimension_extraction import dimension_fill
 
+# Annotation import
+import annotation
+from annotation import annotate
+
 # Utils import
 from parsing_analysis import get_subtrees, get_nodes, find_links
 from utils import lower_list, normalize_figures, transform_dates
 from metadata_extraction import *
+from data_fetching import fetch_series
+from observation_store import observations
+import tracing
 import utils
 
 
-### PARSERS
+### PATHS
 
 #Generic path
 path = os.getcwd()
 
-#Java path
-java_path = "C:/Program Files (x86)/Java/jre1.8.0_251/bin/java.exe"
-os.environ['JAVAHOME'] = java_path
-
-#Files of the NER
-jar = os.path.join(path, "Stanford_NER/stanford-ner-4.0.0/stanford-ner.jar")
-model = os.path.join(path, "Stanford_NER/stanford-ner-4.0.0/classifiers/english.muc.7class.distsim.crf.ser.gz")
-
-#Loading the parsers
-parser = CoreNLPParser(url='http://localhost:9000')
-dep_parser = CoreNLPDependencyParser(url='http://localhost:9000')
-ner_tagger = StanfordNERTagger(model, jar, encoding='utf8')
-pos_tagger = CoreNLPParser(url='http://localhost:9000', tagtype='pos')
-
-
-### PATHS
-
 df_path = os.path.join(path, "data/Tables.csv")
 
 ### LOADING
@@ -85,6 +74,17 @@ region_dict = utils.region_dict
 
 NOW = 2020
 
+### WARMUP
+
+# The models and dictionaries are only loaded when they are first needed (so the first query is slow)
+# This function loads everything in advance
+
+def warmup():
+    annotation.warmup()
+    topic_extraction.warmup()
+    dimension_extraction.warmup()
+
+
 ### FUNCTIONS
 
 
@@ -98,38 +98,6 @@ def get_tag(a):
 url_test = "http://nsi-staging-oecd.redpelicans.com/rest/data/OECD.GOV,DF_GOV_OG,2.0/A.OUR_DAC.FR.INDEX?startPeriod=2017&endPeriod=2019&dimensionAtObservation=AllDimensions"
 url_test2 = "http://nsi-staging-oecd.redpelicans.com/rest/data/OECD.GOV,DF_GOV_1,1.1/A.GGINTN.FR.S13._T._T._T.USD?startPeriod=2010&endPeriod=2018&dimensionAtObservation=AllDimensions"
 
-# With the URL of the data on the Web Service, extract the values for the time period and return a table
-# If only one year is asked, it returns a table with only one value
-# All the dimensions should already be specified in the entry URL
-# This function just loads the URL and explore the tree to get the values
-def get_values(url):
-    file = urlopen(url)
-    tree = ET.parse(file)
-    header, data = tree.getroot()
-
-    years = []
-    values = []
-
-    for obs in data:
-        y = 0
-        v = 0
-        m = 0
-
-        for element in obs[0]:
-            if (element.attrib['id'] == "TIME_PERIOD"):
-                y = int(element.attrib['value'])
-
-        v = float(obs[1].attrib['value'])
-
-        for element in obs[2]:
-            if (element.attrib['id'] == "UNIT_MULT"):
-                m = pow(10,int(element.attrib['value']))
-
-        years.append(y)
-        values.append(m*v)
-
-    return (years, values)
-
 # Given a list of countries/regions, returns the codes of all the countries concerned
 # France --> ['FR']
 # Western Europe --> ['AT','BE','FR','DE','LU','NL','CH']
@@ -162,9 +130,9 @@ def country_situation(dim):
     else:
         return 0
 
-# Given the dimensions, their values, the code of the table, the countries, and the time period,
-# creates the final URL used to query the data
-def create_url(dimensions, values, code, y1, y2, country):
+# Given the dimensions, their values and the countries, creates the key of the serie
+# (the values of all the dimensions except the time, in the order of the table)
+def create_key(dimensions, values, country):
     filter = []
     ctry = ["REF_AREA", "REPORTING_COUNTRY", "COUNTERPART_COUNTRY"]
     for d in dimensions:
@@ -173,12 +141,47 @@ def create_url(dimensions, values, code, y1, y2, country):
                 filter.append(country[d])
             else:
                 filter.append(values[d])
+    return filter
+
+# The function get_values_batch takes the queries to do, as a dictionary name -> (values, country, year_from, year_to)
+# (values and country as in create_key) and returns a dictionary name -> (years, values)
+# The series already downloaded are kept in the observation store (see observation_store.py) :
+# only the missing years are asked, with as few requests as possible, downloaded in parallel, and the answer is split by serie
+# (see fetch_series in data_fetching.py)
+# The queries without any data are not in the result
+
+@tracing.traced("data")
+def get_values_batch(dimensions, code, queries):
+    keys = {}
+    for name in queries:
+        values, country, y1, y2 = queries[name]
+        keys[name] = create_key(dimensions, values, country)
+
+    # The keys to download, grouped by missing period
+    to_fetch = {}
+    for name in queries:
+        y1, y2 = queries[name][2], queries[name][3]
+        for period in observations.missing(code, ".".join(keys[name]), y1, y2):
+            to_fetch.setdefault(period, {})[".".join(keys[name])] = keys[name]
+
+    # The series answered are saved, even without data, so that they are not asked again (see fetch_series in data_fetching.py)
+    dim_names = [d for d in dimensions if d != "TIME_PERIOD"]
+    series = fetch_series(code, {period : list(period_keys.values()) for period, period_keys in to_fetch.items()}, dim_names)
+    for (y1, y2, key), (years, vals) in series.items():
+        observations.add(code, key, y1, y2, years, vals)
+
+    res = {}
+    for name in queries:
+        values, country, y1, y2 = queries[name]
+        years, vals = observations.get(code, ".".join(keys[name]), y1, y2)
+        if len(years) > 0:
+            res[name] = (years, vals)
+    return res
 
-    prefix = "http://nsi-staging-oecd.redpelicans.com/rest/data/"
-    suffix = "&dimensionAtObservation=AllDimensions"
-
-    url = prefix + code + "/" + ".".join(filter) + "?startPeriod=" + str(y1) + "&endPeriod=" + str(y2) + suffix
-    return url
+# Same thing for only one serie : returns (years, values), empty if there is no data
+def get_serie(dimensions, code, values, country, y1, y2):
+    res = get_values_batch(dimensions, code, {0 : (values, country, y1, y2)})
+    return res.get(0, (np.array([], dtype = int), np.array([])))
 
 # Get the index of an element in a list
 def get_index(elt, liste):
@@ -187,6 +190,11 @@ def get_index(elt, liste):
             return i
     return None
 
+# Asks the user : the time waiting for the answer is not counted in the duration of the query (see waiting in tracing.py)
+def ask(prompt):
+    with tracing.waiting():
+        return input(prompt)
+
 # Given the dimensions and the current values (found with dimension_fill), this function
 # asks the user for the remaining information (all the dimensions with the current value None)
 # It displays to the user the possible values for a given dimension and asks which one to take
@@ -198,10 +206,9 @@ def complete_dims(dims,dimensions,concepts,constraints,codelists):
             cons = constraints[d]
             cl = codelists[triplet[2]]
             for i in range(len(cons)):
-                for c in cl:
-                    if c[0] == cons[i]:
-                        print(i, " - ", c[1])
-            j = input(">> ")
+                if cons[i] in cl:
+                    print(i, " - ", cl[cons[i]])
+            j = ask(">> ")
             b = False
             while (not b):
                 try :
@@ -209,82 +216,202 @@ def complete_dims(dims,dimensions,concepts,constraints,codelists):
                     b = True
                 except:
                     print("Incorrect input")
-                    j = input(">> ")
+                    j = ask(">> ")
             dims[d] = val
     return dims
 
 
+### SESSION
+
+# A session keeps the context of a conversation, so that a follow-up question ("and for Germany ?", "what about 2015 ?")
+# does not start from zero : the topic chosen by the user, the metadata of its table, the values of the dimensions
+# (found by dimension_fill or chosen by the user), the type of the question, its aggregators, its time and its areas
+# A follow-up question only changes the time and/or the areas : the topic is not ranked again and the user is not asked again
+# The observations already downloaded stay in the observation store (see observation_store.py),
+# so only the missing series (new countries) or the missing years are downloaded
+# A question is a follow-up when there is no keyword left once the areas are removed (only a time or a place is given),
+# or when it starts like one (follow_up_starts) without any keyword that was not in the previous question
+
+follow_up_starts = [["and"], ["what", "about"], ["how", "about"], ["same"], ["also"]]
+
+class ChatSession:
+
+    def __init__(self):
+        self.topic = None
+        self.meta = None
+        self.s_type = None
+        self.agg = None
+        self.time = None
+        self.area = None
+        self.dims = {}          #part of the question ('main', or 'first' and 'second' for a complex comparison) -> values of the dimensions
+        self.choices = {}       #dimension -> value chosen by the user (for the current topic)
+        self.follow_up = False  #is the current question a follow-up
+        self.keywords = []      #keywords of the last question which was not a follow-up
+
+    def reset(self):
+        self.__init__()
+
+    # The dimensions of the previous topic are forgotten when the topic changes
+    def set_topic(self, topic, meta):
+        if topic != self.topic:
+            self.dims = {}
+            self.choices = {}
+        self.topic = topic
+        self.meta = meta
+
+    # keywords are the keywords of the question without its areas (see question_keywords)
+    # A question starting like a follow-up can repeat the keywords of the previous question, but not bring new ones
+    def is_follow_up(self, tokens, keywords):
+        if self.topic == None:
+            return False
+        lower = [w.lower() for w in tokens]
+        for start in follow_up_starts:
+            if lower[:len(start)] == start:
+                return [w for w in keywords if (w not in start and w not in self.keywords)] == []
+        return keywords == []
+
+# The keywords of the question (see query_words in topic_extraction.py), without the words of its areas
+# The areas are removed as they are written in the sentence ("UK", "french" ...), as found by the gazetteer
+
+def question_keywords(sent, tokens):
+    area_words = set()
+    for a in find_areas_in_list(tokens):
+        area_words.update(w.lower() for w in a[0].split(" "))
+    return [w for w in query_words(sent) if w not in area_words]
+
+# Fills the dimensions of the table for (a part of) the question : with dimension_fill, then with the values
+# the user already chose in the session, and finally by asking the user (complete_dims)
+# In a follow-up question, the values of the previous question are kept
+
+def fill_dims(words, topic, meta, session = None, part = "main"):
+    if (session != None and session.follow_up and part in session.dims):
+        return session.dims[part]
+    dims = dimension_fill(words, topic, 0.5)
+    if session != None:
+        for d in dims:
+            if (dims[d] == None and d in session.choices):
+                dims[d] = session.choices[d]
+    asked = [d for d in dims if dims[d] == None]
+    dims = complete_dims(dims, meta["dimensions"], meta["concepts"], meta["constraints"], meta["codelists"])
+    if session != None:
+        for d in asked:
+            session.choices[d] = dims[d]
+        session.dims[part] = dict(dims)
+    return dims
+
+
 ### Function to call the chatbot
-def chatbot(sent):
+
+# With a session (ChatSession), the context of the previous questions is used for the follow-up questions (see above)
+# The time of each stage is recorded when the tracing is enabled (see tracing.py)
+def chatbot(sent, session = None):
+    tracing.start_trace(sent)
+    try:
+        answer_question(sent, session)
+    finally:
+        tracing.end_trace()
+
+# The analysis of the question, the choices of the user and the answer
+def answer_question(sent, session):
 
 # Normalizing + Tokenizing
-    sent = transform_dates(normalize_figures(sent))
-    words = nltk.word_tokenize(sent)
+    with tracing.span("normalization"):
+        sent = transform_dates(normalize_figures(sent))
+        words = nltk.word_tokenize(sent)
 
-# Parsing
-    parse = next(parser.raw_parse(sent))
-    parse_d = list(dep_parser.parse(nltk.word_tokenize(sent)))[0]
-    ner = ner_tagger.tag(words)
-    pos = list(pos_tagger.tag(words))
+# Parsing (only one call to the server, see annotation.py)
+    with tracing.span("annotation"):
+        sentence = annotate(sent, words)
 
 
 # Analysis
 
-    # Type of sentence
-    s_type = type_of_sentence(parse,parse_d)
     # Time
-    time = find_time(ner, parse, parse_d)
+    with tracing.span("find_time"):
+        time = find_time(sentence)
     # Area
-    area = find_areas(sent)
-    # Comparisons & Aggregations
-    try :
-        agg = find_aggregators(parse, parse_d, s_type[1], s_type[3])
-    except Exception as e:
-        agg = ([],None)
-        #print(e)
-
-
+    with tracing.span("find_areas"):
+        area = find_areas_in_tree(sentence.parse, sentence.tokens)
+
+    keywords = question_keywords(sent, sentence.tokens)
+    follow_up = (session != None and session.is_follow_up(sentence.tokens, keywords))
+    if session != None:
+        session.follow_up = follow_up
+        if not follow_up:
+            session.keywords = keywords
+
+    new_time = (time[0] != None or time[1] != None)
+    if follow_up:
+        # Same question as before, with a new time and/or new areas
+        s_type = session.s_type
+        agg = session.agg
+        if not new_time:
+            time = session.time
+        if (area[0] == [] and area[1] == [] and area[2] == []):
+            area = session.area
+    else:
+        # Type of sentence
+        with tracing.span("type_of_sentence"):
+            s_type = type_of_sentence(sentence)
+        # Comparisons & Aggregations
+        try :
+            with tracing.span("find_aggregators"):
+                agg = find_aggregators(sentence, s_type[1], s_type[3])
+        except Exception as e:
+            agg = ([],None)
+            #print(e)
 
-    ## Selection of the topic with the user
+    if session != None:
+        session.s_type = s_type
+        session.agg = agg
+        session.time = time
+        session.area = area
 
-    maxis, topics, cat = find_topic(sent, n=3)
 
-    good_topic = None
-    choices = list(set(topics[0] + topics[1] + topics[2] + categories[cat]))
+    ## Selection of the topic with the user (not for a follow-up question : the topic stays the same)
 
-    print("Please select the most relevant topic (type the number) :")
-    print()
-    for i in range(len(choices)):
-        print(i, " - ", full_name[choices[i]])
-    n = input(">> ")
-    print()
-    b = False
-    while (not b):
-        try :
-            good_topic = choices[int(n)]
-            b = True
-        except:
-            print("Incorrect input")
-            n = input(">> ")
+    if follow_up:
+        good_topic = session.topic
+        meta = session.meta
 
-    #print("Correct topic is : ", good_topic)
+    else:
+        with tracing.span("find_topic"):
+            maxis, topics, cat = find_topic(sent, n=3)
+
+        good_topic = None
+        choices = list(set(topics[0] + topics[1] + topics[2] + categories[cat]))
+
+        print("Please select the most relevant topic (type the number) :")
+        print()
+        for i in range(len(choices)):
+            print(i, " - ", full_name[choices[i]])
+        n = ask(">> ")
+        print()
+        b = False
+        while (not b):
+            try :
+                good_topic = choices[int(n)]
+                b = True
+            except:
+                print("Incorrect input")
+                n = ask(">> ")
 
+        #print("Correct topic is : ", good_topic)
 
-    ## Loading Metadata
 
-    structure_prefix = "http://nsi-staging-oecd.redpelicans.com/rest/dataflow/"
-    structure_suffix = "?references=all&detail=referencepartial"
+        ## Loading Metadata
 
-    metadata_url = structure_prefix + code_dict[good_topic] + structure_suffix
+        # The metadata is only downloaded if it is not already saved (see get_metadata in metadata_extraction.py)
+        with tracing.span("metadata"):
+            meta = get_metadata(code_dict[good_topic])
 
-    file = urlopen(metadata_url)
-    tree = ET.parse(file)
-    header, structure = tree.getroot()
+        if session != None:
+            session.set_topic(good_topic, meta)
 
-    dimensions = get_dimensions(structure)
-    codelists = get_codelists(structure)
-    constraints = get_constaints(structure)
-    concepts = get_concepts(structure)
+    dimensions = meta["dimensions"]
+    codelists = meta["codelists"]
+    constraints = meta["constraints"]
+    concepts = meta["concepts"]
 
 
 
@@ -302,8 +429,7 @@ def chatbot(sent):
 
 
         # Filling dimensions
-        dims = dimension_fill(words,good_topic,0.5)
-        dims = complete_dims(dims,dimensions,concepts,constraints,codelists)
+        dims = fill_dims(words, good_topic, meta, session)
 
 
         # Finding the locations
@@ -313,16 +439,16 @@ def chatbot(sent):
         location = {}
         if situation == 1:
             cl = {}
-            for pays_code, pays_nom in codelists[dimensions["REF_AREA"][2]]:
+            for pays_code, pays_nom in codelists[dimensions["REF_AREA"][2]].items():
                 cl[pays_nom] = pays_code
             countries = get_countries_code(area[0], cl)
         elif situation == 2:
             cl1 = {}
             cl2 = {}
 
-            for pays_code, pays_nom in codelists[dimensions["REPORTING_COUNTRY"][2]]:
+            for pays_code, pays_nom in codelists[dimensions["REPORTING_COUNTRY"][2]].items():
                 cl1[pays_nom] = pays_code
-            for pays_code, pays_nom in codelists[dimensions["COUNTERPART_COUNTRY"][2]]:
+            for pays_code, pays_nom in codelists[dimensions["COUNTERPART_COUNTRY"][2]].items():
                 cl2[pays_nom] = pays_code
 
             country["REPORTING_COUNTRY"] = get_countries_code(area[0], cl1)[0]
@@ -341,8 +467,7 @@ def chatbot(sent):
 
             if len(countries) == 1:   #Only 1 country
                 country["REF_AREA"] = countries[0]
-                data_url = create_url(dimensions, dims, data_code, year_from, year_to, country)
-                values = get_values(data_url)
+                values = get_serie(dimensions, data_code, dims, country, year_from, year_to)
 
                 # One value : just print
                 if year_from == year_to:
@@ -364,12 +489,17 @@ def chatbot(sent):
 
                 fig,ax = plt.subplots()
 
-                # For each country, we get the values, add the serie to a plot and add the values to the dictionary for the DataFrama
+                # First we get the values of all the countries at once (in as few requests as possible)
+                queries = {}
+                for c in countries:
+                    country["REF_AREA"] = c
+                    queries[c] = (dims, dict(country), year_from, year_to)
+                all_values = get_values_batch(dimensions, data_code, queries)
+
+                # For each country, we add the serie to a plot and add the values to the dictionary for the DataFrama
                 for i in range(n):
                     c = countries[i]
-                    country["REF_AREA"] = c
-                    data_url = create_url(dimensions, dims, data_code, year_from, year_to, country)
-                    values = get_values(data_url)
+                    values = all_values.get(c, ([],[]))
 
                     df_val = []
                     for j in range(year_from, year_to+1):
@@ -398,8 +528,7 @@ def chatbot(sent):
         # In situation 2, there are only two countries : FROM and TO
         # So we can print the value or (in case of a time serie) plot the graph
         elif situation == 2:
-            data_url = create_url(dimensions, dims, data_code, year_from, year_to, country)
-            values = get_values(data_url)
+            values = get_serie(dimensions, data_code, dims, country, year_from, year_to)
             if year_from == year_to:
                 print("The value is : ", values[1][0])
             else:
@@ -421,7 +550,7 @@ def chatbot(sent):
 
         # Codelist for the countries
         cl = {}
-        for pays_code, pays_nom in codelists[dimensions["REF_AREA"][2]]:
+        for pays_code, pays_nom in codelists[dimensions["REF_AREA"][2]].items():
             cl[pays_nom] = pays_code
 
 
@@ -440,15 +569,17 @@ def chatbot(sent):
             else:
                 comp = comparisons[0]
 
-                # Splitting the sentence and doing both analyses
-                sent1, sent2 = sent.split("than")
-                words1 = nltk.word_tokenize(sent1)
-                words2 = nltk.word_tokenize(sent2)
+                # Splitting the sentence and doing both analyses (kept from the previous question for a follow-up)
+                if (follow_up and "first" in session.dims and "second" in session.dims):
+                    dims1 = session.dims["first"]
+                    dims2 = session.dims["second"]
+                else:
+                    sent1, sent2 = sent.split("than")
+                    words1 = nltk.word_tokenize(sent1)
+                    words2 = nltk.word_tokenize(sent2)
 
-                dims1 = dimension_fill(words1,good_topic,0.5)
-                dims1 = complete_dims(dims1,dimensions,concepts,constraints,codelists)
-                dims2 = dimension_fill(words2,good_topic,0.5)
-                dims2 = complete_dims(dims2,dimensions,concepts,constraints,codelists)
+                    dims1 = fill_dims(words1, good_topic, meta, session, "first")
+                    dims2 = fill_dims(words2, good_topic, meta, session, "second")
 
                 try:
                     region = comp[2]["AREA"][0]
@@ -467,43 +598,66 @@ def chatbot(sent):
                         year1 = NOW
                         year2 = NOW
 
+                # In a follow-up question, the new time and the new region replace the ones of the comparison
+                # A comparison between two years can not take only one new year : the user is told so, instead of the same answer
+                if follow_up:
+                    if new_time:
+                        if year1 != year2:
+                            print("This question compares two years : please ask the whole question with the new years")
+                            return
+                        year1 = single_year(time, year1)
+                        year2 = year1
+                    for r in area[0]:
+                        if r[1] == "region":
+                            region = r[0]
+
 
             # Then, for each country we do the comparison of value 1 and value 2
             # And we keep the country where the comparison is true
+
+            # First we build the queries of value 1 and value 2 for each country
+            queries = {}
+            tested = []
             for c in world:
                 # If no region is specified, every country is tested
                 # if a region is specified, we check if the country belongs to it
                 if ((region == None) or (c in region_dict[region])):
                     country = {}
-                    b = 0
-
-                    # We try to get value 1 and value 2 for the country
                     try :
                         country["REF_AREA"] = cl[c]
-                        data_url1 = create_url(dimensions, dims1, data_code, year1, year1, country)
-                        data_url2 = create_url(dimensions, dims2, data_code, year2, year2, country)
-                        try :
-                            value1 = get_values(data_url1)[1][0]
-                            value2 = get_values(data_url2)[1][0]
-                            #print(value1)
-                            #print(value2)
-
-                            # And then we perform the test
-                            if ((comp[1] == 'sup') and (value1 > value2)):
-                                b = True
-                            elif ((comp[1] == 'inf') and (value1 < value2)):
-                                b = True
-
-                        # Else, we do not have the data and the country is removed
-                        except:
-                            b = False
-                            #print("Missing data : ", c)
+                        queries[(c,1)] = (dims1, country, year1, year1)
+                        queries[(c,2)] = (dims2, country, year2, year2)
+                        tested.append(c)
                     except:
-                        b = False
+                        pass
                         #print("Missing data : ", c)
 
-                    if b:
-                        res[c] = [value1, value2]
+            # Then we get all the values at once (in as few requests as possible)
+            all_values = get_values_batch(dimensions, data_code, queries)
+
+            for c in tested:
+                b = False
+
+                # We try to get value 1 and value 2 for the country
+                try :
+                    value1 = all_values[(c,1)][1][0]
+                    value2 = all_values[(c,2)][1][0]
+                    #print(value1)
+                    #print(value2)
+
+                    # And then we perform the test
+                    if ((comp[1] == 'sup') and (value1 > value2)):
+                        b = True
+                    elif ((comp[1] == 'inf') and (value1 < value2)):
+                        b = True
+
+                # Else, we do not have the data and the country is removed
+                except:
+                    b = False
+                    #print("Missing data : ", c)
+
+                if b:
+                    res[c] = [value1, value2]
 
             # We build the result DataFrame at the end and print it
             df_res = pd.DataFrame.from_dict(res, orient = 'index', columns = ["Value 1", "Value 2"])
@@ -515,8 +669,7 @@ def chatbot(sent):
         elif len(comparisons)>0:
 
             # Filling the dimensions
-            dims = dimension_fill(words,good_topic,0.5)
-            dims = complete_dims(dims,dimensions,concepts,constraints,codelists)
+            dims = fill_dims(words, good_topic, meta, session)
 
             #Finding the time in all the comparisons (if any)
             #Finding the region in all the comparisons (if any)
@@ -537,6 +690,14 @@ def chatbot(sent):
             if year == None:
                 year = NOW
 
+            # In a follow-up question, the new time and the new region replace the ones of the comparisons
+            if follow_up:
+                if new_time:
+                    year = single_year(time, year)
+                for r in area[0]:
+                    if r[1] == "region":
+                        region = [r[0]]
+
             if (region != None and region != []):
                 country_list = region_dict[region[0]]
             else:
@@ -566,8 +727,7 @@ def chatbot(sent):
                     comp_country = comp[4]["AREA"]
                     try:
                         country["REF_AREA"] = cl[comp_country]
-                        data_url = create_url(dimensions, dims, data_code, year, year, country)
-                        comp_value = get_values(data_url)[1][0]
+                        comp_value = get_serie(dimensions, data_code, dims, country, year, year)[1][0]
                         print("comparative value : ", comp_value)
                     except:
                         pass
@@ -576,11 +736,19 @@ def chatbot(sent):
                 if comp_value == None:
                     print("Error : comparison not understood")
                 else:
+                    # The values of all the countries are downloaded at once (in as few requests as possible)
+                    queries = {}
                     for pays in country_list:
                         try:
                             country["REF_AREA"] = cl[pays]
-                            data_url = create_url(dimensions, dims, data_code, year, year, country)
-                            pays_value = get_values(data_url)[1][0]
+                            queries[pays] = (dims, dict(country), year, year)
+                        except:
+                            pass
+                    all_values = get_values_batch(dimensions, data_code, queries)
+
+                    for pays in country_list:
+                        try:
+                            pays_value = all_values[pays][1][0]
                         except:
                             pays_value = None
 
@@ -600,11 +768,16 @@ def chatbot(sent):
             res_dict = {}
 
             # Then we can create a DataFrame with the remaining countries and their values
+            queries = {}
             for pays in country_list:
                 country["REF_AREA"] = cl[pays]
-                data_url = create_url(dimensions, dims, data_code, year, year, country)
-                pays_value = get_values(data_url)[1][0]
-                res_dict[pays] = pays_value
+                queries[pays] = (dims, dict(country), year, year)
+            all_values = get_values_batch(dimensions, data_code, queries)
+            for pays in country_list:
+                try:
+                    res_dict[pays] = all_values[pays][1][0]
+                except:
+                    pass
             df_res = pd.DataFrame.from_dict(res_dict, orient = "index", columns = ["Value"])
             # And apply an aggregation if there is one
             if aggreg != None:
@@ -632,15 +805,21 @@ def chatbot(sent):
 
 
             year = time[0]
-            dims = dimension_fill(words,good_topic,0.5)
-            dims = complete_dims(dims,dimensions,concepts,constraints,codelists)
+            dims = fill_dims(words, good_topic, meta, session)
 
+            # The values of all the countries of the region are downloaded at once (in as few requests as possible)
+            queries = {}
             for pays in region_dict[region]:
                 try:
                     country["REF_AREA"] = cl[pays]
-                    data_url = create_url(dimensions, dims, data_code, year, year, country)
-                    pays_value = get_values(data_url)[1][0]
-                    res_dict[pays] = pays_value
+                    queries[pays] = (dims, dict(country), year, year)
+                except:
+                    pass
+            all_values = get_values_batch(dimensions, data_code, queries)
+
+            for pays in queries:
+                try:
+                    res_dict[pays] = all_values[pays][1][0]
                 except:
                     pass
             # Creating the dataframe
@@ -662,3 +841,16 @@ def chatbot(sent):
         pass
 
     # This part should be very similar to the part "List of countries", inverting the area and time dimensions
+
+
+### CONVERSATION
+
+# Asks the questions one after the other in the same session (an empty question ends the conversation)
+
+def conversation():
+    session = ChatSession()
+    while True:
+        sent = input("Question >> ")
+        if sent.strip() == "":
+            break
+        chatbot(sent, session)
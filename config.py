@@ -0,0 +1,102 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains the configuration of the Chatbot (servers, third party files ...)
+# Each value can be changed here or overwritten with an environment variable of the same name (prefixed by 'CHATBOT_')
+
+### IMPORT
+
+# Python libraries import
+import os
+
+
+### PATHS
+
+#Generic path
+path = os.getcwd()
+
+def setting(name, default):
+    return os.environ.get("CHATBOT_" + name, default)
+
+
+### CORENLP
+
+# URL of the CoreNLP server (launched with Stanford_Parser/serveur.bat)
+CORENLP_URL = setting("CORENLP_URL", "http://localhost:9000")
+
+
+### NER
+
+# Backend used for the Named Entity Recognition :
+# - 'corenlp' : the NER is done by the CoreNLP server, in the same call as the parsing (see annotation.py)
+# - 'stanford' : the NER is done by a Stanford NER server (NERServer) kept alive for the whole session (see ner.py)
+NER_BACKEND = setting("NER_BACKEND", "corenlp")
+
+#Java path (to be changed)
+JAVA_PATH = setting("JAVA_PATH", "C:/Program Files (x86)/Java/jre1.8.0_251/bin/java.exe")
+
+#Files of the NER
+NER_JAR = setting("NER_JAR", os.path.join(path, "Stanford_NER/stanford-ner-4.0.0/stanford-ner.jar"))
+NER_MODEL = setting("NER_MODEL", os.path.join(path, "Stanford_NER/stanford-ner-4.0.0/classifiers/english.muc.7class.distsim.crf.ser.gz"))
+
+# Address of the Stanford NER server (started automatically if nothing is listening there)
+NER_HOST = setting("NER_HOST", "localhost")
+NER_PORT = int(setting("NER_PORT", "9199"))
+
+
+### WORD2VEC
+
+# Compact Word2Vec model created by w2v_conversion.py, loaded with mmap (shared between processes)
+# If it does not exist, the original GoogleNews binary is loaded instead
+W2V_PATH = setting("W2V_PATH", os.path.join(path, "Google Pretrained W2V/GoogleNews-vectors-negative300.kv"))
+W2V_BINARY_PATH = setting("W2V_BINARY_PATH", os.path.join(path, "Google Pretrained W2V/GoogleNews-vectors-negative300.bin"))
+
+
+### CACHES
+
+# Maximal number of results kept in memory for word_proximity (pairs of words for proximity, single words for WordNet and stems)
+PROXIMITY_CACHE_SIZE = int(setting("PROXIMITY_CACHE_SIZE", "200000"))
+WORDNET_CACHE_SIZE = int(setting("WORDNET_CACHE_SIZE", "50000"))
+
+# File where these results are saved when Python exits, and reloaded at the next start (empty : no saving)
+PROXIMITY_CACHE_PATH = setting("PROXIMITY_CACHE_PATH", "")
+
+# Number of sentence annotations (CoreNLP results) kept in memory, and sqlite file where they are also saved (empty : memory only)
+PARSE_CACHE_SIZE = int(setting("PARSE_CACHE_SIZE", "10000"))
+PARSE_CACHE_PATH = setting("PARSE_CACHE_PATH", "")
+
+
+### WEB SERVICE
+
+# Requests to the SDMX Web Service are done in parallel by a pool of workers (see data_fetching.py)
+FETCH_WORKERS = int(setting("FETCH_WORKERS", "16"))        #size of the pool
+FETCH_PER_HOST = int(setting("FETCH_PER_HOST", "8"))       #maximal number of simultaneous connections to one server
+FETCH_TIMEOUT = float(setting("FETCH_TIMEOUT", "30"))      #in seconds
+FETCH_RETRIES = int(setting("FETCH_RETRIES", "3"))         #number of new attempts after a failed request
+
+# Maximal length of a data URL : when several series are asked in one request (FR+DE+IT ...), the URLs are cut to stay below it
+SDMX_MAX_URL_LENGTH = int(setting("SDMX_MAX_URL_LENGTH", "2000"))
+
+
+### METADATA
+
+# The structure of each table (dimensions, codelists, constraints, concepts) is kept in memory and in this folder
+# It is downloaded again only when it is older than METADATA_TTL (in seconds), and only if it has changed on the server
+METADATA_CACHE_DIR = setting("METADATA_CACHE_DIR", os.path.join(path, "data/metadata"))
+METADATA_TTL = float(setting("METADATA_TTL", str(7*24*3600)))
+METADATA_CACHE_SIZE = int(setting("METADATA_CACHE_SIZE", "64"))   #number of tables kept in memory
+# When the server cannot be reached, the expired version is used and the server is asked again only after METADATA_RETRY_AFTER seconds
+METADATA_RETRY_AFTER = float(setting("METADATA_RETRY_AFTER", "300"))
+
+
+### OBSERVATIONS
+
+# Maximal number of observations kept in memory by the observation store (see observation_store.py)
+OBSERVATION_CACHE_SIZE = int(setting("OBSERVATION_CACHE_SIZE", "1000000"))
+
+
+### TRACING
+
+# Tracing of the time spent in each stage of a query (see tracing.py)
+TRACING = setting("TRACING", "0") == "1"
+TRACE_PATH = setting("TRACE_PATH", "")     #file where the trace of each query is written as a json line (empty : no file)
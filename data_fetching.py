@@ -0,0 +1,272 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains the functions used to download data from the SDMX Web Service
+# A query about many countries needs one request per country (hundreds for the whole world)
+# Instead of doing them one after the other, they are done in parallel by a pool of workers,
+# with a limit of simultaneous connections to the same server, a timeout and some retries in case of failure
+# The answers (SDMX generic data) are read while they are downloaded, without building the whole XML tree
+
+### IMPORT
+
+# Python libraries import
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+import socket
+import threading
+import time
+import xml.etree.ElementTree as ET
+import numpy as np
+
+# Config import
+import config
+import tracing
+
+
+### CONNECTIONS
+
+# One semaphore per server, to limit the number of simultaneous connections to it
+
+host_limits = {}
+host_lock = threading.Lock()
+
+def host_semaphore(url):
+    host = urlparse(url).netloc
+    with host_lock:
+        if host not in host_limits:
+            host_limits[host] = threading.BoundedSemaphore(config.FETCH_PER_HOST)
+        return host_limits[host]
+
+# An HTTP error from the server (except for server errors 5xx) will give the same result if we try again
+# For example, the Web Service answers 404 when there is no data for the query
+
+def is_retryable(e):
+    if isinstance(e, HTTPError):
+        return e.code >= 500
+    return isinstance(e, (URLError, socket.timeout, ConnectionError))
+
+
+### FUNCTIONS
+
+# This function opens the url and gives the answer (as a file) to the function reader, which returns the result
+# (so the answer can be read while it is being downloaded)
+# Without reader, the content of the answer is returned
+# headers are added to the request (for example If-None-Match, to download only what has changed)
+
+def read_all(file):
+    return file.read()
+
+def fetch(url, reader = read_all, headers = None):
+    attempt = 0
+    while True:
+        try:
+            with host_semaphore(url):
+                tracing.count("http.requests")
+                with tracing.span("http"):
+                    if headers == None:
+                        file = urlopen(url, timeout = config.FETCH_TIMEOUT)
+                    else:
+                        file = urlopen(Request(url, headers = headers), timeout = config.FETCH_TIMEOUT)
+                    try:
+                        return reader(file)
+                    finally:
+                        file.close()
+        except Exception as e:
+            if (attempt >= config.FETCH_RETRIES or not is_retryable(e)):
+                raise
+            attempt += 1
+            tracing.count("http.retries")
+            time.sleep(0.5 * 2**(attempt-1))   #we wait a bit longer after each failure
+
+# This function fetches all the urls in parallel and returns a dictionary url -> result
+# The urls that could not be fetched (server error, timeout ...) are not in the dictionary
+# The Web Service answers 404 when there is no data : with 'empty', these urls are in the dictionary with the result 'empty'
+# (so that the caller knows there is nothing to ask again), otherwise they are left out like the other errors
+
+def fetch_all(urls, reader = read_all, empty = None):
+    res = {}
+    urls = list(dict.fromkeys(urls))    #same url asked twice : only one request
+    if urls == []:
+        return res
+
+    trace = tracing.current_trace()     #the workers count their requests in the trace of the query
+    depth = tracing.current_depth()
+
+    def task(url):
+        tracing.attach(trace, depth)
+        try:
+            return (url, fetch(url, reader))
+        except HTTPError as e:
+            if e.code == 404:
+                return (url, empty)
+            return (url, None)
+        except Exception:
+            return (url, None)
+
+    workers = max(1, min(config.FETCH_WORKERS, len(urls)))
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        for url, result in pool.map(task, urls):
+            if result is not None:
+                res[url] = result
+    return res
+
+
+### SERIES
+
+# The data of a table is asked with the key of the serie : the values of all its dimensions (except the time)
+# separated by dots, for example 'A.GGINTN.FR.S13._T._T._T.USD'
+
+data_prefix = "http://nsi-staging-oecd.redpelicans.com/rest/data/"
+data_suffix = "&dimensionAtObservation=AllDimensions"
+
+def key_url(code, key, y1, y2):
+    return data_prefix + code + "/" + key + "?startPeriod=" + str(y1) + "&endPeriod=" + str(y2) + data_suffix
+
+# The Web Service accepts several values for one dimension in the same request ("FR+DE+IT")
+# So instead of one request per serie, we gather all the series we need in as few requests as possible :
+# each dimension takes all the values asked, and the dimension with the most values (usually the countries)
+# is cut in several parts so that the URLs are not too long (config.SDMX_MAX_URL_LENGTH)
+# This can also return a few series that were not asked : they are just ignored afterwards
+# keys is a list of keys, each key given as the list of the values of the dimensions
+# Returns a list of (url, keys of the url)
+
+def plan_urls(code, keys, y1, y2, max_length = config.SDMX_MAX_URL_LENGTH):
+    if keys == []:
+        return []
+    n = len(keys[0])
+    columns = []    #for each dimension, the list of values asked
+    for j in range(n):
+        columns.append(list(dict.fromkeys(k[j] for k in keys)))
+
+    split = 0       #dimension which is cut between the URLs
+    for j in range(n):
+        if len(columns[j]) > len(columns[split]):
+            split = j
+
+    def url(part):
+        filter = []
+        for j in range(n):
+            if j == split:
+                filter.append("+".join(part))
+            else:
+                filter.append("+".join(columns[j]))
+        return key_url(code, ".".join(filter), y1, y2)
+
+    parts = []
+    part = []
+    for v in columns[split]:
+        if (part != [] and len(url(part + [v])) > max_length):
+            parts.append(part)
+            part = []
+        part.append(v)
+    parts.append(part)
+
+    # Each URL is given with the keys it contains
+    res = []
+    for part in parts:
+        values = set(part)
+        res.append((url(part), [k for k in keys if k[split] in values]))
+    return res
+
+# This function downloads the series of a table for several periods, with the requests planned by plan_urls (in parallel)
+# requests is a dictionary (year_from, year_to) -> list of keys, and dim_names gives the order of the dimensions in the keys
+# Each answer is split by serie : the function returns a dictionary (year_from, year_to, key as a string) -> (years, values)
+# with all the keys of the requests that were answered, even without data (a serie missing from the answer, or an answer 404)
+# The keys of the requests that failed (server error, timeout ...) are not in the dictionary
+
+def fetch_series(code, requests, dim_names, max_length = config.SDMX_MAX_URL_LENGTH):
+    plan = []
+    for (y1, y2), keys in requests.items():
+        for url, url_keys in plan_urls(code, keys, y1, y2, max_length):
+            plan.append((url, url_keys, y1, y2))
+
+    results = fetch_all([p[0] for p in plan], lambda file: read_arrays(file, dim_names), empty = {})
+
+    res = {}
+    for url, url_keys, y1, y2 in plan:
+        if url in results:
+            series = results[url]
+            for k in url_keys:
+                key = ".".join(k)
+                res[(y1, y2, key)] = series.get(key, (np.array([], dtype = np.int32), np.array([])))
+    return res
+
+
+### READING
+
+# Tags of the SDMX generic data format (version 2.1)
+GENERIC = "{http://www.sdmx.org/resources/sdmxml/schemas/v2_1/data/generic}"
+MESSAGE = "{http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message}"
+DATASET = MESSAGE + "DataSet"
+OBS = GENERIC + "Obs"
+OBS_KEY = GENERIC + "ObsKey"
+OBS_VALUE = GENERIC + "ObsValue"
+ATTRIBUTES = GENERIC + "Attributes"
+
+# This function reads an answer of the Web Service (with dimensionAtObservation=AllDimensions) little by little
+# and yields each observation as a tuple (key of the serie, year, value * unit multiplier)
+# dim_names gives the order of the dimensions in the key (without TIME_PERIOD)
+# Each observation is removed from the tree once it is read, so the memory used does not depend on the size of the answer
+
+def iter_observations(file, dim_names):
+    dataset = None
+    for event, elem in ET.iterparse(file, events = ("start", "end")):
+        if event == "start":
+            if elem.tag == DATASET:
+                dataset = elem
+            continue
+        if elem.tag != OBS:
+            continue
+
+        key = {}
+        y = 0
+        v = None
+        m = 1
+        for part in elem:
+            if part.tag == OBS_KEY:
+                for element in part:
+                    if element.get('id') == "TIME_PERIOD":
+                        y = int(element.get('value'))
+                    else:
+                        key[element.get('id')] = element.get('value')
+            elif part.tag == OBS_VALUE:
+                v = float(part.get('value'))
+            elif part.tag == ATTRIBUTES:
+                for element in part:
+                    if element.get('id') == "UNIT_MULT":
+                        m = pow(10,int(element.get('value')))
+
+        elem.clear()
+        if dataset != None:
+            dataset.remove(elem)
+
+        if v != None:
+            yield (".".join(key.get(d, "") for d in dim_names), y, m*v)
+
+# This function gathers the observations into NumPy arrays : it returns a dictionary
+# key of the serie -> (years, values), sorted by year
+# The arrays are filled directly (their size is doubled when they are full)
+
+def read_arrays(file, dim_names):
+    buffers = {}    #key -> [years, values, number of observations]
+    for k, y, v in iter_observations(file, dim_names):
+        b = buffers.get(k)
+        if b == None:
+            b = [np.empty(16, dtype = np.int32), np.empty(16, dtype = np.float64), 0]
+            buffers[k] = b
+        n = b[2]
+        if n == len(b[0]):
+            b[0] = np.resize(b[0], 2*n)
+            b[1] = np.resize(b[1], 2*n)
+        b[0][n] = y
+        b[1][n] = v
+        b[2] = n + 1
+
+    series = {}
+    for k in buffers:
+        years, values, n = buffers[k]
+        order = np.argsort(years[:n], kind = "stable")
+        series[k] = (years[:n][order], values[:n][order])
+    return series
@@ -0,0 +1,314 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains the binary store of the metadata dictionaries (topic_dict.bin and dim_dict.bin, made by tables_dictionary.py)
+# Instead of a pickle, which has to be loaded entirely by each process (and can run any code when it is loaded),
+# a store file contains :
+# - a magic word and a json header with the version, the kind of dictionary (topic or dim) and the schema of the arrays
+# - a table of all the strings of the dictionary (each string only once), as the utf-8 bytes and the offset of each string
+# - integer arrays giving the content of each table with the numbers of its strings
+# The file is memory-mapped : a table is only read (and its strings decoded) the first time it is asked,
+# so the memory used does not depend on the number of tables, and all the processes share the same pages
+# Nothing in the file is executed : the header and the arrays are checked before being used
+#
+# A store is used like the dictionary it replaces (store[table], for table in store ...) :
+# - topic : table -> (Name, Description, Dimensions, Category), four sets of keywords
+# - dim : table -> (Dimensions, Default), with Dimensions : dimension -> list of (code, name) and Default : dimension -> (code, name) or None
+
+### IMPORT
+
+# Python libraries import
+from collections.abc import Mapping
+import json
+import mmap
+import os
+import struct
+import threading
+import numpy as np
+
+
+### FORMAT
+
+magic = b"OECDDICT"
+store_version = 1
+
+# Arrays of each kind of dictionary : name -> (dtype, number of columns)
+# topic : 'words' are the keywords of all the tables, and each table gives the bounds of its 4 categories of keywords in it
+# dim : each row of 'dims' is (dimension, first value, end of the values, default code, default name)
+#       and each row of 'values' is (code, name), -1 meaning None
+schemas = {
+    "topic" : {"words" : ("<i4", 1)},
+    "dim" : {"dims" : ("<i4", 5), "values" : ("<i4", 2)},
+}
+table_sizes = {"topic" : 5, "dim" : 2}  #number of bounds given for each table in the header
+
+alignment = 8
+
+
+### WRITING
+
+# Gives a number to each string (the same string always has the same number)
+class StringTable:
+
+    def __init__(self):
+        self.position = {}
+        self.strings = []
+
+    def id(self, s):
+        if s == None:
+            return -1
+        if s not in self.position:
+            self.position[s] = len(self.strings)
+            self.strings.append(s)
+        return self.position[s]
+
+    def arrays(self):
+        data = [s.encode("utf-8") for s in self.strings]
+        offsets = np.zeros(len(data) + 1, dtype = "<i8")
+        offsets[1:] = np.cumsum([len(b) for b in data])
+        return (offsets, np.frombuffer(b"".join(data), dtype = np.uint8))
+
+def topic_arrays(d, strings):
+    words = []
+    tables = {}
+    for table in d:
+        bounds = [len(words)]
+        for keywords in d[table]:
+            words += [strings.id(w) for w in sorted(keywords)]
+            bounds.append(len(words))
+        tables[table] = bounds
+    return ({"words" : np.array(words, dtype = "<i4")}, tables)
+
+def dim_arrays(d, strings):
+    dims = []
+    values = []
+    tables = {}
+    for table in d:
+        dimensions, default = d[table]
+        start = len(dims)
+        for a in dimensions:
+            first = len(values)
+            for code, name in dimensions[a]:
+                values.append((strings.id(code), strings.id(name)))
+            dv = default.get(a)
+            if dv == None:
+                dv = (None, None)
+            dims.append((strings.id(a), first, len(values), strings.id(dv[0]), strings.id(dv[1])))
+        tables[table] = [start, len(dims)]
+    return ({"dims" : np.array(dims, dtype = "<i4").reshape(-1, 5), "values" : np.array(values, dtype = "<i4").reshape(-1, 2)}, tables)
+
+# Saves the dictionary d (of the given kind) as a store file
+# (written in a temporary file first, so that a stopped build never leaves a damaged store)
+
+def save_store(file_path, kind, d):
+    strings = StringTable()
+    if kind == "topic":
+        arrays, tables = topic_arrays(d, strings)
+    elif kind == "dim":
+        arrays, tables = dim_arrays(d, strings)
+    else:
+        raise Exception("Error : unknown kind of dictionary " + str(kind))
+    offsets, data = strings.arrays()
+    arrays["string_offsets"] = offsets
+    arrays["string_data"] = data
+
+    # The position of each array is relative to the start of the data (after the header)
+    layout = {}
+    position = 0
+    for name, a in arrays.items():
+        layout[name] = {"offset" : position, "dtype" : a.dtype.str, "shape" : list(a.shape)}
+        position += -(-a.nbytes // alignment) * alignment
+    header = {"version" : store_version, "kind" : kind, "schema" : schemas[kind],
+              "strings" : len(strings.strings), "arrays" : layout, "tables" : tables}
+    header = json.dumps(header, separators = (",", ":")).encode("utf-8")
+    header += b" " * (-(len(magic) + 4 + len(header)) % alignment)
+
+    tmp_path = file_path + ".tmp"
+    file = open(tmp_path, "wb")
+    file.write(magic + struct.pack("<I", len(header)) + header)
+    for name, a in arrays.items():
+        b = a.tobytes()
+        file.write(b + b"\0" * (-len(b) % alignment))
+    file.close()
+    os.replace(tmp_path, file_path)
+
+
+### READING
+
+# Error raised for a file which is not a valid store (damaged, truncated, other version ...)
+class DictStoreError(Exception):
+    pass
+
+class DictStore(Mapping):
+
+    def __init__(self, file_path, kind):
+        self.file_path = file_path
+        self.kind = kind
+        self.cache = {}     #tables already read
+        self.lock = threading.Lock()
+        self.mm = None
+        self.arrays = {}
+
+        file = open(file_path, "rb")
+        try:
+            self.mm = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            raise DictStoreError("Error : empty dictionary store " + file_path)
+        finally:
+            file.close()
+
+        # A header with missing or wrong values gives the same error as the other damages
+        # (the file is closed after the except block, when the arrays already mapped are not used by the traceback anymore)
+        error = None
+        try:
+            self.read_header()
+        except DictStoreError as e:
+            error = str(e)
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+            error = "Error : damaged dictionary store " + file_path
+        if error != None:
+            self.close()
+            raise DictStoreError(error)
+
+    # Closes the file : the tables already read can still be used, the others can not be read anymore
+    # (the file has to be closed before being replaced, see build in tables_dictionary.py)
+    def close(self):
+        with self.lock:
+            self.arrays = {}
+            if self.mm != None:
+                self.mm.close()
+                self.mm = None
+
+    def read_header(self):
+        mm = self.mm
+        if (len(mm) < len(magic) + 4 or mm[:len(magic)] != magic):
+            raise DictStoreError("Error : " + self.file_path + " is not a dictionary store")
+        size = struct.unpack("<I", mm[len(magic):len(magic) + 4])[0]
+        start = len(magic) + 4 + size
+        if start > len(mm):
+            raise DictStoreError("Error : damaged dictionary store " + self.file_path)
+        try:
+            header = json.loads(mm[len(magic) + 4:start].decode("utf-8"))
+        except ValueError:
+            raise DictStoreError("Error : damaged dictionary store " + self.file_path)
+
+        if header.get("version") != store_version:
+            raise DictStoreError("Error : dictionary store version " + str(header.get("version")) + " is not supported (" + self.file_path + ")")
+        if (header.get("kind") != self.kind or header.get("schema") != json.loads(json.dumps(schemas[self.kind]))):
+            raise DictStoreError("Error : " + self.file_path + " is not a " + self.kind + " dictionary store")
+
+        # Each array is checked (type, shape, inside the file) before being mapped
+        self.arrays = {}
+        expected = dict(schemas[self.kind])
+        expected["string_offsets"] = ("<i8", 1)
+        expected["string_data"] = ("|u1", 1)
+        for name, (dtype, columns) in expected.items():
+            layout = header["arrays"].get(name)
+            if layout == None:
+                raise DictStoreError("Error : array " + name + " missing in " + self.file_path)
+            shape = tuple(int(n) for n in layout["shape"])
+            if (layout["dtype"] != dtype or (columns > 1 and (len(shape) != 2 or shape[1] != columns))
+                    or (columns == 1 and len(shape) != 1) or min(shape, default = 0) < 0):
+                raise DictStoreError("Error : array " + name + " of " + self.file_path + " does not match the schema")
+            offset = start + int(layout["offset"])
+            count = int(np.prod(shape))
+            if (offset < start or offset + count * np.dtype(dtype).itemsize > len(mm)):
+                raise DictStoreError("Error : array " + name + " outside of " + self.file_path)
+            self.arrays[name] = np.frombuffer(mm, dtype = dtype, count = count, offset = offset).reshape(shape)
+
+        self.n_strings = int(header["strings"])
+        offsets = self.arrays["string_offsets"]
+        if (len(offsets) != self.n_strings + 1 or offsets[0] != 0 or np.any(np.diff(offsets) < 0)
+                or offsets[-1] > len(self.arrays["string_data"])):
+            raise DictStoreError("Error : damaged string table in " + self.file_path)
+
+        self.tables = {}
+        for table, bounds in header["tables"].items():
+            bounds = [int(b) for b in bounds]
+            if (len(bounds) != table_sizes[self.kind] or bounds != sorted(bounds) or bounds[0] < 0):
+                raise DictStoreError("Error : damaged table " + table + " in " + self.file_path)
+            self.tables[table] = bounds
+        self.table_names = list(self.tables)
+
+    def string(self, i):
+        if i == -1:
+            return None
+        if not (0 <= i < self.n_strings):
+            raise DictStoreError("Error : damaged dictionary store " + self.file_path)
+        offsets = self.arrays["string_offsets"]
+        try:
+            return bytes(self.arrays["string_data"][offsets[i]:offsets[i+1]]).decode("utf-8")
+        except UnicodeDecodeError:
+            raise DictStoreError("Error : damaged dictionary store " + self.file_path)
+
+    def read_topic(self, bounds):
+        words = self.arrays["words"]
+        if bounds[-1] > len(words):
+            raise DictStoreError("Error : damaged dictionary store " + self.file_path)
+        res = []
+        for i in range(4):
+            res.append(set(self.string(int(w)) for w in words[bounds[i]:bounds[i+1]]))
+        return tuple(res)
+
+    def read_dim(self, bounds):
+        dims = self.arrays["dims"]
+        values = self.arrays["values"]
+        if bounds[1] > len(dims):
+            raise DictStoreError("Error : damaged dictionary store " + self.file_path)
+        dimensions = {}
+        default = {}
+        for name, first, end, code, label in dims[bounds[0]:bounds[1]].tolist():
+            if not (0 <= first <= end <= len(values)):
+                raise DictStoreError("Error : damaged dictionary store " + self.file_path)
+            a = self.string(name)
+            dimensions[a] = [(self.string(c), self.string(v)) for c, v in values[first:end].tolist()]
+            default[a] = None if code == -1 else (self.string(code), self.string(label))
+        return (dimensions, default)
+
+    def __getitem__(self, table):
+        res = self.cache.get(table)
+        if res == None:
+            bounds = self.tables[table]     #KeyError if the table is not in the store
+            with self.lock:
+                if self.mm == None:
+                    raise DictStoreError("Error : dictionary store " + self.file_path + " is closed")
+                if self.kind == "topic":
+                    res = self.read_topic(bounds)
+                else:
+                    res = self.read_dim(bounds)
+                self.cache[table] = res
+        return res
+
+    def __iter__(self):
+        return iter(self.table_names)
+
+    def __len__(self):
+        return len(self.table_names)
+
+    def __contains__(self, table):
+        return table in self.tables
+
+# Opens a store, or returns an empty dictionary if the file does not exist
+
+def load_store(file_path, kind):
+    if not os.path.exists(file_path):
+        return {}
+    return DictStore(file_path, kind)
+
+
+### CONVERSION
+
+# The old pickled dictionaries can be converted once (only for files you trust : loading a pickle can run any code)
+# python dict_store.py data/topic_dict.pkl topic data/topic_dict.bin
+
+if __name__ == "__main__":
+    import pickle
+    import sys
+    if len(sys.argv) != 4:
+        print("Usage : python dict_store.py <dictionary.pkl> <topic|dim> <store.bin>")
+        sys.exit(1)
+    file = open(sys.argv[1], "rb")
+    d = pickle.load(file)
+    file.close()
+    save_store(sys.argv[3], sys.argv[2], d)
+    print(len(d), " tables saved in ", sys.argv[3])
@@ -8,14 +8,18 @@
 
 # Python libraries import
 import nltk
-import pickle
+import numpy as np
 import pandas as pd
 import os
+import threading
 from nltk.corpus import stopwords
 
 # Utils import
-from word_proximity import proximity
-from utils import is_word, lower_list, id_max
+import tracing
+import word_proximity
+from dict_store import DictStore
+from word_proximity import build_index, index_proximity
+from utils import is_word, lower_list
 
 
 ### PATHS
@@ -23,16 +27,32 @@ from utils import is_word, lower_list, id_max
 path = os.getcwd()
 
 df_path = os.path.join(path, "data/Tables.csv")
-dim_path = os.path.join(path, "data/dim_dict.pkl")
+dim_path = os.path.join(path, "data/dim_dict.bin")
 
 ### LOADINGS
 
-df_tables = pd.read_csv(df_path, sep = ";") #DataFrame with the information of the SDMX datasets (the 12 supported right now)
+# Nothing is loaded when the file is imported : the tables, the dimensions dictionary and the label indexes
+# are loaded the first time they are needed (get_codes, get_dim_dict, get_dim_index)
+# The function warmup loads everything in advance
+
+code = None
+dim_tables = None
+dim_indexes = {}
+lock = threading.Lock()
 
 # We identify each dataset by its "short name", but for the query, we need its code. We create at dictionnary for that
-code = {}
-for id, row in df_tables.iterrows():
-    code[row["Short Name"]] = row["Code"]
+
+def get_codes():
+    global code
+    if code == None:
+        with lock:
+            if code == None:
+                df_tables = pd.read_csv(df_path, sep = ";") #DataFrame with the information of the SDMX datasets (the 12 supported right now)
+                codes = {}
+                for id, row in df_tables.iterrows():
+                    codes[row["Short Name"]] = row["Code"]
+                code = codes
+    return code
 
 
 # And now we create a function to have the full url to query the table
@@ -42,28 +62,88 @@ structure_suffix = "?references=all&detail=referencepartial"
 
 def get_code(name):
     try :
-        c = structure_prefix + code[name] + structure_suffix
+        c = structure_prefix + get_codes()[name] + structure_suffix
         return c
     except:
         return None
 
 # We then load the dictionnary containing the information on the dimensions for each dataset
+# (memory-mapped, each table is read when it is first used, see dict_store.py)
 
-file = open(dim_path, "rb")
-dict = pickle.load(file)
-file.close()
+def get_dim_dict():
+    global dim_tables
+    if dim_tables == None:
+        with lock:
+            if dim_tables == None:
+                dim_tables = DictStore(dim_path, "dim")
+    return dim_tables
 
 # Stopwords (i.e not keywords)
 stops = set(stopwords.words('english')) #list of common stopwords
 avoid_words = ["number", "coutry", "numbers", "countries"] #other words that we want to avoid for dimension_fill
 
+# The keywords of the name of a value : tokenized, no hyphen, no stopwords, in lower case
+def label_words(text):
+    words = []
+    for w in nltk.word_tokenize(text.replace("-", " ")):
+        if (w.lower() not in stops and is_word(w.lower())):
+            words.append(w.lower())
+    return words
+
+# To score the values of a dimension, we need the proximity between each word of their names and each word of the query
+# Instead of computing it pair by pair, the words of all the names of a table are gathered in an index (see build_index in word_proximity)
+# so that the proximity of one word of the query with all of them is computed at once
+# For each non trivial dimension, we keep :
+# - members : the position in the index of each word of each name (a word appearing in two names is there twice)
+# - value_of : the value to which each of these words belongs
+# - counts : the number of words in the name of each value
+# The index of a table is built the first time the table is used
+
+def build_dim_index(table_name):
+    dim_dict = get_dim_dict()[table_name][0]
+    labels = {}
+    vocabulary = set()
+    for d in dim_dict:
+        if len(dim_dict[d]) > 1:
+            labels[d] = [label_words(v[1]) for v in dim_dict[d]]
+            for words in labels[d]:
+                vocabulary.update(words)
+
+    index = build_index(sorted(vocabulary))
+    position = index["position"]
+    dims = {}
+    for d in labels:
+        members = []
+        value_of = []
+        for i in range(len(labels[d])):
+            for w in labels[d][i]:
+                members.append(position[w])
+                value_of.append(i)
+        counts = np.array([len(words) for words in labels[d]], dtype = np.float32)
+        dims[d] = (np.array(members, dtype = np.int32), np.array(value_of, dtype = np.int32), counts)
+    return (index, dims)
+
+def get_dim_index(table_name):
+    if table_name not in dim_indexes:
+        with lock:
+            if table_name not in dim_indexes:
+                dim_indexes[table_name] = build_dim_index(table_name)
+    return dim_indexes[table_name]
+
+def warmup():
+    word_proximity.warmup()
+    get_codes()
+    for table_name in get_dim_dict():
+        get_dim_index(table_name)
+
 # The function dimension_fill take a table (given by table_name) and a sentence (tokens tok)
 # and try to fill the dimensions of the table (i.e find a value for each dimension) with the words of the sentence
 
 
+@tracing.traced("dimension_fill")
 def dimension_fill(tok, table_name,seuil = 0.5):
-    dim_dict = dict[table_name][0]      #dimensions and values of the table
-    dim_default = dict[table_name][1]   #default value (if any) for each dimension
+    dim_dict = get_dim_dict()[table_name][0]      #dimensions and values of the table
+    dim_default = get_dim_dict()[table_name][1]   #default value (if any) for each dimension
 
     final_dict = {}         #final result
     non_trivial_dim = []
@@ -83,42 +163,25 @@ def dimension_fill(tok, table_name,seuil = 0.5):
             non_trivial_dim.append(a)
 
     #For the non trivial dimensions :
+    index, dims = get_dim_index(table_name)
+
+    #the score of each word of the names is the maximal proximity between this word and the words of the query
+    #(computed for all the words of the index at once, for each word of the query)
+    best = np.zeros(len(index["words"]), dtype = np.float32)
+    for t in lowered_tok:
+        best = np.maximum(best, index_proximity(t, index))
+
     for d in non_trivial_dim:
 
-        #We will try each value and give it a score, the value with the best score will be kept at the end
-        values = dim_dict[d]
-        scores = []
-
-        for v in values:
-            #we put the text of the value to the right format (tokenized, no hyphen)
-            text = v[1]
-            text = text.replace("-", " ")
-            text_tok = nltk.word_tokenize(text)
-
-            #and only keep relevant words (keywords)
-            words = []
-            for w in text_tok:
-                if (w.lower() not in stops and is_word(w.lower())):
-                    words.append(w.lower())
-
-            #and then we compute the score
-            n = len(words)
-            s = 0
-            #the score for each word of the name is the maximal proximity between this word and the words of the query
-            for w in words:
-                m = 0
-                for t in lowered_tok:
-                    pr = proximity(w, t)
-                    m = max(m, pr)
-                s += m
-            #and we divide by the number of words in the name
-            if n>0:
-                s = s/n
-            else:
-                s = 0
-            scores.append(s)
+        #We give a score to each value, the value with the best score will be kept at the end
+        #the score of a value is the mean of the scores of the words of its name (0 if there is no keyword)
+        members, value_of, counts = dims[d]
+        n_values = len(dim_dict[d])
+        sums = np.bincount(value_of, weights = best[members], minlength = n_values)
+        scores = np.where(counts > 0, sums / np.maximum(counts, 1), 0)
+
         #we take the value with the highest score, and make sure it is high enough (above a certain threshold)
-        idx = id_max(scores)
+        idx = int(np.argmax(scores))
         score_max = scores[idx]
         if score_max > seuil:
             final_dict[d] = dim_dict[d][idx][0]
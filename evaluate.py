@@ -0,0 +1,432 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains the test suites of the analysis (they used to be at the end of analyse.py)
+# Each suite loads a set of test queries (in data/test), runs one part of the analysis on each of them,
+# saves the results next to the queries and displays the accuracy
+#
+# The suites can be run together and in parallel :
+# - the queries are shared between suites, so each sentence is annotated only once (and several at a time, see annotate_all)
+# - the queries of each suite are analysed by a pool of workers
+# At the end, the time of each suite and the time spent in each stage of the analysis are displayed
+#
+# Usage : python evaluate.py [type time_loc comp sup topic dimension] [--workers 8] [--seuil 0]
+
+### IMPORT
+
+# Python libraries import
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import nltk
+import os
+import time
+import pandas as pd
+
+# Generic analysis functions import
+from question_type import type_of_sentence
+from time_extraction import find_time
+from area_extraction import find_areas_in_tree
+from aggregator_extraction import find_aggregators
+
+# Specific analysis functions import
+from topic_extraction import find_topic
+from dimension_extraction import dimension_fill
+
+# Annotation import
+from annotation import annotate, annotate_all
+
+# Utils import
+from utils import normalize_figures, transform_dates
+
+import analyse
+import tracing
+
+
+### PATHS
+
+#Generic path
+path = os.getcwd()
+
+#Type test
+type_test_input = os.path.join(path, "data/test/Sentence_type_queries_test.csv")
+type_test_output = os.path.join(path, "data/test/Sentence_type_queries_results.csv")
+
+#Date-Location test
+time_loc_test_input = os.path.join(path, "data/test/Time_Location_queries_test.csv")
+time_loc_test_output = os.path.join(path, "data/test/Time_Location_queries_results.csv")
+
+#Comp test
+comp_test_input = os.path.join(path, "data/test/Comp_queries_test.csv")
+comp_test_output = os.path.join(path, "data/test/Comp_queries_results.csv")
+
+#Sup test
+sup_test_input = os.path.join(path, "data/test/Sup_queries_test.csv")
+sup_test_output = os.path.join(path, "data/test/Sup_queries_results.csv")
+
+#Topic test
+topic_test_input = os.path.join(path, "data/test/Topic_queries_test.csv")
+topic_test_output = os.path.join(path, "data/test/Topic_queries_results.csv")
+
+#Dimension test
+dimension_test_input = os.path.join(path, "data/test/Dimensions_queries_test.csv")
+dimension_test_output = os.path.join(path, "data/test/Dimensions_queries_results.csv")
+
+
+### TIMINGS
+
+# The time of each call to a stage of the analysis (annotation, type, time, areas ...) is recorded by tracing.py :
+# the calls are done with tracing.timed (dimension_fill is already traced), and the tracing is enabled by evaluate
+
+stages = ["annotation", "type_of_sentence", "find_time", "find_areas", "find_aggregators", "find_topic", "dimension_fill"]
+
+def print_timings():
+    print("Stage                 calls     mean (ms)   p50 (ms)   p95 (ms)   total (s)")
+    for stage in stages:
+        t = tracing.summary(stage)
+        if t != None:
+            print(stage.ljust(20), str(t["calls"]).rjust(7), ("%.1f" % t["mean"]).rjust(13), ("%.1f" % t["p50"]).rjust(10),
+                  ("%.1f" % t["p95"]).rjust(10), ("%.2f" % (t["total"]/1000)).rjust(11))
+
+
+### ANNOTATIONS
+
+# The queries of the suites are normalized and annotated once, before running the suites
+# They are sent to the server by groups of 'batch' sentences, several groups at the same time
+
+annotations = {}
+
+def normalize(sent):
+    return transform_dates(normalize_figures(sent))
+
+def annotate_group(sents):
+    try:
+        res = tracing.timed("annotation", annotate_all, sents, [nltk.word_tokenize(s) for s in sents])
+    except Exception:
+        # One of the sentences cannot be annotated : the others are done one by one
+        res = []
+        for s in sents:
+            try:
+                res.append(tracing.timed("annotation", annotate, s))
+            except Exception as e:
+                print(e)
+                res.append(None)
+    return zip(sents, res)
+
+def annotate_queries(queries, pool, batch = 8):
+    sents = [s for s in dict.fromkeys(queries) if s not in annotations]
+    groups = [sents[i:i+batch] for i in range(0, len(sents), batch)]
+    for result in pool.map(annotate_group, groups):
+        for sent, sentence in result:
+            annotations[sent] = sentence
+
+def get_annotation(query):
+    sentence = annotations.get(normalize(query))
+    if sentence == None:
+        raise Exception("Error : the query could not be annotated")
+    return sentence
+
+# The aggregators are found the same way in several suites
+# If the analysis fails, the error is displayed and there is no aggregator
+
+def aggregators(sentence, t):
+    try:
+        return tracing.timed("find_aggregators", find_aggregators, sentence, t[1], t[3])
+    except Exception as e:
+        print(e)
+        return [[],None]
+
+
+### Testing : Find the type of sentence
+
+# Each test function takes a row of the test file, and returns a dictionary with the columns to add to the row
+
+def type_row(row):
+    sentence = get_annotation(row["Query"])
+
+    # Type of sentence
+    t = tracing.timed("type_of_sentence", type_of_sentence, sentence)
+    agg = aggregators(sentence, t)
+
+    val = t[1]
+    if t[1] == "Value":
+        if (len(agg[0])>0 or agg[1]!= None):
+            val = "Agr_Area"
+
+    # Assessment
+    res = {}
+    res["Correct type"] = int(t[0] == row["Type"])
+    res["Correct return"] = int(val == row["Returned"])
+    res["Correct comp"] = int((len(agg[0])>0 and row["Comp"] == 1) or (len(agg[0])==0 and row["Comp"] == 0))
+    res["Correct sup"] = int((agg[1]==None and row["Sup"] == 0) or (agg[1]!=None and row["Sup"] == 1))
+    return res
+
+def type_score(df):
+    return {"Accuracy type" : df["Correct type"].mean(),
+            "Accuracy return" : df["Correct return"].mean(),
+            "Accuracy comp" : df["Correct comp"].mean(),
+            "Accuracy sup" : df["Correct sup"].mean()}
+
+
+### Testing : Find the time and the location
+
+def time_loc_row(row):
+    sentence = get_annotation(row["Query"])
+
+    # Time and location analysis
+    time = tracing.timed("find_time", find_time, sentence)
+    loc = tracing.timed("find_areas", find_areas_in_tree, sentence.parse, sentence.tokens)
+    type = tracing.timed("type_of_sentence", type_of_sentence, sentence)
+
+    res = {"Time" : str(time), "Loc" : str(loc)}
+
+    date_from = time[0]
+    date_to = time[1]
+
+    if date_from == None:
+        if type[1] == "Agr_Time":
+            date_from = 1900
+        else:
+            date_from = 2020
+    if date_to == None:
+        date_to = 2020
+
+    loc_from = "/".join(a[0] for a in loc[0])
+    loc_to = "/".join(b[0] for b in loc[1])
+    loc_than = "/".join(c[0] for c in loc[2])
+
+    if loc_from == '':
+        loc_from = 'None'
+    if loc_to == '':
+        loc_to = 'None'
+    if loc_than == '':
+        loc_than = 'None'
+
+    # Assessment of time
+    correct_time = 0
+    if (date_from==int(row["Date_from"]) and date_to==int(row["Date_to"])):
+        if row["Date_than"] == "None":
+            if time[2] == []:
+                correct_time = 1
+        else:
+            if len(time[2])==1:
+                if int(row["Date_than"]) == time[2][0]:
+                    correct_time = 1
+    res["Correct time"] = correct_time
+
+    # Assessment of location
+    res["Correct loc"] = int((loc_from == row["Loc_from"]) and (loc_to == row["Loc_to"]) and (loc_than == row["Loc_than"]))
+    return res
+
+def time_loc_score(df):
+    return {"Time accuracy" : df["Correct time"].mean(),
+            "Loc accuracy" : df["Correct loc"].mean()}
+
+
+### Testing : Find the comparison
+
+def comp_row(row):
+    sentence = get_annotation(row["Query"])
+
+    # Comparison analysis
+    t = tracing.timed("type_of_sentence", type_of_sentence, sentence)
+    ret = t[1]
+    agg = aggregators(sentence, t)
+    if len(agg[0])>0 and ret == "Value":
+        ret = "Agr_Area"
+    return {"Comparison" : ret + " // " + str(agg[0])}
+
+# Assessment is done by hand here
+def comp_score(df):
+    return {}
+
+
+### Testing : Find the aggregation
+
+def sup_row(row):
+    sentence = get_annotation(row["Query"])
+
+    # Aggregation analysis
+    t = tracing.timed("type_of_sentence", type_of_sentence, sentence)
+    agg = aggregators(sentence, t)
+
+    # Assessment
+    res = {"Correct sens" : 0, "Correct value" : 0}
+    if agg[1] != None:
+        res["Correct sens"] = int(agg[1][0] == row["Sens"])
+        res["Correct value"] = int(agg[1][1] == int(row["Value"]))
+    return res
+
+def sup_score(df):
+    return {"Accuracy sens" : df["Correct sens"].mean(),
+            "Accuracy value" : df["Correct value"].mean()}
+
+
+### Testing : Find the topic
+
+def topic_row(row):
+    # Topic analysis
+    maxi, topics, category = tracing.timed("find_topic", find_topic, row["Query"], 3)
+
+    res = {}
+    res["Number 1"] = ' / '.join(topics[0])
+    res["Number 2"] = ' / '.join(topics[1])
+    res["Number 3"] = ' / '.join(topics[2])
+    res["Predicted Cat"] = category
+    res["Best scores"] = str(maxi)
+
+    # Assessment
+    true_table = row["Table"]
+    true_cat = row["Category"]
+    res["Top1"] = int(true_table in topics[0])
+    res["Top3"] = int((true_table in topics[0]) or (true_table in topics[1]) or (true_table in topics[2]))
+    res["Cat"] = int(true_cat == category)
+    return res
+
+# Only the queries with a table are counted (they are the first ones of the file)
+def topic_score(df):
+    n = int((df["Table"] != 'None').sum())
+    return {"Accuracy top 1" : df["Top1"][:n].mean(),
+            "Accuracy top 3" : df["Top3"][:n].mean(),
+            "Accuracy category" : df["Cat"][:n].mean()}
+
+
+### Testing : Fill the dimensions
+
+dimension_seuil = 0
+
+def dimension_row(row):
+    topic = row["Table"]
+    than = int(row["Than"])
+    dim = row["Dimension"]
+    val = row["Value"]
+    sent = row["Query"].replace("-", " ")
+
+    # Dimension filling
+    # We differentiate the case with a "than" and without
+    # Because if there is a "than", we do 2 "dimension fill", one for each part of the comparison
+    if than :
+        s = sent.split("than")
+        pred0 = dimension_fill(nltk.word_tokenize(s[0]), topic, dimension_seuil)
+        pred1 = dimension_fill(nltk.word_tokenize(s[1]), topic, dimension_seuil)
+        v = val.split('/')
+
+        # Assessment
+        return {"Result" : int(v[0] == pred0[dim]) + int(v[1] == pred1[dim])}
+
+    else:
+        fill = dimension_fill(nltk.word_tokenize(sent), topic, dimension_seuil)
+        predict = fill[dim]
+
+        # Assessment
+        if val != predict:
+            print(sent, "/", topic, "/", val, "/", predict)
+        return {"Result" : int(val == predict)}
+
+# The queries with a "than" count twice
+def dimension_score(df):
+    return {"Accuracy" : df["Result"].sum() / (1 + df["Than"].astype(int)).sum() * 100}
+
+
+### SUITES
+
+# For each suite : the test file, the result file, the test function, the scoring function,
+# and if the queries need to be annotated
+
+suites = {
+    "type" : (type_test_input, type_test_output, type_row, type_score, True),
+    "time_loc" : (time_loc_test_input, time_loc_test_output, time_loc_row, time_loc_score, True),
+    "comp" : (comp_test_input, comp_test_output, comp_row, comp_score, True),
+    "sup" : (sup_test_input, sup_test_output, sup_row, sup_score, True),
+    "topic" : (topic_test_input, topic_test_output, topic_row, topic_score, False),
+    "dimension" : (dimension_test_input, dimension_test_output, dimension_row, dimension_score, False),
+}
+
+def load_suite(name):
+    return pd.read_csv(suites[name][0], sep = ';')
+
+# Runs one suite : the rows are analysed by the pool of workers, then the results are saved and scored
+# A row whose analysis fails is displayed and counted as wrong
+
+def run_suite(name, df, pool):
+    input_path, output_path, test_row, score, annotated = suites[name]
+    start = time.perf_counter()
+
+    def task(row):
+        try:
+            return test_row(row)
+        except Exception as e:
+            print(name, ":", row["Query"], ":", e)
+            return {}
+
+    rows = [row for id, row in df.iterrows()]
+    results = list(pool.map(task, rows))
+    scores = set()
+    for id, res in zip(df.index, results):
+        for column in res:
+            df.at[id, column] = res[column]
+            if isinstance(res[column], int):
+                scores.add(column)
+    for column in scores:
+        df[column] = df[column].fillna(0)   #the failed rows are wrong
+    df.to_csv(output_path, index = False)
+
+    report = score(df)
+    report["Queries"] = len(df)
+    report["Time (s)"] = time.perf_counter() - start
+    return report
+
+# Runs the chosen suites at the same time
+# The annotations of all the queries are done first (and shared), then each suite has its own thread,
+# all the suites sharing the same pool of workers for their queries
+
+def evaluate(names, workers = 8):
+    tracing.enable()
+    tracing.reset()
+    start = time.perf_counter()
+    frames = {name : load_suite(name) for name in names}
+
+    pool = ThreadPoolExecutor(max_workers = workers)
+    queries = []
+    for name in names:
+        if suites[name][4]:
+            queries += [normalize(q) for q in frames[name]["Query"]]
+    annotate_queries(queries, pool)
+
+    reports = {}
+    with ThreadPoolExecutor(max_workers = len(names)) as suite_pool:
+        futures = {name : suite_pool.submit(run_suite, name, frames[name], pool) for name in names}
+        for name in names:
+            reports[name] = futures[name].result()
+    pool.shutdown()
+
+    # Displaying the results
+    print()
+    for name in names:
+        print("### " + name)
+        for key, value in reports[name].items():
+            print(key, " : ", value)
+        print()
+    print("Total time (s) : ", time.perf_counter() - start)
+    print()
+    print_timings()
+    return reports
+
+
+### EXECUTION
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description = "Run the test suites of the analysis")
+    arg_parser.add_argument("suites", nargs = "*", help = "suites to run, among : " + ", ".join(suites) + " (default : all)")
+    arg_parser.add_argument("--workers", type = int, default = 8, help = "number of queries analysed at the same time")
+    arg_parser.add_argument("--seuil", type = float, default = 0, help = "threshold of dimension_fill for the dimension suite")
+    arg_parser.add_argument("--no-warmup", action = "store_true", help = "do not load the models before starting the timer")
+    args = arg_parser.parse_args()
+    names = list(dict.fromkeys(args.suites)) or list(suites)
+    for name in names:
+        if name not in suites:
+            arg_parser.error("unknown suite : " + name)
+
+    dimension_seuil = args.seuil
+    if not args.no_warmup:
+        analyse.warmup()
+    evaluate(names, args.workers)
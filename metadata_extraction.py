@@ -10,22 +10,34 @@
 
 # Python libraries import
 from urllib.request import urlopen
+from urllib.error import HTTPError
 import xml.etree.ElementTree as ET
 import re
+import os
+import gzip
+import json
+import time
 from nltk.tokenize import word_tokenize
 
+# Config import
+import config
+from cache import LRUCache
+from data_fetching import fetch
+
 ### EXAMPLE
 
     #URL of the metadata to explore
 
 url_name = "http://nsi-staging-oecd.redpelicans.com/rest/dataflow/OECD.EDU/EDU_ENRLT@EAG_ENRL_SHARE_CATEGORY/1.0?references=all&detail=referencepartial"
 
-    # Opening the xml and parsing it into a tree
+    # Opening the xml and parsing it into a tree (only when the example is asked, not when the file is imported)
 
-file = urlopen(url_name)
-tree = ET.parse(file)
-root = tree.getroot()
-header, structure = root
+def example(url = url_name):
+    file = urlopen(url)
+    tree = ET.parse(file)
+    root = tree.getroot()
+    header, structure = root
+    return structure
 
 ### FUNCTIONS
 
@@ -69,18 +81,19 @@ def get_constaints(struc):
     return constraint_dict
 
 
+#Each codelist is given as a dictionary code -> name, so that the name of a code is found directly
 def get_codelists(struc):
     codelist_dict = {}
     for codelist in struc[3]:
         id = codelist.attrib['id']
-        table = []
+        table = {}
         for code in codelist:
             if (get_tag(code) == "Code"):
                 key = code.attrib['id']
                 for a in code:
                     if (get_tag(a) == "Name"):
                         value = a.text
-                table.append((key,value))
+                table[key] = value
         codelist_dict[id] = table
     return codelist_dict
 
@@ -225,3 +238,248 @@ def metadata(struc):
         id = liste_key_cstr[i]
         print (id, ' : ', len(constraints[id]), ' entries')
     print()
+
+
+### STREAMING READER
+
+# The functions above need the whole xml tree in memory, and find the sections by their position
+# The function read_structure_message reads the answer of the server little by little (iterparse) and extracts all the sections in one pass :
+# the sections are recognized by their full tag (with the namespace), and each code, concept, dimension... is removed from the tree
+# once it is read, so the memory used does not depend on the size of the codelists
+
+# Tags of the SDMX structure format (version 2.1)
+STRUCTURE = "{http://www.sdmx.org/resources/sdmxml/schemas/v2_1/structure}"
+COMMON = "{http://www.sdmx.org/resources/sdmxml/schemas/v2_1/common}"
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+DATAFLOW = STRUCTURE + "Dataflow"
+CATEGORY_SCHEME = STRUCTURE + "CategoryScheme"
+CATEGORY = STRUCTURE + "Category"
+CODELIST = STRUCTURE + "Codelist"
+CODE = STRUCTURE + "Code"
+CONCEPT_SCHEME = STRUCTURE + "ConceptScheme"
+CONCEPT = STRUCTURE + "Concept"
+DATA_STRUCTURE = STRUCTURE + "DataStructure"
+DIMENSION_LIST = STRUCTURE + "DimensionList"
+ATTRIBUTE_LIST = STRUCTURE + "AttributeList"
+CONCEPT_IDENTITY = STRUCTURE + "ConceptIdentity"
+LOCAL_REPRESENTATION = STRUCTURE + "LocalRepresentation"
+ENUMERATION = STRUCTURE + "Enumeration"
+CONTENT_CONSTRAINT = STRUCTURE + "ContentConstraint"
+CUBE_REGION = STRUCTURE + "CubeRegion"
+NAME = COMMON + "Name"
+DESCRIPTION = COMMON + "Description"
+ANNOTATION = COMMON + "Annotation"
+ANNOTATION_TYPE = COMMON + "AnnotationType"
+ANNOTATION_TITLE = COMMON + "AnnotationTitle"
+
+# Text of the child 'tag' of elem in English (or in the last language given if there is no English one)
+def child_text(elem, tag):
+    res = None
+    for a in elem:
+        if a.tag == tag:
+            if a.get(XML_LANG) == "en":
+                return a.text
+            res = a.text
+    return res
+
+# Concept and codelist of a dimension or an attribute (the references are the first child of ConceptIdentity and Enumeration)
+def component(elem):
+    concept = None
+    codelist = None
+    for c in elem:
+        if (c.tag == CONCEPT_IDENTITY and len(c) > 0):
+            concept = c[0].get('id')
+        elif (c.tag == LOCAL_REPRESENTATION and len(c) > 0 and c[0].tag == ENUMERATION):
+            codelist = c[0][0].get('id')
+    return (concept, codelist)
+
+def categories_rec(cat):
+    res = []
+    for a in cat:
+        if (a.tag == NAME and a.get(XML_LANG) == "en"):
+            res.append(a.text)
+        if a.tag == CATEGORY:
+            res += categories_rec(a)
+    return res
+
+# Returns a dictionary with all the sections (in the same format as the functions get_...) :
+# info, categories, codelists, concepts, dimensions, attributes and constraints
+# As with the functions above, only the first dataflow, category scheme, concept scheme and data structure are read
+
+def read_structure_message(file):
+    info = {}
+    categories = []
+    codelists = {}
+    concepts = {}
+    dimensions = {}
+    attributes = {}
+    constraints = {}
+
+    seen = {DATAFLOW : 0, CATEGORY_SCHEME : 0, CONCEPT_SCHEME : 0, DATA_STRUCTURE : 0}
+    stack = []          #elements from the root to the current one
+    codelist = None     #codes of the codelist being read
+    actual = False      #are we in an 'Actual' constraint
+
+    for event, elem in ET.iterparse(file, events = ("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            stack.append(elem)
+            if tag in seen:
+                seen[tag] += 1
+            elif tag == CODELIST:
+                codelist = {}
+            elif tag == CONTENT_CONSTRAINT:
+                actual = (elem.get('type') == 'Actual')
+            continue
+
+        stack.pop()
+        parent = stack[-1] if stack != [] else None
+        parent_tag = parent.tag if parent != None else None
+        done = True     #the element is read : it can be removed
+
+        if (tag == CODE and parent_tag == CODELIST):
+            codelist[elem.get('id')] = child_text(elem, NAME)
+        elif tag == CODELIST:
+            codelists[elem.get('id')] = codelist
+        elif (tag == CONCEPT and parent_tag == CONCEPT_SCHEME):
+            if seen[CONCEPT_SCHEME] == 1:
+                name = child_text(elem, NAME)
+                if name != None:
+                    concepts[elem.get('id')] = name
+        elif (parent_tag == DIMENSION_LIST and elem.get('id') != None):
+            if seen[DATA_STRUCTURE] == 1:
+                concept, cl = component(elem)
+                dimensions[elem.get('id')] = (elem.get('position'), concept, cl)
+        elif (parent_tag == ATTRIBUTE_LIST and elem.get('id') != None):
+            if seen[DATA_STRUCTURE] == 1:
+                attributes[elem.get('id')] = component(elem)
+        elif parent_tag == CUBE_REGION:
+            if actual:
+                id = elem.get('id')
+                if id == 'TIME_PERIOD':     #The syntax is special for the time period
+                    constraints[id] = [elem[0][0].text, elem[0][1].text]
+                else:
+                    constraints[id] = [b.text for b in elem]
+        elif (tag == DATAFLOW and seen[DATAFLOW] == 1):
+            name = child_text(elem, NAME)
+            if name != None:
+                info['Name'] = name
+            description = child_text(elem, DESCRIPTION)
+            if description != None:
+                info['Description'] = description
+            for annot in elem.iter(ANNOTATION):
+                if child_text(annot, ANNOTATION_TYPE) == "DEFAULT":
+                    info['Default'] = child_text(annot, ANNOTATION_TITLE).split(',')
+        elif (tag == CATEGORY_SCHEME and seen[CATEGORY_SCHEME] == 1):
+            for a in elem:
+                if a.tag == CATEGORY:
+                    categories += categories_rec(a)
+        else:
+            done = (tag in seen or len(stack) <= 3)     #the sections and their items (the elements inside are kept until then)
+
+        if (done and parent != None):
+            parent.remove(elem)
+
+    return {"info" : info, "categories" : categories, "codelists" : codelists, "concepts" : concepts,
+            "dimensions" : dimensions, "attributes" : attributes, "constraints" : constraints}
+
+
+### CACHE
+
+# The metadata of a table almost never changes, so instead of downloading and exploring the whole xml file at each question,
+# the dictionaries extracted from it (dimensions, codelists, constraints, concepts) are kept :
+# - in memory, for the tables used recently
+# - on disk, in one compressed json file per table (in config.METADATA_CACHE_DIR)
+# After config.METADATA_TTL seconds, the server is asked again with the ETag (or the date) of the saved version :
+# the file is downloaded and explored again only if it has changed (otherwise the server answers 304 Not Modified)
+
+structure_prefix = "http://nsi-staging-oecd.redpelicans.com/rest/dataflow/"
+structure_suffix = "?references=all&detail=referencepartial"
+
+# To be changed when the content of the saved dictionaries changes (the old files are then ignored)
+cache_version = 2
+
+metadata_cache = LRUCache(config.METADATA_CACHE_SIZE, "metadata")
+
+def structure_url(code):
+    return structure_prefix + code + structure_suffix
+
+def cache_file(code):
+    name = re.sub(r'[^\w.@-]', '_', code)
+    return os.path.join(config.METADATA_CACHE_DIR, name + ".json.gz")
+
+def extract_metadata(parts):
+    return {"dimensions" : parts["dimensions"],
+            "codelists" : parts["codelists"],
+            "constraints" : parts["constraints"],
+            "concepts" : parts["concepts"]}
+
+# Reads the answer of the server (in one pass, see read_structure_message) : the metadata and the information needed to ask later if it has changed
+def read_structure(file):
+    parts = read_structure_message(file)
+    return (extract_metadata(parts), file.headers.get("ETag"), file.headers.get("Last-Modified"))
+
+# json has no tuples, so they are restored when a file is loaded
+def load_entry(code):
+    try:
+        file = gzip.open(cache_file(code), "rt", encoding = "utf-8")
+    except OSError:
+        return None
+    try:
+        entry = json.load(file)
+    except Exception:
+        entry = None    #damaged file : the metadata is downloaded again
+    finally:
+        file.close()
+    if (entry == None or entry.get("version") != cache_version):
+        return None
+
+    metadata = entry["metadata"]
+    metadata["dimensions"] = {d : tuple(v) for d, v in metadata["dimensions"].items()}
+    return entry
+
+def save_entry(code, entry):
+    os.makedirs(config.METADATA_CACHE_DIR, exist_ok = True)
+    file_path = cache_file(code)
+    tmp_path = file_path + ".tmp"
+    file = gzip.open(tmp_path, "wt", encoding = "utf-8")
+    json.dump(entry, file, separators = (",", ":"))
+    file.close()
+    os.replace(tmp_path, file_path)
+
+# The function get_metadata takes the code of a table (as in code_dict, for example 'OECD.GOV/DF_GOV_1/1.1')
+# and returns a dictionary with its dimensions, codelists, constraints and concepts
+# If the server cannot be reached, an expired version is used rather than nothing, and it is kept for config.METADATA_RETRY_AFTER
+# seconds (so that the next questions do not wait again for all the attempts of fetch)
+
+def get_metadata(code):
+    entry = metadata_cache.get(code)
+    if entry == None:
+        entry = load_entry(code)
+    if (entry != None and time.time() - entry["time"] < config.METADATA_TTL):
+        metadata_cache.put(code, entry)
+        return entry["metadata"]
+
+    headers = {}
+    if entry != None:
+        if entry["etag"] != None:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["modified"] != None:
+            headers["If-Modified-Since"] = entry["modified"]
+
+    try:
+        metadata, etag, modified = fetch(structure_url(code), read_structure, headers)
+        entry = {"version" : cache_version, "time" : time.time(), "etag" : etag, "modified" : modified, "metadata" : metadata}
+        save_entry(code, entry)
+    except Exception as e:
+        if entry == None:
+            raise
+        if (isinstance(e, HTTPError) and e.code == 304):
+            entry["time"] = time.time()     #not modified : the saved version is still good
+            save_entry(code, entry)
+        else:
+            entry["time"] = time.time() - config.METADATA_TTL + config.METADATA_RETRY_AFTER
+
+    metadata_cache.put(code, entry)
+    return entry["metadata"]
@@ -0,0 +1,184 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains the Named Entity Recognition (NER) backends
+# The StanfordNERTagger of nltk starts a new Java process (and reloads the model) at each call, which takes seconds
+# Here, the tagger always stays alive between calls, either :
+# - in the CoreNLP server that is already running for the parsing ('corenlp' backend)
+# - in a Stanford NER server started once for the whole session ('stanford' backend)
+# The backend is chosen in config.py (NER_BACKEND) and given by the function get_tagger
+
+### IMPORT
+
+# Python libraries import
+from nltk.parse import CoreNLPParser
+import atexit
+import os
+import socket
+import subprocess
+import time
+
+# Config import
+import config
+
+
+### PROPERTIES
+
+# Properties given to the CoreNLP server for the NER
+# We use the same 7 classes model as the Stanford NER (LOCATION, DATE ...) without the extra numeric classes of CoreNLP
+ner_properties = {
+    "ner.model": "edu/stanford/nlp/models/ner/english.muc.7class.distsim.crf.ser.gz",
+    "ner.applyNumericClassifiers": "false",
+    "ner.applyFineGrained": "false",
+    "ner.useSUTime": "false",
+}
+
+
+### TAGGERS
+
+# The empty sentences are not sent to the servers : they skip the empty lines, which would shift all the next answers
+# This function puts them back in their place, 'tagged' giving the answers of the other sentences in order
+
+def with_empty(sentences, tagged):
+    tagged = iter(tagged)
+    return [next(tagged) if tokens != [] else [] for tokens in sentences]
+
+# NER done by the CoreNLP server
+# All the sentences given to tag_sents are tagged with only one call to the server (one sentence per line)
+
+class CoreNLPTagger:
+
+    def __init__(self, url = config.CORENLP_URL):
+        self.server = CoreNLPParser(url=url)
+
+    def tag(self, tokens):
+        return self.tag_sents([tokens])[0]
+
+    def tag_sents(self, sentences):
+        properties = {
+            "annotators": "tokenize,ssplit,pos,lemma,ner",
+            "tokenize.whitespace": "true",
+            "ssplit.eolonly": "true",
+        }
+        properties.update(ner_properties)
+        kept = [tokens for tokens in sentences if tokens != []]
+        if kept == []:
+            return [[] for tokens in sentences]
+        text = "\n".join(" ".join(tokens) for tokens in kept)
+        result = self.server.api_call(text, properties = properties)
+        if len(result["sentences"]) != len(kept):
+            raise Exception("Error : the CoreNLP server gave " + str(len(result["sentences"])) + " sentences for " + str(len(kept)))
+        res = []
+        for s in result["sentences"]:
+            res.append([(t["word"], t["ner"]) for t in s["tokens"]])
+        return with_empty(sentences, res)
+
+
+# NER done by a Stanford NER server (edu.stanford.nlp.ie.NERServer)
+# If no server is listening at the given address, one is launched at the first call and stopped when Python exits
+# The server answers each line with the tokens written as "word/TAG" : all the sentences given to tag_sents
+# are sent on one connection (one sentence per line) and the answer is split by line
+
+class StanfordServerTagger:
+
+    def __init__(self, host = config.NER_HOST, port = config.NER_PORT, jar = config.NER_JAR, model = config.NER_MODEL, java = config.JAVA_PATH):
+        self.host = host
+        self.port = port
+        self.jar = jar
+        self.model = model
+        self.java = java
+        self.process = None
+        self.started = False
+
+    def listening(self):
+        try:
+            s = socket.create_connection((self.host, self.port), timeout = 0.5)
+            s.close()
+            return True
+        except OSError:
+            return False
+
+    def start(self, timeout = 60):
+        self.started = True
+        if self.listening():
+            return
+        java = self.java if os.path.exists(self.java) else "java"
+        cmd = [java, "-mx1g", "-cp", self.jar, "edu.stanford.nlp.ie.NERServer",
+               "-loadClassifier", self.model, "-port", str(self.port), "-outputFormat", "slashTags",
+               "-tokenizerFactory", "edu.stanford.nlp.process.WhitespaceTokenizer", "-tokenizerOptions", "tokenizeNLs=false"]
+        self.process = subprocess.Popen(cmd, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+        atexit.register(self.stop)
+
+        # Loading the model takes a few seconds, we wait until the server accepts connections
+        t = time.time()
+        while not self.listening():
+            if self.process.poll() != None:
+                raise Exception("The NER server could not be started")
+            if time.time() - t > timeout:
+                self.stop()
+                raise Exception("The NER server did not answer in time")
+            time.sleep(0.2)
+
+    def stop(self):
+        if self.process != None:
+            self.process.terminate()
+            self.process.wait()
+            self.process = None
+        self.started = False
+
+    # Sends the text on a new connection and returns all the answer
+    def ask(self, text):
+        s = socket.create_connection((self.host, self.port))
+        try:
+            s.sendall((text + "\n").encode("utf8"))
+            s.shutdown(socket.SHUT_WR)
+            answer = b""
+            data = s.recv(4096)
+            while data:
+                answer += data
+                data = s.recv(4096)
+        finally:
+            s.close()
+        return answer.decode("utf8")
+
+    def read_tags(self, line):
+        res = []
+        for w in line.split():
+            word, tag = w.rsplit("/", 1)
+            res.append((word, tag))
+        return res
+
+    def tag(self, tokens):
+        return self.tag_sents([tokens])[0]
+
+    def tag_sents(self, sentences):
+        if not self.started:
+            self.start()
+        kept = [tokens for tokens in sentences if tokens != []]
+        if kept == []:
+            return [[] for tokens in sentences]
+        answer = self.ask("\n".join(" ".join(tokens) for tokens in kept))
+        lines = [line for line in answer.splitlines() if line.strip() != ""]
+
+        # Some versions of the server only read the first line of a connection :
+        # if the answer does not have one line per sentence, each sentence is sent on its own connection
+        if len(lines) != len(kept):
+            lines = [self.ask(" ".join(tokens)) for tokens in kept]
+        return with_empty(sentences, [self.read_tags(line) for line in lines])
+
+
+### BACKEND SELECTION
+
+backends = {"corenlp" : CoreNLPTagger, "stanford" : StanfordServerTagger}
+tagger = None
+
+# Returns the tagger of the backend chosen in config.py (created only once)
+
+def get_tagger():
+    global tagger
+    if tagger == None:
+        try:
+            tagger = backends[config.NER_BACKEND]()
+        except KeyError:
+            raise Exception("Unknown NER backend : " + config.NER_BACKEND)
+    return tagger
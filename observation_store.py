@@ -0,0 +1,137 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains a local store of the observations downloaded from the SDMX Web Service
+# Users often ask close questions (same table and dimensions, other years or other countries)
+# so each serie (identified by the table and its key, like 'A.GGINTN.FR.S13._T._T._T.USD') is kept with the years already downloaded
+# A new question then only needs the missing years : for example after 2012-2019, asking for 2010-2018 only downloads 2010-2011
+# The store has a maximal number of observations : when it is full, the least recently used series are removed
+
+### IMPORT
+
+# Python libraries import
+from collections import OrderedDict
+import threading
+import numpy as np
+
+# Config import
+import config
+import tracing
+
+
+### INTERVALS
+
+# The years already downloaded for a serie are kept as a sorted list of intervals [year_from, year_to] (both included)
+# Two intervals that touch each other are merged : [2010,2012] and [2013,2015] give [2010,2015]
+
+def add_interval(intervals, y1, y2):
+    res = []
+    for a, b in intervals:
+        if (b + 1 < y1 or y2 + 1 < a):
+            res.append((a, b))
+        else:
+            y1 = min(a, y1)
+            y2 = max(b, y2)
+    res.append((y1, y2))
+    res.sort()
+    return res
+
+# Returns the intervals of [y1, y2] which are not in intervals
+def missing_intervals(intervals, y1, y2):
+    res = []
+    for a, b in intervals:
+        if b < y1:
+            continue
+        if a > y2:
+            break
+        if a > y1:
+            res.append((y1, a - 1))
+        y1 = max(y1, b + 1)
+    if y1 <= y2:
+        res.append((y1, y2))
+    return res
+
+
+### STORE
+
+# A serie of the store is a list [intervals, years, values], with years and values two NumPy arrays sorted by year
+# Its size is its number of observations (at least 1, so that the series without data also count)
+
+class ObservationStore:
+
+    def __init__(self, maxsize = 1000000):
+        self.maxsize = maxsize
+        self.size = 0
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    # Returns the intervals of [y1, y2] that are not in the store for this serie
+    def missing(self, dataflow, key, y1, y2):
+        with self.lock:
+            serie = self.data.get((dataflow, key))
+            if serie == None:
+                res = [(y1, y2)]
+            else:
+                res = missing_intervals(serie[0], y1, y2)
+            if res == []:
+                self.hits += 1
+                tracing.count("cache.observations.hit")
+            else:
+                self.misses += 1
+                tracing.count("cache.observations.miss")
+            return res
+
+    # Returns the observations of the serie between y1 and y2 (which should already be in the store) as (years, values)
+    def get(self, dataflow, key, y1, y2):
+        with self.lock:
+            serie = self.data.get((dataflow, key))
+            if serie == None:
+                return (np.array([], dtype = np.int32), np.array([]))
+            self.data.move_to_end((dataflow, key))
+            years, values = serie[1], serie[2]
+            kept = (years >= y1) & (years <= y2)
+            return (years[kept], values[kept])
+
+    # Saves the observations of the serie downloaded for [y1, y2] (years and values can be empty if there is no data)
+    def add(self, dataflow, key, y1, y2, years, values):
+        years = np.asarray(years, dtype = np.int32)
+        values = np.asarray(values, dtype = np.float64)
+        with self.lock:
+            serie = self.data.pop((dataflow, key), None)
+            if serie == None:
+                serie = [[], np.array([], dtype = np.int32), np.array([])]
+            else:
+                self.size -= max(1, len(serie[1]))
+
+            # The old observations of [y1, y2] are replaced by the new ones
+            old = (serie[1] < y1) | (serie[1] > y2)
+            all_years = np.concatenate([serie[1][old], years])
+            all_values = np.concatenate([serie[2][old], values])
+            order = np.argsort(all_years, kind = "stable")
+            serie = [add_interval(serie[0], y1, y2), all_years[order], all_values[order]]
+
+            self.data[(dataflow, key)] = serie
+            self.size += max(1, len(serie[1]))
+            while (self.size > self.maxsize and len(self.data) > 1):
+                k, removed = self.data.popitem(last = False)
+                self.size -= max(1, len(removed[1]))
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {"series" : len(self.data), "size" : self.size, "maxsize" : self.maxsize, "hits" : self.hits, "misses" : self.misses}
+
+
+# The store shared by the whole Chatbot
+
+observations = ObservationStore(config.OBSERVATION_CACHE_SIZE)
@@ -9,6 +9,7 @@
 # Utils import
 from parsing_analysis import find_links, get_nodes, get_subtrees
 from utils import lower_list
+from annotation import AnnotatedSentence
 
 ### FUNCTIONS
 
@@ -29,8 +30,12 @@ time_identifier = ["time", "times", "year", "years"]
 # It also determines if a count is asked ("how many ...", "number of ..."), working with list of countries/years only
 # Finally, if we have a list of countries or years, it means that we have detected some words like "areas" or "times"  in the sentence
 # we return them with this function as well
+# The parses can also be given directly as an AnnotatedSentence (see annotation.py)
 
-def type_of_sentence(parse,parse_d):
+def type_of_sentence(parse,parse_d = None):
+
+    if isinstance(parse, AnnotatedSentence):
+        parse, parse_d = parse.parse, parse.parse_d
 
     type = "NP"             #type of sentence (NP or WH)
     returned = "Value"      #return type (Value, Agr_Area, Agr_Time)
@@ -10,10 +10,19 @@
 # Python libraries import
 import nltk
 from nltk.corpus import stopwords
-import pickle
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+import argparse
+import hashlib
+import json
 import pandas as pd
 import os
 
+# Config import
+import config
+from data_fetching import fetch
+from dict_store import DictStore, load_store, save_store
+
 # Utils import
 import utils
 from metadata_extraction import *
@@ -26,8 +35,9 @@ from utils import lower_list, is_word
 path = os.getcwd()
 
 df_path = os.path.join(path, "data/Tables.csv")
-topic_path = os.path.join(path, "data/topic_dict.pkl")
-dim_path = os.path.join(path, "data/dim_dict.pkl")
+topic_path = os.path.join(path, "data/topic_dict.bin")
+dim_path = os.path.join(path, "data/dim_dict.bin")
+manifest_path = os.path.join(path, "data/dict_manifest.json")
 
 ### LOADINGS
 
@@ -36,19 +46,22 @@ country_list = lower_list(region_dict["World"])
 
 df_tables = pd.read_csv(df_path, sep = ";")
 
-structure_prefix = "http://nsi-staging-oecd.redpelicans.com/rest/dataflow/"
-structure_suffix = "?references=all&detail=referencepartial"
-
 url_list = []   #list of the url (one per table)
 name_list = []  #list of the table names
+code_list = []  #list of the table codes
 
 for id, row in df_tables.iterrows():
     name = row["Short Name"]
     code = row["Code"]
-    full_code = structure_prefix + code + structure_suffix
 
     name_list.append(name)
-    url_list.append(full_code)
+    code_list.append(code)
+    url_list.append(structure_url(code))
+
+# Downloads the metadata at the url and returns its parts (see read_structure_message in metadata_extraction)
+# (with the timeout and the new attempts of fetch, see data_fetching.py)
+def get_structure(url):
+    return fetch(url, read_structure_message)
 
 
 ## Keywords extraction for the topic score
@@ -56,29 +69,22 @@ for id, row in df_tables.iterrows():
 stops = set(stopwords.words('english'))
 avoid_dim = ['REPORTING_COUNTRY', 'REF_AREA', 'TIME_PERIOD', 'COUNTERPART_COUNTRY']
 
-# This function takes as input the url of the metadata of one table
+# This function takes as input the metadata of one table (see get_structure)
 # and returns the keywords extracted from the metadata, in 4 different categories
 # (Title, Description, Dimension, Category)
 # There is not so much to understand here, we just go look at the keywords in the different parts of the metadata,
 # keep only the relevant ones (not stopwords)
 # and convert it to the right format (using codelists for example)
 
-def keyword(url):
-    # loading the xml structure as a tree
-    file = urlopen(url)
-    tree = ET.parse(file)
-    root = tree.getroot()
-    header = root[0]
-    structure = root[1]
-
+def structure_keyword(parts):
     # getting the different parts of the metadata
-    concepts = get_concepts(structure)
-    info = get_info(structure)
-    cat = get_category(structure)
-    dim = get_dimensions(structure)
+    concepts = parts["concepts"]
+    info = parts["info"]
+    cat = parts["categories"]
+    dim = parts["dimensions"]
 
-    cl = get_codelists(structure)
-    cons = get_constaints(structure)
+    cl = parts["codelists"]
+    cons = parts["constraints"]
 
     # The 4 categories
     Name = []
@@ -118,15 +124,19 @@ def keyword(url):
             for w in nltk.word_tokenize(conc):      #words from the title of the dimension
                 if (w.lower() not in stops and is_word(w.lower())):
                     Dimensions.append(w.lower())
+            codes = cl[dim[a][2]]
             for c in cons[a]:                       #words from the values of the dimension
-                for d in cl[dim[a][2]]:
-                    if d[0] == c:
-                        for w in nltk.word_tokenize(d[1]):
-                            if (w.lower() not in stops and is_word(w.lower())):
-                                Dimensions.append(w.lower())
+                if c in codes:
+                    for w in nltk.word_tokenize(codes[c]):
+                        if (w.lower() not in stops and is_word(w.lower())):
+                            Dimensions.append(w.lower())
 
     return (set(Name),set(Description),set(Dimensions),set(Category))
 
+# Same thing from the url of the metadata of one table
+def keyword(url):
+    return structure_keyword(get_structure(url))
+
 # Pretty print function for the 4 categories of keywords
 def kprint(keyword):
     print("* Name : ", keyword[0])
@@ -136,41 +146,24 @@ def kprint(keyword):
     print()
 
 
-# Function to find the keywords for each supported table
-# and save it as an independant file (topic_dict.pkl)
-def topic_dict():
-    d = {}
-    n = len(name_list)
-    for i in range(n):
-        d[name_list[i]] = keyword(url_list[i])
-    file = open(topic_path, "wb")
-    pickle.dump(d, file)
-    file.close()
 
 
 ## Dimensions extraction for the dimension fill
 
-# This function takes as input the url of the metadata of one table
+# This function takes as input the metadata of one table (see get_structure)
 # and for each of its dimension, and for each value of the dimension,
 # gets the words in the name of the value and store them
 # These keywords are then used in dimension_fill to find the most relevant value of one given dimension
 
-def dimension(url):
-
-    # loading the xml structure as a tree
-    file = urlopen(url)
-    tree = ET.parse(file)
-    root = tree.getroot()
-    header = root[0]
-    structure = root[1]
+def structure_dimension(parts):
 
     # getting the different parts of the metadata
-    concepts = get_concepts(structure)
-    info = get_info(structure)
-    dim = get_dimensions(structure)
+    concepts = parts["concepts"]
+    info = parts["info"]
+    dim = parts["dimensions"]
 
-    cl = get_codelists(structure)
-    cons = get_constaints(structure)
+    cl = parts["codelists"]
+    cons = parts["constraints"]
 
     # For some dimension, the OECD have specified a default value (for the default display of the table)
     # This can be found in the "information" part of the metadata (see metadata_extraction)
@@ -190,63 +183,192 @@ def dimension(url):
 
     for a in dim:
         if (a not in avoid_dim):    #some dimensions (like the time) are voluntarily avoided
+            codes = cl[dim[a][2]]    #code -> name for the values of the dimension
             values = []
 
         #First we try to find a default value
 
             # If there is only one value for the dimension, it is the default
             if len(cons[a]) == 1:
-                for d in cl[dim[a][2]]:
-                    if d[0] == cons[a][0]:
-                        Default[a] = d
+                c = cons[a][0]
+                Default[a] = (c, codes[c]) if c in codes else None
             # If one value has the code '_T' (for total), it is the default
             elif ('_T' in cons[a]):
-                for d in cl[dim[a][2]]:
-                    if d[0] == '_T':
-                        Default[a] = d
+                Default[a] = ('_T', codes['_T']) if '_T' in codes else None
             # If the word "total" appear in the name of one value, it is the default
             else:
                 def_val = None
                 for c in cons[a]:
-                    for d in cl[dim[a][2]]:
-                        if d[0] == c:
-                            if 'total' in d[1].lower():
-                                def_val = d
+                    if (c in codes and 'total' in codes[c].lower()):
+                        def_val = (c, codes[c])
                 Default[a] = def_val
 
             # Else, the dimension has no default value
             if Default[a] == None:
-                try :
-                    for d in cl[dim[a][2]]:
-                        if d[0] == info_def[a]:
-                            Default[a] = d
-                except:
-                    pass
+                c = info_def.get(a)
+                if c in codes:
+                    Default[a] = (c, codes[c])
 
         #Then, for each value, we its text and add these words to the dictionnary
 
             for c in cons[a]:
-                for d in cl[dim[a][2]]:
-                    if d[0] == c:
-                        values.append(d)
+                if c in codes:
+                    values.append((c, codes[c]))
 
             Dimensions[a] = values
     return (Dimensions,Default)
 
-# This function executes the previous one to all the supported tables
-# and save it as an independant file (dim_dict.pkl)
+# Same thing from the url of the metadata of one table
+def dimension(url):
+    return structure_dimension(get_structure(url))
+
+
+## Building of the dictionaries
+
+# The two dictionaries are built together (build) : the metadata of each table is downloaded only once,
+# by a pool of workers (config.FETCH_WORKERS), and both the keywords and the dimensions are extracted from the same structure
+# A manifest (dict_manifest.json) keeps for each table its code, the ETag and the date of its metadata and a hash of its structure :
+# - the server is asked with the ETag (or the date), so a table whose metadata has not changed is not downloaded again (304)
+# - a table whose structure has the same hash is not explored again
+# So only the new tables and the tables whose metadata changed are rebuilt, the others are kept from the saved dictionaries
+# A table that fails is kept as it was in the saved dictionaries ; if it was not in them (new table), the build fails
+# with the list of these tables and nothing is saved (the chatbot needs every table of Tables.csv in both dictionaries)
+
+# To be changed when the content of the dictionaries changes (everything is then rebuilt)
+dict_version = 2
+
+def load_manifest():
+    try:
+        file = open(manifest_path, "r", encoding = "utf-8")
+    except OSError:
+        return {}
+    try:
+        manifest = json.load(file)
+    except Exception:
+        manifest = {}
+    finally:
+        file.close()
+    if manifest.get("version") != dict_version:
+        return {}
+    return manifest["tables"]
+
+# The manifest is written in a temporary file first, so that a stopped build never leaves a damaged file
+# (the dictionaries are saved the same way, see save_store in dict_store.py)
+def save_manifest(content):
+    tmp_path = manifest_path + ".tmp"
+    file = open(tmp_path, "w", encoding = "utf-8")
+    json.dump(content, file, indent = 1)
+    file.close()
+    os.replace(tmp_path, manifest_path)
+
+# Hash of the metadata read from the answer (the header of the answer changes at each request)
+def structure_hash(parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys = True).encode("utf-8")).hexdigest()
+
+# Downloads and explores the metadata of one table, given its entry in the manifest (None if it is new)
+# Returns (status, entry, keywords, dimensions) with status "unchanged", "rebuilt" or "failed"
+
+def build_table(code, old, force):
+    headers = {}
+    if (old != None and not force):
+        if old["etag"] != None:
+            headers["If-None-Match"] = old["etag"]
+        if old["modified"] != None:
+            headers["If-Modified-Since"] = old["modified"]
+
+    def reader(file):
+        return (read_structure_message(file), file.headers.get("ETag"), file.headers.get("Last-Modified"))
+
+    try:
+        parts, etag, modified = fetch(structure_url(code), reader, headers)
+    except HTTPError as e:
+        if (old != None and e.code == 304):
+            return ("unchanged", old, None, None)
+        print("Error : metadata of ", code, " : ", e)
+        return ("failed", old, None, None)
+    except Exception as e:
+        print("Error : metadata of ", code, " : ", e)
+        return ("failed", old, None, None)
+
+    entry = {"code" : code, "etag" : etag, "modified" : modified, "hash" : structure_hash(parts)}
+    if (old != None and not force and old["hash"] == entry["hash"]):
+        return ("unchanged", entry, None, None)
+    return ("rebuilt", entry, structure_keyword(parts), structure_dimension(parts))
+
+# Builds both dictionaries (topic_dict.bin and dim_dict.bin) for the tables of Tables.csv
+# With force, all the tables are downloaded and explored again
+
+def build(force = False):
+    manifest = load_manifest()
+    topics = load_store(topic_path, "topic")
+    dims = load_store(dim_path, "dim")
+
+    # a table is only kept if it is in both dictionaries, with the same code as before
+    old_entries = []
+    for i in range(len(name_list)):
+        old = manifest.get(name_list[i])
+        if (old != None and (old["code"] != code_list[i] or name_list[i] not in topics or name_list[i] not in dims)):
+            old = None
+        old_entries.append(old)
+
+    workers = max(1, min(config.FETCH_WORKERS, len(name_list)))
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        results = list(pool.map(build_table, code_list, old_entries, [force] * len(name_list)))
+
+    new_manifest = {}
+    new_topics = {}
+    new_dims = {}
+    missing = []    #tables failed and not built before
+    count = {"unchanged" : 0, "rebuilt" : 0, "failed" : 0}
+    for i in range(len(name_list)):
+        name = name_list[i]
+        status, entry, k, d = results[i]
+        count[status] += 1
+        if status == "rebuilt":
+            new_topics[name] = k
+            new_dims[name] = d
+        elif entry != None:     #unchanged, or failed but built before
+            new_topics[name] = topics[name]
+            new_dims[name] = dims[name]
+        else:
+            missing.append(name)
+        if entry != None:
+            new_manifest[name] = entry
+
+    # The kept tables are now copied : the old stores are closed before their files are replaced
+    # (a file still mapped in memory can not be replaced on Windows)
+    for store in (topics, dims):
+        if isinstance(store, DictStore):
+            store.close()
+
+    if missing != []:
+        raise Exception("Error : the metadata of these tables could not be built (nothing was saved) : " + ", ".join(missing))
+
+    save_store(topic_path, "topic", new_topics)
+    save_store(dim_path, "dim", new_dims)
+    save_manifest({"version" : dict_version, "tables" : new_manifest})
+    print(count["rebuilt"], " tables rebuilt, ", count["unchanged"], " unchanged, ", count["failed"], " failed")
+    return count
 
+# Function to find the keywords for each supported table
+# and save it as an independant file (topic_dict.bin)
+# (the dimension dictionary is updated at the same time)
+def topic_dict():
+    build()
+
+# This function finds the dimensions of all the supported tables
+# and save it as an independant file (dim_dict.bin)
+# (the topic dictionary is updated at the same time)
 def dim_dict():
-    d = {}
-    n = len(name_list)
-    for i in range(n):
-        d[name_list[i]] = dimension(url_list[i])
-    file = open(dim_path, "wb")
-    pickle.dump(d, file)
-    file.close()
+    build()
 
 
 ### Final execution
 
-#topic_dict()
-#dim_dict()
+# python tables_dictionary.py [--force]
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description = "Builds the metadata dictionaries of the supported tables")
+    arg_parser.add_argument("--force", action = "store_true", help = "rebuild all the tables, even if their metadata has not changed")
+    args = arg_parser.parse_args()
+    build(args.force)
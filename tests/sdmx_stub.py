@@ -0,0 +1,145 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# A small local HTTP server answering like the SDMX Web Service, for the tests of data_fetching.py
+# GET /rest/data/<dataflow>/<key>?startPeriod=y1&endPeriod=y2 answers SDMX generic data (dimensionAtObservation=AllDimensions)
+# - the key is FREQ.MEASURE.REF_AREA, and "+" gives several values for a dimension ("A.M1.FR+DE")
+# - the value of an observation only depends on its key and its year (see value)
+# - a key with the country XX has no data : the answer is 404
+# - a path with BAD is a wrong query : the answer is 400
+# - the first 'failures' requests are answered 500
+# GET /rest/dataflow/<code> answers a small SDMX structure message (for the metadata cache of metadata_extraction.py)
+# - its ETag is the version of the structure (see structure_version), and it answers 304 when the version asked is still the same
+# The server counts the requests and the maximal number of requests answered at the same time
+
+### IMPORT
+
+# Python libraries import
+from urllib.parse import urlparse, parse_qs
+import http.server
+import itertools
+import threading
+import time
+
+
+### ANSWERS
+
+dim_names = ["FREQ", "MEASURE", "REF_AREA"]
+
+NAMESPACES = ('xmlns:message="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message" '
+              'xmlns:generic="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/data/generic"')
+
+def value(key, year):
+    return float((sum(ord(c) for c in ".".join(key)) + year) % 97)
+
+def observation(key, year, unit_mult = 0):
+    values = "".join('<generic:Value id="' + d + '" value="' + v + '"/>' for d, v in zip(dim_names, key))
+    values += '<generic:Value id="TIME_PERIOD" value="' + str(year) + '"/>'
+    return ('<generic:Obs><generic:ObsKey>' + values + '</generic:ObsKey>'
+            + '<generic:ObsValue value="' + str(value(key, year)) + '"/>'
+            + '<generic:Attributes><generic:Value id="UNIT_MULT" value="' + str(unit_mult) + '"/></generic:Attributes></generic:Obs>')
+
+def message(key, y1, y2):
+    obs = []
+    for k in itertools.product(*[part.split("+") for part in key.split(".")]):
+        for year in range(y1, y2 + 1):
+            obs.append(observation(k, year))
+    return ('<message:GenericData ' + NAMESPACES + '><message:Header><message:ID>stub</message:ID></message:Header>'
+            + '<message:DataSet>' + "".join(obs) + '</message:DataSet></message:GenericData>')
+
+STRUCTURE_NAMESPACES = ('xmlns:message="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message" '
+                        'xmlns:structure="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/structure" '
+                        'xmlns:common="http://www.sdmx.org/resources/sdmxml/schemas/v2_1/common"')
+
+# The name of FR in the codelist changes with the version, to see which version of the structure was read
+def structure(version):
+    return ('<message:Structure ' + STRUCTURE_NAMESPACES + '><message:Structures>'
+            + '<structure:Codelists><structure:Codelist id="CL_AREA">'
+            + '<structure:Code id="FR"><common:Name xml:lang="en">France ' + str(version) + '</common:Name></structure:Code>'
+            + '<structure:Code id="DE"><common:Name xml:lang="en">Germany</common:Name></structure:Code>'
+            + '</structure:Codelist></structure:Codelists>'
+            + '<structure:Concepts><structure:ConceptScheme id="CS">'
+            + '<structure:Concept id="REF_AREA"><common:Name xml:lang="en">Reference area</common:Name></structure:Concept>'
+            + '</structure:ConceptScheme></structure:Concepts>'
+            + '<structure:DataStructures><structure:DataStructure id="DSD"><structure:DataStructureComponents>'
+            + '<structure:DimensionList id="DimensionDescriptor"><structure:Dimension id="REF_AREA" position="1">'
+            + '<structure:ConceptIdentity><Ref id="REF_AREA"/></structure:ConceptIdentity>'
+            + '<structure:LocalRepresentation><structure:Enumeration><Ref id="CL_AREA"/></structure:Enumeration></structure:LocalRepresentation>'
+            + '</structure:Dimension></structure:DimensionList>'
+            + '</structure:DataStructureComponents></structure:DataStructure></structure:DataStructures>'
+            + '<structure:Constraints><structure:ContentConstraint id="CC" type="Actual"><structure:CubeRegion>'
+            + '<common:KeyValue id="REF_AREA"><common:Value>FR</common:Value><common:Value>DE</common:Value></common:KeyValue>'
+            + '</structure:CubeRegion></structure:ContentConstraint></structure:Constraints>'
+            + '</message:Structures></message:Structure>')
+
+
+### SERVER
+
+class SDMXStub(http.server.BaseHTTPRequestHandler):
+    delay = 0           #time taken by each answer, in seconds
+    structure_version = 1
+    failures = 0        #number of requests still to be answered 500
+    requests = 0
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with SDMXStub.lock:
+            SDMXStub.requests += 1
+            SDMXStub.active += 1
+            SDMXStub.max_active = max(SDMXStub.max_active, SDMXStub.active)
+            failed = SDMXStub.failures > 0
+            if failed:
+                SDMXStub.failures -= 1
+        try:
+            time.sleep(SDMXStub.delay)
+            url = urlparse(self.path)
+            key = url.path.split("/")[-1]
+            if failed:
+                self.answer(500)
+            elif "BAD" in url.path:
+                self.answer(400)
+            elif "XX" in key.replace("+", ".").split("."):
+                self.answer(404)
+            elif "/dataflow/" in url.path:
+                etag = '"v' + str(SDMXStub.structure_version) + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.answer(304, etag = etag)
+                else:
+                    self.answer(200, structure(SDMXStub.structure_version).encode("utf-8"), etag)
+            else:
+                query = parse_qs(url.query)
+                body = message(key, int(query["startPeriod"][0]), int(query["endPeriod"][0])).encode("utf-8")
+                self.answer(200, body)
+        finally:
+            with SDMXStub.lock:
+                SDMXStub.active -= 1
+
+    def answer(self, code, body = b"", etag = None):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/xml")
+        if etag != None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def reset():
+    SDMXStub.delay = 0
+    SDMXStub.structure_version = 1
+    SDMXStub.failures = 0
+    SDMXStub.requests = 0
+    SDMXStub.active = 0
+    SDMXStub.max_active = 0
+
+# Starts the server on a free port : returns the server and the prefix of its URLs (like data_prefix in chatbot.py)
+def start():
+    reset()
+    server = http.server.ThreadingHTTPServer(("localhost", 0), SDMXStub)
+    server.daemon_threads = True
+    threading.Thread(target = server.serve_forever, args = (0.05,), daemon = True).start()
+    return (server, "http://localhost:" + str(server.server_address[1]) + "/rest/data/")
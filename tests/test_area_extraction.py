@@ -0,0 +1,147 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# Tests of the detection of the areas in a sentence (find_areas_in_list in area_extraction.py)
+# The gazetteer is compared with the previous version of the function (kept below as the baseline),
+# which looked for the countries, the regions and the demonyms in separate lists of complete and partial names
+
+import csv
+import os
+import nltk
+import pytest
+
+try:
+    nltk.word_tokenize("Population of India")
+except LookupError:
+    pytest.skip("the nltk tokenizer data is not installed", allow_module_level = True)
+
+import utils
+from utils import lower_list
+from area_extraction import find_areas_in_list
+
+
+### BASELINE
+
+region_dict = utils.region_dict
+demo_dict = utils.demo_dict
+acro_dict = utils.acro_dict
+
+country_list = region_dict["World"]
+region_list = list(region_dict.keys())
+demo_list = list(demo_dict.keys())
+acro_list = list(acro_dict.keys())
+
+def replacement(sent):
+    s = sent
+    for a in acro_list:
+        s = s.replace(a, acro_dict[a])
+    return nltk.word_tokenize(s)
+
+def bilist(liste):
+    partial = []
+    for l in liste:
+        words = nltk.word_tokenize(l)
+        for i in range(1, len(words)):
+            partial.append(" ".join(words[0:i]))
+    return (lower_list(liste), lower_list(partial))
+
+# Names of one kind, as in the previous find_areas_in_list
+# (with a bound on a : the previous version never stopped on a sentence ending with the beginning of a name, like "South")
+def find_names(tokens, names):
+    comp, part = bilist(names)
+    res = []
+    n = len(tokens)
+    i = 0
+    while (i < n):
+        if tokens[i].lower() in comp:
+            res.append(tokens[i])
+            i += 1
+        elif tokens[i].lower() in part:
+            a = 1
+            while (i+a <= n and " ".join(tokens[i:i+a]).lower() in part):
+                a += 1
+            if " ".join(tokens[i:i+a]).lower() in comp:
+                res.append(" ".join(tokens[i:i+a]))
+                i = i+a
+            else:
+                i += 1
+        else:
+            i += 1
+    return res
+
+def official(name, names):
+    for c in names:
+        if c.lower() == name.lower():
+            return c
+
+def area_type(area):
+    if area in country_list:
+        return 'country'
+    elif area in region_list:
+        return 'region'
+    return ''
+
+# [official name, type] of the areas found by the previous version (countries, then regions, then demonyms)
+def old_areas(sent):
+    tokens = replacement(sent)
+    res = [[official(c, country_list), 'country'] for c in find_names(tokens, country_list)]
+    res += [[official(r, region_list), 'region'] for r in find_names(tokens, region_list)]
+    for d in find_names(tokens, demo_list):
+        name = demo_dict[official(d, demo_list)]
+        res.append([name, area_type(name)])
+    return res
+
+def new_areas(sent):
+    return [[a[3], a[1]] for a in find_areas_in_list(nltk.word_tokenize(sent))]
+
+
+### COMPARISON
+
+def location_queries():
+    file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data/test/Time_Location_queries_test.csv")
+    with open(file_path, encoding = "utf-8-sig") as file:
+        return list(csv.DictReader(file, delimiter = ";"))
+
+@pytest.mark.parametrize("row", location_queries(), ids = lambda row : row["Query"])
+def test_same_as_baseline(row):
+    areas = new_areas(row["Query"])
+    assert areas == old_areas(row["Query"])
+    expected = set()
+    for column in ["Loc_from", "Loc_to", "Loc_than"]:
+        if row[column] != "None":
+            expected.update(row[column].split("/"))
+    assert set(a[0] for a in areas) == expected
+
+# The names of different kinds can overlap : as in the previous version, the region Africa is also found in "South Africa"
+@pytest.mark.parametrize("sent, areas", [
+    ("Tourism between South Africa and Spain", [["South Africa", "country"], ["Spain", "country"], ["Africa", "region"]]),
+    ("Exports of south africa", [["South Africa", "country"], ["Africa", "region"]]),
+    ("Growth of the South African economy", [["South Africa", "country"]]),
+    ("French and German exports in Europe", [["Europe", "region"], ["France", "country"], ["Germany", "country"]]),
+    ("GDP of the UK and the US", [["United Kingdom", "country"], ["United States of America", "country"]]),
+    ("Give us the GDP of the USA", [["United States of America", "country"]]),
+    ("Population of Micronesia", [["Micronesia", "country"], ["Micronesia", "region"]]),
+    ("Unemployment in South East Asia", [["South East Asia", "region"]]),
+])
+def test_names(sent, areas):
+    assert new_areas(sent) == areas
+    assert old_areas(sent) == areas
+
+# The form and the words of the sentence are kept ('a' for an adjective)
+def test_surface_and_form():
+    assert find_areas_in_list(nltk.word_tokenize("GDP of south africa and the UK")) == [
+        ["south africa", "country", "n", "South Africa"], ["UK", "country", "n", "United Kingdom"],
+        ["africa", "region", "n", "Africa"]]
+    assert find_areas_in_list(nltk.word_tokenize("Spanish GDP")) == [["Spanish", "country", "a", "Spain"]]
+
+# "us" is a pronoun, only "US" is the country
+def test_us():
+    assert new_areas("Show us the GDP") == []
+    assert new_areas("Show the US GDP") == [["United States of America", "country"]]
+
+# Differences with the baseline : the longest name is found, even when it is the beginning of a longer name
+def test_longest_name():
+    assert new_areas("Trade in Latin America in 2010") == [["Latin America", "region"]]
+    assert old_areas("Trade in Latin America in 2010") == []
+    assert new_areas("The French Polynesian economy") == [["French Polynesia", "country"]]
+    assert new_areas("Population of the South") == []
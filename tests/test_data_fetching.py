@@ -0,0 +1,184 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# Tests of the downloads from the SDMX Web Service (data_fetching.py), against the local server of sdmx_stub.py
+
+from urllib.error import HTTPError
+import time
+import types
+import pytest
+
+import config
+import data_fetching
+from data_fetching import fetch, fetch_all, read_arrays, key_url, plan_urls, fetch_series
+import sdmx_stub
+from sdmx_stub import SDMXStub
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(config, "FETCH_WORKERS", 8)
+    monkeypatch.setattr(config, "FETCH_PER_HOST", 8)
+    monkeypatch.setattr(config, "FETCH_RETRIES", 3)
+    monkeypatch.setattr(config, "FETCH_TIMEOUT", 10)
+    monkeypatch.setattr(data_fetching, "host_limits", {})
+    server, prefix = sdmx_stub.start()
+    yield prefix
+    server.shutdown()
+    server.server_close()
+
+# The waits between two attempts are recorded instead of done
+@pytest.fixture
+def waits(monkeypatch):
+    res = []
+    monkeypatch.setattr(data_fetching, "time", types.SimpleNamespace(sleep = res.append))
+    return res
+
+def url(prefix, key, y1 = 2010, y2 = 2012):
+    return prefix + "DF/" + key + "?startPeriod=" + str(y1) + "&endPeriod=" + str(y2)
+
+def read(file):
+    return read_arrays(file, sdmx_stub.dim_names)
+
+
+### READING
+
+def test_fetch_reads_series(stub):
+    series = fetch(url(stub, "A.M1.FR+DE"), read)
+    assert sorted(series) == ["A.M1.DE", "A.M1.FR"]
+    years, values = series["A.M1.FR"]
+    assert list(years) == [2010, 2011, 2012]
+    assert list(values) == [sdmx_stub.value(("A", "M1", "FR"), y) for y in [2010, 2011, 2012]]
+
+
+### PARALLEL DOWNLOADS
+
+def test_fetch_all_in_parallel(stub):
+    SDMXStub.delay = 0.2
+    urls = [url(stub, "A.M1.C" + str(i)) for i in range(8)]
+    start = time.perf_counter()
+    res = fetch_all(urls, read)
+    elapsed = time.perf_counter() - start
+    assert sorted(res) == sorted(urls)
+    assert SDMXStub.requests == 8
+    assert SDMXStub.max_active > 1
+    assert elapsed < 8 * 0.2
+
+def test_fetch_all_same_url_once(stub):
+    u = url(stub, "A.M1.FR")
+    res = fetch_all([u, u, u], read)
+    assert list(res) == [u]
+    assert SDMXStub.requests == 1
+
+def test_fetch_all_per_host_limit(stub, monkeypatch):
+    monkeypatch.setattr(config, "FETCH_PER_HOST", 2)
+    SDMXStub.delay = 0.1
+    res = fetch_all([url(stub, "A.M1.C" + str(i)) for i in range(8)], read)
+    assert len(res) == 8
+    assert SDMXStub.max_active == 2
+
+
+### ERRORS
+
+def test_retry_on_server_error(stub, waits):
+    SDMXStub.failures = 2
+    series = fetch(url(stub, "A.M1.FR"), read)
+    assert "A.M1.FR" in series
+    assert SDMXStub.requests == 3
+    assert waits == [0.5, 1.0]
+
+def test_server_error_after_retries(stub, waits):
+    SDMXStub.failures = 10
+    with pytest.raises(HTTPError) as e:
+        fetch(url(stub, "A.M1.FR"), read)
+    assert e.value.code == 500
+    assert SDMXStub.requests == config.FETCH_RETRIES + 1
+
+def test_no_retry_on_client_error(stub, waits):
+    with pytest.raises(HTTPError) as e:
+        fetch(url(stub, "A.M1.XX"), read)
+    assert e.value.code == 404
+    with pytest.raises(HTTPError) as e:
+        fetch(url(stub, "A.M1.BAD"), read)
+    assert e.value.code == 400
+    assert SDMXStub.requests == 2
+    assert waits == []
+
+# Without data (404) the url is left out, or given the 'empty' result ; the other errors are always left out
+def test_fetch_all_errors(stub, waits):
+    ok, no_data, bad = url(stub, "A.M1.FR"), url(stub, "A.M1.XX"), url(stub, "A.M1.BAD")
+    res = fetch_all([ok, no_data, bad], read)
+    assert list(res) == [ok]
+    res = fetch_all([ok, no_data, bad], read, empty = {})
+    assert sorted(res) == sorted([ok, no_data])
+    assert res[no_data] == {}
+
+
+### SERIES
+
+@pytest.fixture
+def series_stub(stub, monkeypatch):
+    monkeypatch.setattr(data_fetching, "data_prefix", stub)
+    return stub
+
+def expected(key, y1, y2):
+    return [sdmx_stub.value(tuple(key.split(".")), y) for y in range(y1, y2 + 1)]
+
+def test_plan_urls_groups_values(series_stub):
+    plan = plan_urls("DF", [["A", "M1", "FR"], ["A", "M1", "DE"]], 2010, 2012)
+    assert len(plan) == 1
+    url, keys = plan[0]
+    assert url == key_url("DF", "A.M1.FR+DE", 2010, 2012)
+    assert keys == [["A", "M1", "FR"], ["A", "M1", "DE"]]
+
+def test_plan_urls_split(series_stub):
+    keys = [["A", "M1", "C%03d" % i] for i in range(100)]
+    max_length = len(key_url("DF", "A.M1." + "+".join(["C000"] * 10), 2010, 2012))
+    plan = plan_urls("DF", keys, 2010, 2012, max_length)
+    assert len(plan) == 10
+    assert all(len(url) <= max_length for url, url_keys in plan)
+    assert [k for url, url_keys in plan for k in url_keys] == keys
+
+# Two values of two dimensions : the answer also has the series A.M1.DE and A.M2.FR, which were not asked
+def test_fetch_series_grouped(series_stub):
+    keys = [["A", "M1", "FR"], ["A", "M2", "DE"]]
+    res = fetch_series("DF", {(2010, 2012) : keys}, sdmx_stub.dim_names)
+    assert SDMXStub.requests == 1
+    assert sorted(res) == [(2010, 2012, "A.M1.FR"), (2010, 2012, "A.M2.DE")]
+    for (y1, y2, key), (years, values) in res.items():
+        assert list(years) == [2010, 2011, 2012]
+        assert list(values) == expected(key, 2010, 2012)
+
+def test_fetch_series_split(series_stub):
+    keys = [["A", "M1", "C%03d" % i] for i in range(40)]
+    max_length = len(key_url("DF", "A.M1." + "+".join(["C000"] * 8), 2010, 2011))
+    res = fetch_series("DF", {(2010, 2011) : keys, (2015, 2015) : keys[:3]}, sdmx_stub.dim_names, max_length)
+    assert SDMXStub.requests == 5 + 1
+    assert len(res) == 43
+    for (y1, y2, key), (years, values) in res.items():
+        assert list(years) == list(range(y1, y2 + 1))
+        assert list(values) == expected(key, y1, y2)
+
+# The group with XX is answered 404 : its series have no data, the series of the other group are not changed
+def test_fetch_series_404_group(series_stub, waits):
+    keys = [["A", "M1", "FR"], ["A", "M1", "DE"], ["A", "M1", "XX"], ["A", "M1", "IT"]]
+    max_length = len(key_url("DF", "A.M1.FR+DE", 2010, 2010))
+    res = fetch_series("DF", {(2010, 2010) : keys}, sdmx_stub.dim_names, max_length)
+    assert SDMXStub.requests == 2
+    assert len(res) == 4
+    for key in ["A.M1.XX", "A.M1.IT"]:
+        years, values = res[(2010, 2010, key)]
+        assert len(years) == 0 and len(values) == 0
+    for key in ["A.M1.FR", "A.M1.DE"]:
+        years, values = res[(2010, 2010, key)]
+        assert list(values) == expected(key, 2010, 2010)
+
+# A group that could not be downloaded is left out (its series will be asked again)
+def test_fetch_series_failed_group(series_stub, waits, monkeypatch):
+    monkeypatch.setattr(config, "FETCH_RETRIES", 0)
+    monkeypatch.setattr(config, "FETCH_WORKERS", 1)
+    SDMXStub.failures = 1
+    keys = [["A", "M1", "FR"], ["A", "M1", "DE"]]
+    max_length = len(key_url("DF", "A.M1.FR", 2010, 2010))
+    res = fetch_series("DF", {(2010, 2010) : keys}, sdmx_stub.dim_names, max_length)
+    assert sorted(res) == [(2010, 2010, "A.M1.DE")]
@@ -0,0 +1,197 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# Tests of the binary store of the metadata dictionaries (dict_store.py)
+# A damaged file must always give a DictStoreError (never an IndexError, a KeyError or a wrong content)
+
+import json
+import os
+import struct
+import pytest
+
+from dict_store import DictStore, DictStoreError, load_store, save_store, magic
+
+
+topics = {
+    "Domestic Tourism" : ({"domestic", "tourism"}, {"nights", "hotels"}, {"region"}, {"industry", "tourism"}),
+    "Population" : ({"population"}, set(), {"sex", "age"}, {"demography"}),
+}
+dims = {
+    "Population" : ({"SEX" : [("F", "Female"), ("M", "Male")], "AGE" : [("_T", "Total")]}, {"SEX" : None, "AGE" : ("_T", "Total")}),
+    "GDP" : ({"MEASURE" : [("USD", "US dollars")]}, {"MEASURE" : ("USD", "US dollars")}),
+}
+
+@pytest.fixture
+def topic_file(tmp_path):
+    file_path = str(tmp_path / "topic_dict.bin")
+    save_store(file_path, "topic", topics)
+    return file_path
+
+@pytest.fixture
+def dim_file(tmp_path):
+    file_path = str(tmp_path / "dim_dict.bin")
+    save_store(file_path, "dim", dims)
+    return file_path
+
+def read_file(file_path):
+    file = open(file_path, "rb")
+    data = file.read()
+    file.close()
+    return data
+
+def write_file(file_path, data):
+    file = open(file_path, "wb")
+    file.write(data)
+    file.close()
+
+def header_of(data):
+    size = struct.unpack("<I", data[len(magic):len(magic) + 4])[0]
+    return (json.loads(data[len(magic) + 4:len(magic) + 4 + size]), len(magic) + 4 + size)
+
+# Changes the header of the file (the arrays stay the same)
+def rewrite_header(file_path, change):
+    data = read_file(file_path)
+    header, start = header_of(data)
+    change(header)
+    h = json.dumps(header).encode("utf-8")
+    h += b" " * (-(len(magic) + 4 + len(h)) % 8)
+    write_file(file_path, magic + struct.pack("<I", len(h)) + h + data[start:])
+
+# Writes the value of an int32 of an array of the file
+def write_int(file_path, array, position, value):
+    data = bytearray(read_file(file_path))
+    header, start = header_of(data)
+    offset = start + header["arrays"][array]["offset"] + 4 * position
+    data[offset:offset + 4] = struct.pack("<i", value)
+    write_file(file_path, bytes(data))
+
+
+### READING
+
+def test_round_trip(topic_file, dim_file):
+    store = DictStore(topic_file, "topic")
+    assert list(store) == list(topics)
+    assert dict(store) == topics
+    store = DictStore(dim_file, "dim")
+    assert list(store) == list(dims)
+    assert dict(store) == dims
+    assert "GDP" in store and "Population" in store and "Other" not in store
+    with pytest.raises(KeyError):
+        store["Other"]
+
+def test_load_store_missing_file(tmp_path):
+    assert load_store(str(tmp_path / "none.bin"), "topic") == {}
+
+def test_close(topic_file):
+    store = DictStore(topic_file, "topic")
+    kept = store["Population"]
+    store.close()
+    store.close()
+    assert store["Population"] == kept
+    with pytest.raises(DictStoreError):
+        store["Domestic Tourism"]
+    save_store(topic_file, "topic", {"Population" : kept})
+    assert dict(DictStore(topic_file, "topic")) == {"Population" : kept}
+
+
+### DAMAGED FILES
+
+def test_truncated(topic_file):
+    data = read_file(topic_file)
+    header, start = header_of(data)
+    for size in [0, 4, len(magic) + 2, start - 10, start, len(data) - 9]:
+        write_file(topic_file, data[:size])
+        with pytest.raises(DictStoreError):
+            DictStore(topic_file, "topic")
+
+def test_wrong_magic(topic_file):
+    data = read_file(topic_file)
+    write_file(topic_file, b"NOTADICT" + data[len(magic):])
+    with pytest.raises(DictStoreError):
+        DictStore(topic_file, "topic")
+
+def test_wrong_version(topic_file):
+    rewrite_header(topic_file, lambda h: h.update(version = 2))
+    with pytest.raises(DictStoreError):
+        DictStore(topic_file, "topic")
+
+def test_wrong_kind(topic_file):
+    with pytest.raises(DictStoreError):
+        DictStore(topic_file, "dim")
+
+def test_damaged_json(topic_file):
+    data = bytearray(read_file(topic_file))
+    data[len(magic) + 4] = ord("[")
+    write_file(topic_file, bytes(data))
+    with pytest.raises(DictStoreError):
+        DictStore(topic_file, "topic")
+
+@pytest.mark.parametrize("change", [
+    lambda h: h.pop("arrays"),
+    lambda h: h.pop("strings"),
+    lambda h: h.pop("tables"),
+    lambda h: h["arrays"].pop("words"),
+    lambda h: h["arrays"]["words"].pop("shape"),
+    lambda h: h["arrays"]["words"].update(shape = "many"),
+    lambda h: h["arrays"]["words"].update(dtype = "<f8"),
+    lambda h: h.update(strings = "x"),
+    lambda h: h.update(strings = h["strings"] + 1),
+])
+def test_bad_header(topic_file, change):
+    rewrite_header(topic_file, change)
+    with pytest.raises(DictStoreError):
+        DictStore(topic_file, "topic")
+
+@pytest.mark.parametrize("change", [
+    lambda h: h["arrays"]["words"].update(offset = 10**9),
+    lambda h: h["arrays"]["words"].update(offset = -8),
+    lambda h: h["arrays"]["string_data"].update(shape = [10**9]),
+    lambda h: h["arrays"]["words"].update(shape = [-1]),
+])
+def test_array_outside(topic_file, change):
+    rewrite_header(topic_file, change)
+    with pytest.raises(DictStoreError):
+        DictStore(topic_file, "topic")
+
+def test_string_offsets_outside(topic_file):
+    write_int(topic_file, "string_offsets", 2, 10**6)   #the offsets are int64 : this changes the low half of the second one
+    with pytest.raises(DictStoreError):
+        DictStore(topic_file, "topic")
+
+@pytest.mark.parametrize("value", [10**6, -2])
+def test_string_id_outside(topic_file, value):
+    write_int(topic_file, "words", 0, value)
+    store = DictStore(topic_file, "topic")
+    with pytest.raises(DictStoreError):
+        store[list(topics)[0]]
+
+def test_dim_string_id_outside(dim_file):
+    write_int(dim_file, "values", 1, 10**6)
+    store = DictStore(dim_file, "dim")
+    with pytest.raises(DictStoreError):
+        store["Population"]
+
+def test_dim_values_outside(dim_file):
+    write_int(dim_file, "dims", 2, 10**6)   #end of the values of the first dimension
+    store = DictStore(dim_file, "dim")
+    with pytest.raises(DictStoreError):
+        store["Population"]
+
+@pytest.mark.parametrize("tables", [
+    ["Population"],
+    {"Population" : 3},
+    {"Population" : [0, 1, 2, 3]},
+    {"Population" : [0, 1, 2, 3, "x"]},
+    {"Population" : [3, 2, 2, 2, 2]},
+    {"Population" : [-1, 0, 0, 0, 0]},
+])
+def test_bad_tables(topic_file, tables):
+    rewrite_header(topic_file, lambda h: h.update(tables = tables))
+    with pytest.raises(DictStoreError):
+        DictStore(topic_file, "topic")
+
+def test_table_outside(topic_file):
+    rewrite_header(topic_file, lambda h: h.update(tables = {"Population" : [0, 1, 2, 3, 10**6]}))
+    store = DictStore(topic_file, "topic")
+    with pytest.raises(DictStoreError):
+        store["Population"]
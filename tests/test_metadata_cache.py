@@ -0,0 +1,109 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# Tests of the cache of the metadata (get_metadata in metadata_extraction.py), against the local server of sdmx_stub.py
+
+import gzip
+import json
+import types
+import pytest
+
+import config
+import data_fetching
+import metadata_extraction
+from metadata_extraction import get_metadata, cache_file, load_entry, save_entry
+from cache import LRUCache
+import sdmx_stub
+from sdmx_stub import SDMXStub
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "FETCH_WORKERS", 1)
+    monkeypatch.setattr(config, "FETCH_RETRIES", 0)
+    monkeypatch.setattr(config, "FETCH_TIMEOUT", 10)
+    monkeypatch.setattr(config, "METADATA_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "METADATA_TTL", 3600)
+    monkeypatch.setattr(config, "METADATA_RETRY_AFTER", 300)
+    monkeypatch.setattr(data_fetching, "host_limits", {})
+    monkeypatch.setattr(data_fetching, "time", types.SimpleNamespace(sleep = lambda t : None))
+    monkeypatch.setattr(metadata_extraction, "metadata_cache", LRUCache(4, "metadata"))
+    server, prefix = sdmx_stub.start()
+    monkeypatch.setattr(metadata_extraction, "structure_prefix", prefix.replace("/data/", "/dataflow/"))
+    yield prefix
+    server.shutdown()
+    server.server_close()
+
+def france(metadata):
+    return metadata["codelists"]["CL_AREA"]["FR"]
+
+# The metadata only kept on disk (as after a restart)
+def forget():
+    metadata_extraction.metadata_cache.clear()
+
+
+def test_download_and_reuse(stub):
+    metadata = get_metadata("OECD/DF/1.0")
+    assert metadata["dimensions"] == {"REF_AREA" : ("1", "REF_AREA", "CL_AREA")}
+    assert metadata["constraints"] == {"REF_AREA" : ["FR", "DE"]}
+    assert france(metadata) == "France 1"
+    get_metadata("OECD/DF/1.0")
+    forget()
+    assert get_metadata("OECD/DF/1.0") == metadata
+    assert SDMXStub.requests == 1
+
+# After the TTL, the server is asked with the ETag : the saved version is kept while it answers 304
+def test_ttl_expiry(stub, monkeypatch):
+    get_metadata("DF")
+    monkeypatch.setattr(config, "METADATA_TTL", 0)
+    time1 = load_entry("DF")["time"]
+    forget()
+    assert france(get_metadata("DF")) == "France 1"
+    assert SDMXStub.requests == 2
+    assert load_entry("DF")["time"] > time1
+    SDMXStub.structure_version = 2
+    assert france(get_metadata("DF")) == "France 2"
+    assert SDMXStub.requests == 3
+    assert load_entry("DF")["etag"] == '"v2"'
+
+@pytest.mark.parametrize("content", [b"not gzip", gzip.compress(b"{not json")])
+def test_damaged_entry(stub, content):
+    get_metadata("DF")
+    forget()
+    with open(cache_file("DF"), "wb") as file:
+        file.write(content)
+    assert load_entry("DF") == None
+    assert france(get_metadata("DF")) == "France 1"
+    assert SDMXStub.requests == 2
+    assert load_entry("DF") != None
+
+# A file saved by an older version is ignored, even if it is recent
+def test_cache_version(stub):
+    get_metadata("DF")
+    forget()
+    entry = load_entry("DF")
+    entry["version"] = metadata_extraction.cache_version - 1
+    entry["metadata"]["codelists"]["CL_AREA"]["FR"] = "old"
+    save_entry("DF", entry)
+    assert france(get_metadata("DF")) == "France 1"
+    assert SDMXStub.requests == 2
+    assert load_entry("DF")["version"] == metadata_extraction.cache_version
+
+# When the server fails, the expired version is used, and the server is not asked again before METADATA_RETRY_AFTER
+def test_server_down(stub, monkeypatch):
+    get_metadata("DF")
+    monkeypatch.setattr(config, "METADATA_TTL", 60)
+    entry = load_entry("DF")
+    entry["time"] -= 120
+    save_entry("DF", entry)
+    forget()
+    SDMXStub.failures = 1
+    assert france(get_metadata("DF")) == "France 1"
+    assert SDMXStub.requests == 2
+    assert france(get_metadata("DF")) == "France 1"
+    assert SDMXStub.requests == 2
+
+def test_server_down_without_entry(stub):
+    SDMXStub.failures = 1
+    with pytest.raises(Exception):
+        get_metadata("DF")
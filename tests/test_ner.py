@@ -0,0 +1,94 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# Tests of the NER backends (ner.py), with a local stub of the Stanford NER server and a fake CoreNLP server
+
+import socketserver
+import threading
+import pytest
+
+from ner import CoreNLPTagger, StanfordServerTagger
+
+
+### STANFORD NER SERVER STUB
+
+# The stub tags the words starting with a capital letter as LOCATION, the others as O
+# It answers all the lines of a connection, or only the first one with first_line_only (like some versions of the NERServer)
+# The empty lines are skipped, like the real server
+
+def tag_line(line):
+    return " ".join(w + "/" + ("LOCATION" if w[0].isupper() else "O") for w in line.split())
+
+class NERStub(socketserver.StreamRequestHandler):
+    first_line_only = False
+    connections = 0
+
+    def handle(self):
+        NERStub.connections += 1
+        lines = self.rfile.read().decode("utf8").split("\n")
+        if NERStub.first_line_only:
+            lines = lines[:1]
+        answer = [tag_line(line) for line in lines if line.strip() != ""]
+        self.wfile.write(("\n".join(answer) + "\n").encode("utf8"))
+
+@pytest.fixture
+def tagger():
+    NERStub.first_line_only = False
+    NERStub.connections = 0
+    server = socketserver.ThreadingTCPServer(("localhost", 0), NERStub)
+    server.daemon_threads = True
+    threading.Thread(target = server.serve_forever, args = (0.05,), daemon = True).start()
+    tagger = StanfordServerTagger(host = "localhost", port = server.server_address[1])
+    tagger.started = True   #the stub is already listening, no Java server is launched
+    yield tagger
+    server.shutdown()
+    server.server_close()
+
+sentences = [["Growth", "in", "France"], ["GDP", "of", "the", "UK"], ["unemployment", "in", "Italy", "and", "Spain"]]
+expected = [[(w, "LOCATION" if w[0].isupper() else "O") for w in tokens] for tokens in sentences]
+
+
+### STANFORD NER SERVER
+
+def test_tag_sents_one_connection(tagger):
+    assert tagger.tag_sents(sentences) == expected
+    assert NERStub.connections == 1
+
+def test_tag(tagger):
+    assert tagger.tag(sentences[1]) == expected[1]
+
+def test_tag_sents_empty_sentences(tagger):
+    res = tagger.tag_sents([[], sentences[0], [], sentences[1], sentences[2], []])
+    assert res == [[], expected[0], [], expected[1], expected[2], []]
+    assert NERStub.connections == 1
+    assert tagger.tag_sents([[], []]) == [[], []]
+    assert NERStub.connections == 1
+
+# A server reading only the first line of each connection still tags all the sentences
+def test_tag_sents_first_line_only(tagger):
+    NERStub.first_line_only = True
+    assert tagger.tag_sents(sentences) == expected
+    assert NERStub.connections == 1 + len(sentences)
+
+
+### CORENLP SERVER
+
+# The fake server skips the empty lines, like the CoreNLP server with ssplit.eolonly
+class FakeCoreNLP:
+    calls = 0
+
+    def api_call(self, text, properties = None):
+        FakeCoreNLP.calls += 1
+        res = []
+        for line in text.split("\n"):
+            if line.strip() != "":
+                res.append({"tokens" : [{"word" : w, "ner" : t} for w, t in (x.rsplit("/", 1) for x in tag_line(line).split())]})
+        return {"sentences" : res}
+
+def test_corenlp_empty_sentences():
+    tagger = CoreNLPTagger()
+    tagger.server = FakeCoreNLP()
+    FakeCoreNLP.calls = 0
+    assert tagger.tag_sents([sentences[0], [], sentences[2]]) == [expected[0], [], expected[2]]
+    assert tagger.tag_sents([[]]) == [[]]
+    assert FakeCoreNLP.calls == 1
@@ -0,0 +1,86 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# Tests of the intervals and of the store of observations (observation_store.py)
+
+import numpy as np
+
+from observation_store import add_interval, missing_intervals, ObservationStore
+
+
+### INTERVALS
+
+def test_add_interval_disjoint():
+    assert add_interval([(2010, 2012)], 2015, 2016) == [(2010, 2012), (2015, 2016)]
+    assert add_interval([(2015, 2016)], 2010, 2012) == [(2010, 2012), (2015, 2016)]
+
+def test_add_interval_overlap():
+    assert add_interval([(2010, 2014)], 2012, 2018) == [(2010, 2018)]
+    assert add_interval([(2012, 2019)], 2010, 2018) == [(2010, 2019)]
+    assert add_interval([(2012, 2014)], 2010, 2020) == [(2010, 2020)]
+
+def test_add_interval_adjacent():
+    assert add_interval([(2010, 2012)], 2013, 2015) == [(2010, 2015)]
+    assert add_interval([(2013, 2015)], 2010, 2012) == [(2010, 2015)]
+
+def test_add_interval_joins_two():
+    assert add_interval([(2010, 2011), (2015, 2016), (2020, 2020)], 2012, 2014) == [(2010, 2016), (2020, 2020)]
+
+def test_missing_intervals():
+    assert missing_intervals([], 2010, 2018) == [(2010, 2018)]
+    assert missing_intervals([(2010, 2018)], 2012, 2015) == []
+    assert missing_intervals([(2012, 2013), (2016, 2017)], 2010, 2020) == [(2010, 2011), (2014, 2015), (2018, 2020)]
+    assert missing_intervals([(2000, 2005)], 2010, 2012) == [(2010, 2012)]
+
+# After 2012-2019, asking for 2010-2018 only needs 2010-2011
+def test_missing_after_overlap():
+    assert missing_intervals([(2012, 2019)], 2010, 2018) == [(2010, 2011)]
+
+
+### STORE
+
+def test_store_only_missing_years():
+    store = ObservationStore()
+    store.add("DF", "A.FR", 2012, 2019, range(2012, 2020), np.arange(8.0))
+    assert store.missing("DF", "A.FR", 2010, 2018) == [(2010, 2011)]
+    store.add("DF", "A.FR", 2010, 2011, [2010, 2011], [-2.0, -1.0])
+    assert store.missing("DF", "A.FR", 2010, 2018) == []
+    years, values = store.get("DF", "A.FR", 2010, 2018)
+    assert list(years) == list(range(2010, 2019))
+    assert list(values) == [-2.0, -1.0, 0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+# A serie without data is kept, so that it is not asked again
+def test_store_empty_serie():
+    store = ObservationStore()
+    store.add("DF", "A.XX", 2010, 2015, [], [])
+    assert store.missing("DF", "A.XX", 2010, 2015) == []
+    years, values = store.get("DF", "A.XX", 2010, 2015)
+    assert len(years) == 0 and len(values) == 0
+    assert store.size == 1
+
+def test_store_lru_eviction():
+    store = ObservationStore(maxsize = 10)
+    store.add("DF", "A", 2010, 2013, range(2010, 2014), np.ones(4))
+    store.add("DF", "B", 2010, 2013, range(2010, 2014), np.ones(4))
+    store.get("DF", "A", 2010, 2013)     #A is now more recent than B
+    store.add("DF", "C", 2010, 2013, range(2010, 2014), np.ones(4))
+    assert ("DF", "B") not in store.data
+    assert ("DF", "A") in store.data and ("DF", "C") in store.data
+    assert store.size == 8
+    assert store.missing("DF", "B", 2010, 2013) == [(2010, 2013)]
+
+# A serie bigger than the store is still kept (the store never removes the last serie)
+def test_store_eviction_keeps_last():
+    store = ObservationStore(maxsize = 3)
+    store.add("DF", "A", 2010, 2011, [2010, 2011], [1.0, 2.0])
+    store.add("DF", "B", 2010, 2014, range(2010, 2015), np.ones(5))
+    assert list(store.data) == [("DF", "B")]
+    assert store.size == 5
+
+def test_store_replace_years():
+    store = ObservationStore()
+    store.add("DF", "A", 2010, 2012, [2010, 2011, 2012], [1.0, 2.0, 3.0])
+    store.add("DF", "A", 2011, 2011, [2011], [20.0])
+    years, values = store.get("DF", "A", 2010, 2012)
+    assert list(values) == [1.0, 20.0, 3.0]
+    assert store.size == 3
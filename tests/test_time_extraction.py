@@ -0,0 +1,24 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# Tests of the year used by the questions about one year (single_year in time_extraction.py),
+# which also gives the new year of a follow-up question (see answer_question in chatbot.py)
+
+from time_extraction import single_year
+
+
+def test_single_year():
+    assert single_year((2012, 2015, None), 2010) == 2012
+    assert single_year((2015, 2015, None), 2010) == 2015
+
+# "and until 2015 ?" : only the end is given
+def test_single_year_only_end():
+    assert single_year((None, 2015, None), 2010) == 2015
+
+def test_single_year_only_start():
+    assert single_year((2013, None, None), 2010) == 2013
+
+# No new year : the year of the previous question is kept
+def test_single_year_none():
+    assert single_year((None, None, None), 2010) == 2010
+    assert single_year((None, None, 2008), 2010) == 2010
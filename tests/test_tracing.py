@@ -0,0 +1,79 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# Tests of the tracing of the queries (tracing.py)
+
+import time
+import pytest
+
+import config
+import tracing
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    monkeypatch.setattr(config, "TRACE_PATH", "")
+    monkeypatch.setattr(tracing, "enabled", True)
+    tracing.reset()
+    yield
+    tracing.attach(None)
+    tracing.reset()
+
+def test_spans(traced):
+    tracing.start_trace("query")
+    with tracing.span("outer"):
+        with tracing.span("inner"):
+            tracing.count("http.requests", 2)
+    trace = tracing.end_trace()
+    assert [(s["name"], s["depth"]) for s in trace["spans"]] == [("inner", 1), ("outer", 0)]
+    assert trace["counters"] == {"http.requests" : 2}
+    assert tracing.current_trace() == None
+
+# The time waiting for the user is a span, but it is not in the duration of the query
+def test_waiting(traced):
+    tracing.start_trace("query")
+    with tracing.span("find_time"):
+        time.sleep(0.01)
+    with tracing.waiting():
+        time.sleep(0.2)
+    trace = tracing.end_trace()
+    assert [s["name"] for s in trace["spans"]] == ["find_time", "user_input"]
+    assert trace["waiting"] >= 200
+    assert trace["duration"] < 150
+
+def test_end_trace_after_error(traced):
+    tracing.start_trace("query")
+    with pytest.raises(ValueError):
+        try:
+            tracing.timed("find_topic", int, "x")
+        finally:
+            trace = tracing.end_trace()
+    assert [s["name"] for s in trace["spans"]] == ["find_topic"]
+    assert tracing.current_trace() == None
+
+def test_summary(traced):
+    for ms in range(1, 101):
+        tracing.add_to_histogram("stage", ms / 1000)
+    res = tracing.summary("stage")
+    assert res["calls"] == 100
+    assert res["total"] == pytest.approx(5050)
+    assert res["mean"] == pytest.approx(50.5)
+    assert res["p50"] == pytest.approx(50.5)
+    assert res["p95"] == pytest.approx(95.05)
+    assert tracing.summary("other") == None
+
+def test_samples_bounded(traced, monkeypatch):
+    monkeypatch.setattr(tracing, "max_samples", 10)
+    tracing.reset()
+    for ms in range(100):
+        tracing.add_to_histogram("stage", ms / 1000)
+    assert len(tracing.samples["stage"]) == 10
+    assert tracing.summary("stage")["calls"] == 100
+    assert tracing.summary("stage")["p50"] == pytest.approx(94.5)
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(tracing, "enabled", False)
+    assert tracing.start_trace("query") == None
+    assert tracing.span("find_time") is tracing.no_span
+    assert tracing.waiting() is tracing.no_span
+    assert tracing.timed("find_time", len, "abc") == 3
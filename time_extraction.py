@@ -10,6 +10,7 @@
 # Utils import
 from parsing_analysis import get_subtrees, find_links
 from utils import lower_list, get_index
+from annotation import AnnotatedSentence
 
 ### FUNCTIONS
 
@@ -75,8 +76,12 @@ def date_figures(ner, pos, dep):
 # As explained in area_extraction, it will be determined later (in find_aggregators) if the date is or is not part of a comparison
 # Else, FROM and TO determine the time period covered in the query (they are equal if the user only wants one specific year)
 # This function also detects sentences like "over the last 5 years" and calculate the years it corresponds to
+# The parses can also be given directly as an AnnotatedSentence (see annotation.py)
 
-def find_time(ner, parse, parse_d):
+def find_time(ner, parse = None, parse_d = None):
+
+    if isinstance(ner, AnnotatedSentence):
+        ner, parse, parse_d = ner.ner, ner.parse, ner.parse_d
 
     n = len(ner)
     res = []
@@ -213,3 +218,14 @@ def find_time(ner, parse, parse_d):
                     date_from = NOW-duration
 
     return (date_from,date_to, date_than)
+
+# The year of a question about only one year (comparisons, lists of countries), given the time found by find_time :
+# the first year, or the last one when only an end is given ("until 2015"), or default when there is no year at all
+# (in a follow-up question, the default is the year of the previous question)
+
+def single_year(time, default):
+    if time[0] != None:
+        return time[0]
+    if time[1] != None:
+        return time[1]
+    return default
@@ -8,14 +8,17 @@
 ### IMPORT
 
 # Python libraries import
-import pickle
 import nltk
 from nltk.corpus import stopwords
 import pandas as pd
+import numpy as np
 import os
+import threading
 
 
-from word_proximity import proximity
+import word_proximity
+from dict_store import DictStore
+from word_proximity import proximity, build_index, index_from_arrays, index_proximity_sym
 from utils import is_word
 
 
@@ -24,25 +27,43 @@ from utils import is_word
 path = os.getcwd()
 
 df_path = os.path.join(path, "data/Tables.csv")
-topic_path = os.path.join(path, "data/topic_dict.pkl")
+topic_path = os.path.join(path, "data/topic_dict.bin")
+index_path = os.path.join(path, "data/topic_index.npz")
 
 ### LOADINGS
 
-df_tables = pd.read_csv(df_path, sep = ";")
+# Nothing is loaded when the file is imported : the tables, the keywords and the topic index
+# are loaded the first time they are needed (get_tables, get_keywords, get_topic_index)
+# The function warmup loads everything in advance
 
-# List of table names and categories
-name_list = []
-cat_list = []
-for id, row in df_tables.iterrows():
-    name_list.append(row["Short Name"])
-    cat_list.append(row["Category"])
-
-N = len(name_list)
+tables = None
+keywords = None
+topic_index = None
+lock = threading.RLock()
 
-#keywords dictionary
-file = open(topic_path, "rb")
-keywords = pickle.load(file)
-file.close()
+# List of table names and categories
+def get_tables():
+    global tables
+    if tables == None:
+        with lock:
+            if tables == None:
+                df_tables = pd.read_csv(df_path, sep = ";")
+                name_list = []
+                cat_list = []
+                for id, row in df_tables.iterrows():
+                    name_list.append(row["Short Name"])
+                    cat_list.append(row["Category"])
+                tables = (name_list, cat_list)
+    return tables
+
+#keywords dictionary (memory-mapped, each table is read when it is first used, see dict_store.py)
+def get_keywords():
+    global keywords
+    if keywords == None:
+        with lock:
+            if keywords == None:
+                keywords = DictStore(topic_path, "topic")
+    return keywords
 
 
 ### FUNCTIONS
@@ -53,7 +74,7 @@ coef = (1,0.6,0.6,0.6)
 # Each keyword of the table has a certain proximity score with w (weighted by its category according to "coef")
 # We take the maximum score among all the keywords of the table
 def proximity2(w,table):
-    table_keywords = keywords[table]
+    table_keywords = get_keywords()[table]
     score = 0
     for i in range(4):
         c = coef[i]
@@ -64,6 +85,68 @@ def proximity2(w,table):
     return score
 
 
+### TOPIC INDEX
+
+# Computing proximity2 for each word of the query and each table means thousands of calls to proximity
+# So instead, all the keywords of all the tables are gathered once in one vocabulary (see build_index in word_proximity)
+# and for each table, we store the coefficient of each keyword of the vocabulary (0 if it is not a keyword of the table)
+# The proximity2 scores of a word for all the tables are then given by a single product of arrays
+# The index is built with the function build_topic_index and saved as an independant file (topic_index.npz),
+# with the signature of the Word2Vec model used (see model_signature in word_proximity)
+
+def build_topic_index():
+    name_list = get_tables()[0]
+    keywords = get_keywords()
+    N = len(name_list)
+    vocabulary = set()
+    for table in name_list:
+        for words in keywords[table]:
+            vocabulary.update(words)
+    index = build_index(sorted(vocabulary))
+
+    weights = np.zeros((N, len(index["words"])), dtype = np.float32)
+    for t in range(N):
+        table_keywords = keywords[name_list[t]]
+        for i in range(4):
+            for x in table_keywords[i]:
+                j = index["position"][x]
+                weights[t,j] = max(weights[t,j], coef[i])
+
+    np.savez(index_path, tables = np.array(name_list, dtype = str), weights = weights,
+             model = np.array(word_proximity.model_signature()), **index["arrays"])
+    return (index, weights)
+
+# The saved index is used only if it is up to date (same tables, same Word2Vec model, and more recent than topic_dict.bin)
+# Otherwise, it is built again
+
+def load_topic_index():
+    name_list = get_tables()[0]
+    try:
+        if os.path.getmtime(index_path) >= os.path.getmtime(topic_path):
+            data = np.load(index_path, allow_pickle = False)
+            if (list(data["tables"]) == name_list and str(data["model"]) == word_proximity.model_signature()):
+                arrays = {}
+                for k in data.files:
+                    if k != "model":
+                        arrays[k] = data[k]
+                return (index_from_arrays(arrays), arrays["weights"])
+    except (OSError, KeyError):
+        pass
+    return build_topic_index()
+
+def get_topic_index():
+    global topic_index
+    if topic_index == None:
+        with lock:
+            if topic_index == None:
+                topic_index = load_topic_index()
+    return topic_index
+
+def warmup():
+    word_proximity.warmup()
+    get_topic_index()
+
+
 stops = set(stopwords.words('english'))
 
 # This function takes the sentence and return its keywords
@@ -78,74 +161,103 @@ def query_words(query):
     return res
 
 
-# This function takes a query, compute the proximity score for each table (sum of the proximity scores for each word of the query)
+### RANKING
+
+# The ranking of the tables is done in a single pass for a query (or a batch of queries, see rank_topics) :
+# - the scores of the tables (mean over the words of the query of the proximity2 scores, computed with the topic index)
+# - the scores of the categories (sum of the scores of the tables of the category)
+# - the n best tiers of tables (see find_top) and the best category
+# In a batch, the proximity scores of a word are computed only once even if it appears in several queries
+
+categories = None
+
+# Position of the category of each table in the list of the categories (in their order of appearance)
+def get_categories():
+    global categories
+    if categories == None:
+        with lock:
+            if categories == None:
+                cat_list = get_tables()[1]
+                names = list(dict.fromkeys(cat_list))
+                position = {c : i for i, c in enumerate(names)}
+                categories = (names, np.array([position[c] for c in cat_list], dtype = np.int64))
+    return categories
+
+# Scores of all the tables for each query, as an array (number of queries x number of tables)
+# A query without any keyword has a score of 0 for all the tables
+
+def scores_matrix(queries):
+    index, weights = get_topic_index()
+    words_list = [query_words(q) for q in queries]
+    word_scores = {}
+    for words in words_list:
+        for w in words:
+            if w not in word_scores:
+                prox = index_proximity_sym(w, index)
+                word_scores[w] = (weights * prox).max(axis = 1)
+    res = np.zeros((len(queries), len(weights)))
+    for q in range(len(queries)):
+        words = words_list[q]
+        for w in words:
+            res[q] += word_scores[w]
+        if len(words) > 0:
+            res[q] /= len(words)
+    return res
 
-def tables_rank(query):
-    words = query_words(query)
-    n = len(words)
+# Given the scores of the tables, find the n best scores and return their values (maxs) and the corresponding ids (res)
+# Works with ex-aequo scores : all the equal top scores will be returned, not just one
+# (after the best score, only the positive scores are kept : when there are not enough of them, the next tiers are the tables with score 0)
+
+def top_tiers(scores, n = 1):
+    scores = np.asarray(scores)
+    maxi = scores.max()
+    lower = np.unique(scores[(scores > 0) & (scores < maxi)])[::-1]
+    maxs = [float(maxi)]
+    res = [np.flatnonzero(scores == maxi).tolist()]
+    for k in range(n-1):
+        m = float(lower[k]) if k < len(lower) else 0
+        maxs.append(m)
+        res.append(np.flatnonzero(scores == m).tolist())
+    return (maxs, res)
+
+# Ranks a batch of queries : returns for each query a dictionary with
+# 'scores' (array of the scores of the tables), 'categories' (category -> score), 'max_scores' and 'topics' (the n best tiers,
+# with the names of the tables) and 'category' (the best category, None if no category has a positive score)
+
+def rank_topics(queries, n = 3):
+    name_list = get_tables()[0]
+    cat_names, cat_ids = get_categories()
+    matrix = scores_matrix(queries)
     res = []
-    for i in range(N):
-        score = 0
-        table = name_list[i]
-        for w in words:
-            score += proximity2(w,table)
-        res.append(score/n)
+    for scores in matrix:
+        cat_scores = np.bincount(cat_ids, weights = scores, minlength = len(cat_names))
+        max_scores, tiers = top_tiers(scores, n)
+        best = int(cat_scores.argmax())
+        res.append({"scores" : scores,
+                    "categories" : dict(zip(cat_names, cat_scores.tolist())),
+                    "max_scores" : max_scores,
+                    "topics" : [[name_list[i] for i in tier] for tier in tiers],
+                    "category" : cat_names[best] if cat_scores[best] > 0 else None})
     return res
 
-# This function computes the proximity score for the query with the categories (sum of the scores of each table of the category)
+def rank_topic(query, n = 3):
+    return rank_topics([query], n)[0]
 
-def cat_rank(query):
-    scores = tables_rank(query)
-    cat_scores = {}
-    for i in range(N):
-        categ = cat_list[i]
-        try:
-            a = cat_scores[categ]
-            cat_scores[categ] = a + scores[i]
-        except:
-            cat_scores[categ] = scores[i]
-    return cat_scores
 
-# Pretty print of all the scores with the name of each table
+# The former functions, now using the ranking above
 
-def print_rank(query):
-    scores = tables_rank(query)
-    cat_scores = cat_rank(query)
-    for i in range(len(score)):
-        print(name_list[i], ' : ', scores[i])
-    print()
-    for a in cat_scores:
-        print(a, " : ", cat_scores[a])
+# Proximity score of the query for each table
+def tables_rank(query):
+    return scores_matrix([query])[0].tolist()
 
-# Given all the scores, find the n best scores and return their values (maxs) and the corresponding ids (res)
-# Works with ex-aequo scores : all the equal top scores will be returned, not just one
+# Proximity score of the query for each category
+def cat_rank(query):
+    return rank_topic(query, 1)["categories"]
 
 def find_top(score,n=1):
-    res = []
-    maxi = max(score)
-    maxs = [maxi]
-    idx = []
-    for i in range(len(score)):
-        if score[i] == maxi:
-            idx.append(i)
-    res.append(idx)
-    if n>1:
-        for k in range(n-1):
-            m = 0
-            idx = []
-            for i in range(len(score)):
-                if (score[i]>m and score[i]<maxi):
-                    m = score[i]
-            for i in range(len(score)):
-                if score[i] == m:
-                    idx.append(i)
-            res.append(idx)
-            maxi = m
-            maxs.append(m)
-    return (maxs,res)
+    return top_tiers(score, n)
 
 # Finds the one category with the best category score
-
 def top_category(cat_scores):
     cat = None
     m = 0
@@ -155,15 +267,21 @@ def top_category(cat_scores):
             cat = a
     return cat
 
+# Pretty print of all the scores with the name of each table
+
+def print_rank(query):
+    name_list = get_tables()[0]
+    ranking = rank_topic(query, 1)
+    scores = ranking["scores"]
+    for i in range(len(scores)):
+        print(name_list[i], ' : ', scores[i])
+    print()
+    for a, s in ranking["categories"].items():
+        print(a, " : ", s)
+
 # Final function : takes a sentence as input
 # And return the best scores, with the best topics associated, and also the best category
 
 def find_topic(sent,n=3):
-    scores = tables_rank(sent)
-    cat_scores = cat_rank(sent)
-    max_scores, topics = find_top(scores,n)
-    for i in range(n):
-        for k in range(len(topics[i])):
-            topics[i][k] = name_list[topics[i][k]]
-    top_cat = top_category(cat_scores)
-    return max_scores, topics, top_cat
+    ranking = rank_topic(sent, n)
+    return ranking["max_scores"], ranking["topics"], ranking["category"]
@@ -0,0 +1,242 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file contains the tracing of the Chatbot : where does the time of a query go ?
+# When the tracing is enabled (config.TRACING), each query has a trace with :
+# - the spans : the stages of the analysis (parsing, type of sentence, find_time ...) with their start and duration
+# - the counters : number of calls to the parser, of HTTP requests, of proximity computations, hits and misses of the caches ...
+# The trace of each query can be written as a json line in a file (config.TRACE_PATH),
+# and the durations of all the spans are gathered in histograms (same stage name -> same histogram)
+# The last durations of each span are also kept, to give its percentiles (see summary, used by evaluate.py and benchmark.py)
+# The time waiting for the user (see waiting) is recorded as its own span and is not counted in the duration of the query
+#
+# When the tracing is disabled, span gives an object doing nothing and count returns immediately
+# (the code calling count in a loop should check 'tracing.enabled' first)
+
+### IMPORT
+
+# Python libraries import
+from collections import deque
+import functools
+import json
+import threading
+import time
+import numpy as np
+
+# Config import
+import config
+
+
+### STATE
+
+enabled = config.TRACING
+
+# The trace of the current query is kept per thread (several queries can be analysed at the same time, see evaluate.py),
+# with the depth of the current span (number of spans started and not finished)
+# A worker thread working for a query can be attached to its trace (see fetch_all in data_fetching.py)
+local = threading.local()
+
+# Limits (in milliseconds) of the buckets of the histograms (the last bucket is for everything above)
+buckets = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000]
+histograms = {}
+histograms_lock = threading.Lock()
+
+# Number of durations kept for each span (the oldest ones are forgotten)
+max_samples = 10000
+samples = {}
+
+def enable(value = True):
+    global enabled
+    enabled = value
+
+
+### TRACE
+
+class Trace:
+
+    def __init__(self, query):
+        self.query = query
+        self.start = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.waiting = 0    #time waiting for the user
+        self.lock = threading.Lock()
+
+    def count(self, name, n):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_span(self, name, start, duration, depth):
+        with self.lock:
+            self.spans.append({"name" : name, "start" : round((start - self.start)*1000, 3),
+                               "duration" : round(duration*1000, 3), "depth" : depth})
+
+    def add_waiting(self, duration):
+        with self.lock:
+            self.waiting += duration
+
+    # The duration of the query does not count the time waiting for the user (given apart)
+    def to_dict(self):
+        with self.lock:
+            return {"query" : self.query, "time" : time.time(),
+                    "duration" : round((time.perf_counter() - self.start - self.waiting)*1000, 3),
+                    "waiting" : round(self.waiting*1000, 3),
+                    "spans" : list(self.spans), "counters" : dict(self.counters)}
+
+
+def current_trace():
+    return getattr(local, "trace", None)
+
+def current_depth():
+    return getattr(local, "depth", 0)
+
+def attach(trace, depth = 0):
+    local.trace = trace
+    local.depth = depth
+
+# The function start_trace begins the trace of a new query, and end_trace finishes it :
+# it returns the trace as a dictionary (durations in milliseconds) and writes it in config.TRACE_PATH if it is set
+
+def start_trace(query):
+    if not enabled:
+        return None
+    attach(Trace(query))
+    return local.trace
+
+def end_trace():
+    trace = current_trace()
+    if trace == None:
+        return None
+    local.trace = None
+    res = trace.to_dict()
+    if config.TRACE_PATH != "":
+        with histograms_lock:
+            file = open(config.TRACE_PATH, "a", encoding = "utf-8")
+            file.write(json.dumps(res) + "\n")
+            file.close()
+    return res
+
+
+### SPANS AND COUNTERS
+
+def add_to_histogram(name, duration):
+    ms = duration * 1000
+    i = 0
+    while (i < len(buckets) and ms > buckets[i]):
+        i += 1
+    with histograms_lock:
+        if name not in histograms:
+            histograms[name] = {"count" : 0, "total" : 0, "buckets" : [0] * (len(buckets) + 1)}
+            samples[name] = deque(maxlen = max_samples)
+        h = histograms[name]
+        h["count"] += 1
+        h["total"] += ms
+        h["buckets"][i] += 1
+        samples[name].append(ms)
+
+class Span:
+
+    def __init__(self, name, wait = False):
+        self.name = name
+        self.wait = wait
+
+    def __enter__(self):
+        self.trace = current_trace()
+        self.depth = current_depth()
+        local.depth = self.depth + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        local.depth = self.depth
+        if self.trace != None:
+            self.trace.add_span(self.name, self.start, duration, self.depth)
+            if self.wait:
+                self.trace.add_waiting(duration)
+        add_to_histogram(self.name, duration)
+        return False
+
+class NoSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+no_span = NoSpan()
+
+# Usage : with tracing.span("find_time"): ...
+def span(name):
+    if not enabled:
+        return no_span
+    return Span(name)
+
+# Usage : with tracing.waiting(): answer = input(">> ")
+# The time waiting for the user is the span 'user_input', and it is not counted in the duration of the query
+def waiting():
+    if not enabled:
+        return no_span
+    return Span("user_input", wait = True)
+
+# Calls f(*args) in a span : tracing.timed("find_time", find_time, sentence)
+def timed(name, f, *args):
+    with span(name):
+        return f(*args)
+
+# Decorator to record each call of a function as a span
+def traced(name):
+    def decorator(f):
+        @functools.wraps(f)
+        def g(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+            with Span(name):
+                return f(*args, **kwargs)
+        return g
+    return decorator
+
+# Adds n to the counter 'name' of the current query
+def count(name, n = 1):
+    if not enabled:
+        return
+    trace = current_trace()
+    if trace != None:
+        trace.count(name, n)
+
+
+### EXPORT
+
+# The histograms are given as a dictionary name -> {count, total and mean (ms), buckets : {"<= limit" : number of spans}}
+
+def get_histograms():
+    res = {}
+    with histograms_lock:
+        for name, h in histograms.items():
+            labels = ["<= " + str(b) + " ms" for b in buckets] + ["> " + str(buckets[-1]) + " ms"]
+            res[name] = {"count" : h["count"], "total" : round(h["total"], 3), "mean" : round(h["total"] / h["count"], 3),
+                         "buckets" : dict(zip(labels, h["buckets"]))}
+    return res
+
+# Statistics of the last durations of a span (in milliseconds) : number of calls, total, mean and percentiles
+# Returns None if the span was never recorded
+
+def summary(name):
+    with histograms_lock:
+        h = histograms.get(name)
+        if h == None:
+            return None
+        t = np.array(samples[name])
+    return {"calls" : h["count"], "total" : round(h["total"], 3), "mean" : round(h["total"] / h["count"], 3),
+            "p50" : float(np.percentile(t, 50)), "p95" : float(np.percentile(t, 95)), "p99" : float(np.percentile(t, 99))}
+
+def save_histograms(file_path):
+    file = open(file_path, "w", encoding = "utf-8")
+    json.dump(get_histograms(), file, indent = 1)
+    file.close()
+
+def reset():
+    with histograms_lock:
+        histograms.clear()
+        samples.clear()
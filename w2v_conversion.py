@@ -0,0 +1,105 @@
+#  @ Copyright Inria, Ecole Polytechnique
+#  Shared under the MIT license https://opensource.org/licenses/mit-license.php
+
+# This file converts the pretrained Word2Vec model (GoogleNews binary, 3 million words) into a compact native format
+# Loading the binary takes minutes and several GB of memory in every process using word_proximity
+# The converted model :
+# - only keeps the most frequent words (the binary is sorted by frequency) and the words of the metadata dictionaries
+# - can store the vectors in float16 instead of float32
+# - is saved with gensim so that word_proximity can load it with mmap (the processes then share the same memory pages)
+#
+# Usage : python w2v_conversion.py [--limit 300000] [--dtype float16] [--no-dict]
+
+### IMPORT
+
+# Python libraries import
+import argparse
+import os
+import nltk
+import numpy as np
+from gensim.models import KeyedVectors
+
+# Config import
+import config
+
+# Utils import
+from utils import is_word
+from dict_store import DictStore
+
+
+### PATHS
+
+path = os.getcwd()
+
+source_path = config.W2V_BINARY_PATH
+target_path = config.W2V_PATH
+topic_path = os.path.join(path, "data/topic_dict.bin")
+dim_path = os.path.join(path, "data/dim_dict.bin")
+
+
+### FUNCTIONS
+
+# This function gathers all the words of the metadata dictionaries :
+# the keywords of the tables (topic_dict.bin) and the words in the names of the dimension values (dim_dict.bin)
+
+def dictionary_words():
+    words = set()
+
+    topics = DictStore(topic_path, "topic")
+    for table in topics:
+        for keywords in topics[table]:
+            words.update(keywords)
+    topics.close()
+
+    dims = DictStore(dim_path, "dim")
+    for table in dims:
+        dim_dict = dims[table][0]
+        for d in dim_dict:
+            for v in dim_dict[d]:
+                for w in nltk.word_tokenize(v[1].replace("-", " ")):
+                    if is_word(w.lower()):
+                        words.add(w.lower())
+    dims.close()
+    return words
+
+# The conversion itself : limit is the number of most frequent words kept (None to keep all of them)
+# and with_dict tells if the words of the dictionaries are added
+
+def convert(source = source_path, target = target_path, limit = 300000, dtype = "float32", with_dict = True):
+    full = KeyedVectors.load_word2vec_format(source, binary=True)
+
+    if limit == None:
+        words = list(full.index_to_key)
+    else:
+        words = list(full.index_to_key[:limit])
+
+    if with_dict:
+        kept = set(words)
+        for w in sorted(dictionary_words()):
+            if (w not in kept and w in full):
+                words.append(w)
+                kept.add(w)
+
+    vectors = np.asarray(full[words], dtype = dtype)
+    compact = KeyedVectors(full.vector_size, dtype = dtype)
+    compact.add_vectors(words, vectors)
+
+    # The vectors are stored in a separate .npy file, which is what allows the loading with mmap
+    compact.save(target, separately = ["vectors"])
+    return len(words)
+
+
+### EXECUTION
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description = "Convert the GoogleNews Word2Vec binary into a compact model for word_proximity")
+    arg_parser.add_argument("--source", default = source_path)
+    arg_parser.add_argument("--target", default = target_path)
+    arg_parser.add_argument("--limit", type = int, default = 300000, help = "number of most frequent words kept (0 : all)")
+    arg_parser.add_argument("--dtype", choices = ["float32", "float16"], default = "float32")
+    arg_parser.add_argument("--no-dict", action = "store_true", help = "do not add the words of topic_dict.bin and dim_dict.bin")
+    args = arg_parser.parse_args()
+
+    limit = args.limit if args.limit > 0 else None
+    n = convert(args.source, args.target, limit, args.dtype, not args.no_dict)
+    print("Saved ", n, " words in ", args.target)
@@ -8,13 +8,19 @@
 
 # Python libraries import
 import pickle
-import gensim
 import nltk
 from nltk.corpus import stopwords
 from nltk.corpus import wordnet as wn
 import re
-import pandas as pd
+import numpy as np
+import atexit
 import os
+import threading
+
+# Config import
+import config
+from cache import LRUCache, memoize, save_caches, load_caches
+import tracing
 
 
 ### PATHS
@@ -22,8 +28,77 @@ import os
 path = os.getcwd()
 
 # Word2Vec model (pretrained on GoogleNews articles)
-model_path = os.path.join(path, "Google Pretrained W2V/GoogleNews-vectors-negative300.bin")
-model = gensim.models.KeyedVectors.load_word2vec_format(model_path, binary=True)
+# We use the compact version made by w2v_conversion.py if it exists : it is memory-mapped, so it loads in a second
+# and all the processes using it share the same memory
+model_path = config.W2V_PATH
+binary_path = config.W2V_BINARY_PATH
+
+
+### LOADING
+
+# The model is only loaded the first time it is needed (get_model), not when the file is imported
+# The function warmup loads everything in advance (the model and WordNet), to have fast first queries
+
+model = None
+lock = threading.Lock()
+
+def get_model():
+    global model
+    if model == None:
+        with lock:
+            if model == None:
+                with tracing.span("load_word2vec"):
+                    import gensim   #heavy library, only imported when the model is really loaded
+                    if os.path.exists(model_path):
+                        model = gensim.models.KeyedVectors.load(model_path, mmap='r')
+                    else:
+                        model = gensim.models.KeyedVectors.load_word2vec_format(binary_path, binary=True)
+    return model
+
+def warmup():
+    get_model()
+    wn.ensure_loaded()
+
+# Identifies the files of the model that get_model loads (path, size and modification time)
+# The files made with the vectors of the model (like the topic index) keep it, to know if they were made with another model
+def model_signature():
+    files = [model_path, model_path + ".vectors.npy"] if os.path.exists(model_path) else [binary_path]
+    res = []
+    for file_path in files:
+        try:
+            st = os.stat(file_path)
+            res.append(os.path.abspath(file_path) + ":" + str(st.st_size) + ":" + str(st.st_mtime_ns))
+        except OSError:
+            pass
+    return "|".join(res)
+
+
+### CACHES
+
+# The same words (and pairs of words) are compared many times, within a query and from one query to another
+# So the results of hyp, syn, the stems and proximity are kept in LRU caches (see cache.py)
+# If a file is given in config.py, the caches are saved at exit and reloaded at the next start
+
+caches = {
+    "stem" : LRUCache(config.WORDNET_CACHE_SIZE, "stem"),
+    "hyp" : LRUCache(config.WORDNET_CACHE_SIZE, "hyp"),
+    "syn" : LRUCache(config.WORDNET_CACHE_SIZE, "syn"),
+    "proximity" : LRUCache(config.PROXIMITY_CACHE_SIZE, "proximity"),
+}
+
+def save_cache():
+    if config.PROXIMITY_CACHE_PATH != "":
+        save_caches(caches, config.PROXIMITY_CACHE_PATH)
+
+def cache_stats():
+    stats = {}
+    for name in caches:
+        stats[name] = caches[name].stats()
+    return stats
+
+if config.PROXIMITY_CACHE_PATH != "":
+    load_caches(caches, config.PROXIMITY_CACHE_PATH)
+    atexit.register(save_cache)
 
 
 ### FUNCTIONS
@@ -32,6 +107,7 @@ model = gensim.models.KeyedVectors.load_word2vec_format(model_path, binary=True)
 # and returns a set of words that are either hyponyms or hypernyms of w
 # The relation between two words is given here by WordNet
 
+@memoize(caches["hyp"])
 def hyp(w,type = None):
     res = []
     for s in wn.synsets(w,type):
@@ -50,6 +126,7 @@ def hyp(w,type = None):
 # and another set of words that have an adjective-noun relation (partainyms) : tourism - touristic (for example)
 # The relation between two words is given here by WordNet
 
+@memoize(caches["syn"])
 def syn(w,type = None):
     res = []
     res2 = []
@@ -68,6 +145,10 @@ def syn(w,type = None):
 
 porter = nltk.PorterStemmer()
 
+@memoize(caches["stem"])
+def stem(w):
+    return porter.stem(w)
+
 # This function computes the proximity score between two words, combining different techniques :
 # - if both words have the same stem : 1
 # - synonyms : 1
@@ -76,14 +157,15 @@ porter = nltk.PorterStemmer()
 # - else, if the word2vec similarity is above 0.2, we take that
 # - else, 0
 
+@memoize(caches["proximity"])
 def proximity(w,w2):
     score = 0
     s = 0
     try :
-        s = model.similarity(w,w2)
+        s = get_model().similarity(w,w2)
     except:
         pass
-    if(porter.stem(w) == porter.stem(w2)):
+    if(stem(w) == stem(w2)):
         score = max(score,1)
     if s>0.2:
         score = max(score,s)
@@ -96,3 +178,113 @@ def proximity(w,w2):
     if w2 in rels:
         score = max(score,0.7)
     return score
+
+
+### VECTORIZED PROXIMITY
+
+# When the same words are compared again and again (the keywords of the tables, the values of the dimensions)
+# we can compute once and for all everything that only depends on these words, and store it in an "index" :
+# - words : the list of words of the vocabulary
+# - vectors : their word2vec vectors (normalized, so that a dot product gives the similarity; zero if unknown)
+# - stems : their stems
+# - related : for each word w, the positions of the vocabulary words x having w as synonym, pertainym or hypo/hypernym
+#   with the corresponding score (so that the WordNet part of proximity(x,w) is just a dictionary lookup)
+
+relation_scores = (("hyp", 0.6), ("rel", 0.7), ("syn", 1))
+
+def relations(w):
+    hyps = hyp(w)
+    syns, rels = syn(w)
+    return {"hyp" : hyps, "rel" : rels, "syn" : syns}
+
+def build_index(vocabulary):
+    model = get_model()
+    words = list(vocabulary)
+    n = len(words)
+    vectors = np.zeros((n, model.vector_size), dtype = np.float32)
+    stems = []
+    rel_word = []
+    rel_index = []
+    rel_score = []
+    for i in range(n):
+        w = words[i]
+        if w in model:
+            v = model[w]
+            vectors[i] = v / np.linalg.norm(v)
+        stems.append(stem(w))
+        r = relations(w)
+        for kind, score in relation_scores:
+            for a in r[kind]:
+                rel_word.append(a)
+                rel_index.append(i)
+                rel_score.append(score)
+    arrays = {
+        "words" : np.array(words, dtype = str),
+        "vectors" : vectors,
+        "stems" : np.array(stems, dtype = str),
+        "rel_word" : np.array(rel_word, dtype = str),
+        "rel_index" : np.array(rel_index, dtype = np.int32),
+        "rel_score" : np.array(rel_score, dtype = np.float32),
+    }
+    return index_from_arrays(arrays)
+
+# The index is stored as flat arrays (to be saved with numpy) and the dictionaries are rebuilt from them
+
+def index_from_arrays(arrays):
+    words = [str(w) for w in arrays["words"]]
+    stem_pos = {}
+    for i, st in enumerate(arrays["stems"]):
+        stem_pos.setdefault(str(st), []).append(i)
+    related = {}
+    for w, i, sc in zip(arrays["rel_word"], arrays["rel_index"], arrays["rel_score"]):
+        related.setdefault(str(w), []).append((int(i), float(sc)))
+    for w in related:
+        idx, sc = zip(*related[w])
+        related[w] = (np.array(idx, dtype = np.int32), np.array(sc, dtype = np.float32))
+    return {
+        "arrays" : arrays,
+        "words" : words,
+        "position" : {w : i for i, w in enumerate(words)},
+        "vectors" : arrays["vectors"],
+        "stems" : stem_pos,
+        "related" : related,
+    }
+
+# This function computes at once proximity(x,w) for all the words x of the index
+
+def index_proximity(w, index):
+    tracing.count("proximity.vectorized")
+    n = len(index["words"])
+    scores = np.zeros(n, dtype = np.float32)
+    model = get_model()
+
+    # word2vec similarity, if above 0.2
+    if w in model:
+        v = model[w]
+        sims = index["vectors"] @ (v / np.linalg.norm(v))
+        scores = np.where(sims > 0.2, sims, scores).astype(np.float32)
+
+    # same stem
+    for i in index["stems"].get(stem(w), []):
+        scores[i] = 1
+
+    # w is a synonym, pertainym or hypo/hypernym of x
+    if w in index["related"]:
+        idx, sc = index["related"][w]
+        np.maximum.at(scores, idx, sc)
+    return scores
+
+# And this one computes max(proximity(x,w), proximity(w,x)) (symmetric version, as in topic_extraction)
+
+def index_proximity_sym(w, index):
+    scores = index_proximity(w, index)
+
+    # x is a synonym, pertainym or hypo/hypernym of w
+    r = relations(w)
+    position = index["position"]
+    for kind, score in relation_scores:
+        for a in r[kind]:
+            if a in position:
+                i = position[a]
+                scores[i] = max(scores[i], score)
+    return scores